@@ -0,0 +1,121 @@
+"""
+Serves the same burst of concurrent GET requests through the WSGI handler,
+one thread per in-flight request, and through the ASGI handler with the
+async read views, on a temporary sqlite database.
+
+    python benchmarks/bench_concurrency.py [--movies 500] [--requests 400]
+        [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "freshTomatoes.settings")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+from movies.models import Genre, Movie  # noqa: E402
+
+
+def seed(movies):
+    genres = [Genre.objects.create(name=f"Genre {i}") for i in range(10)]
+    Movie.objects.bulk_create(
+        Movie(
+            title=f"Test Movie {i}",
+            foldedTitle=f"test movie {i}",
+            year=1950 + i % 70,
+            runtime=90 + i % 60,
+            userRating=i % 10,
+            votes=i,
+        )
+        for i in range(movies)
+    )
+    for movie in Movie.objects.all():
+        movie.genres.add(genres[movie.id % len(genres)])
+
+
+def paths(count, movies):
+    rng = random.Random(0)
+    choices = [
+        lambda: "/movies/",
+        lambda: f"/movies/?search=movie {rng.randrange(movies)}",
+        lambda: f"/movies/{rng.randrange(1, movies + 1)}/",
+        lambda: "/movies/?ids="
+        + ",".join(str(rng.randrange(1, movies)) for _ in range(10)),
+    ]
+    return [rng.choice(choices)() for _ in range(count)]
+
+
+def run_wsgi(requests, concurrency):
+    def get(path):
+        try:
+            return Client().get(path).status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(get, requests))
+
+
+async def run_asgi(requests, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(path):
+        async with semaphore:
+            return (await client.get(path)).status_code
+
+    return await asyncio.gather(*[get(path) for path in requests])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["*"]
+    directory = tempfile.mkdtemp()
+    settings.DATABASES["default"]["NAME"] = os.path.join(directory, "bench.sqlite3")
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    seed(args.movies)
+    connections.close_all()
+
+    requests = paths(args.requests, args.movies)
+    for name, run in [
+        ("WSGI, thread per request", lambda: run_wsgi(requests, args.concurrency)),
+        (
+            "ASGI, async views",
+            lambda: asyncio.run(run_asgi(requests, args.concurrency)),
+        ),
+    ]:
+        # The first pass fills the document cache and store.
+        run()
+        start = time.perf_counter()
+        statuses = run()
+        elapsed = time.perf_counter() - start
+        errors = sum(status != 200 for status in statuses)
+        print(
+            f"{name:28} {len(requests) / elapsed:8.0f} req/s"
+            f"  {elapsed * 1000 / len(requests):6.2f} ms/req  {errors} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
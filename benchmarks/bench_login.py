@@ -0,0 +1,84 @@
+"""
+Measures the logins per second of /users/login with the passwords hashed by
+the first hasher of every profile of PASSWORD_HASHING_PROFILES, and by
+Django's default PBKDF2, on a temporary sqlite database.
+
+    python benchmarks/bench_login.py [--logins 100] [--concurrency 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "freshTomatoes.settings")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from users.models import TomatoeUser  # noqa: E402
+
+PASSWORD = "Testpassword1"
+
+
+def run_logins(username, logins, concurrency):
+    def login(_):
+        try:
+            response = Client().post(
+                "/users/login",
+                {"username": username, "password": PASSWORD},
+                content_type="application/json",
+            )
+            return response.status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(login, range(logins)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.RATE_LIMITS["ENABLED"] = False
+    directory = tempfile.mkdtemp()
+    settings.DATABASES["default"]["NAME"] = os.path.join(directory, "bench.sqlite3")
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    profiles = {
+        "django default": ["django.contrib.auth.hashers.PBKDF2PasswordHasher"],
+        **settings.PASSWORD_HASHING_PROFILES,
+    }
+    for name, hashers in profiles.items():
+        with override_settings(PASSWORD_HASHERS=hashers):
+            user = TomatoeUser.objects.create_user(
+                username=f"{name.replace(' ', '-')}@test.com", password=PASSWORD
+            )
+            connections.close_all()
+            start = time.perf_counter()
+            statuses = run_logins(user.username, args.logins, args.concurrency)
+            elapsed = time.perf_counter() - start
+        errors = sum(status != 201 for status in statuses)
+        hasher = hashers[0].rsplit(".", 1)[-1]
+        print(
+            f"{name:15} {hasher:28} {args.logins / elapsed:8.1f} logins/s"
+            f"  {elapsed * 1000 / args.logins:7.2f} ms/login  {errors} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
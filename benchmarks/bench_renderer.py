@@ -0,0 +1,75 @@
+"""
+Compares the time JSONRenderer and FastJSONRenderer take to render a page of
+movie documents, with and without orjson.
+
+    python benchmarks/bench_renderer.py [--movies 100] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "freshTomatoes.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from freshTomatoes import renderers  # noqa: E402
+
+
+def movie_data(movie_id):
+    return {
+        "id": str(movie_id),
+        "title": f"Test Movie {movie_id}",
+        "year": 1990 + movie_id % 30,
+        "runtime": 120,
+        "rating": {"id": 1, "rating": "PG-13"},
+        "directors": [{"id": movie_id, "name": "Test Director"}],
+        "userRating": Decimal("7.25"),
+        "votes": 1000 + movie_id,
+        "genres": [{"id": 1, "genre": "Action"}, {"id": 2, "genre": "Drama"}],
+        "cast": [{"id": i, "name": f"Test Actor {i}"} for i in range(10)],
+        "poster": f"https://example.com/posters/{movie_id}.jpg",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    page = {
+        "count": args.movies,
+        "next": None,
+        "previous": None,
+        "results": [movie_data(i) for i in range(args.movies)],
+    }
+    orjson = renderers.orjson
+    candidates = [("JSONRenderer", JSONRenderer(), None)]
+    if orjson is not None:
+        candidates.append(
+            ("FastJSONRenderer (orjson)", renderers.FastJSONRenderer(), orjson)
+        )
+    candidates.append(("FastJSONRenderer (json)", renderers.FastJSONRenderer(), None))
+
+    baseline = None
+    for name, renderer, backend in candidates:
+        renderers.orjson = backend
+        seconds = min(
+            timeit.repeat(lambda: renderer.render(page), number=args.repeat, repeat=5)
+        )
+        per_page = seconds / args.repeat * 1e6
+        baseline = baseline or per_page
+        print(f"{name:<28} {per_page:9.1f} us/page  {baseline / per_page:5.2f}x")
+    renderers.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
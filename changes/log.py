@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Change
+
+
+def record(model, object_ids, action=Change.SAVED):
+    """
+    Appends the changes of the given objects of a model to the change log
+    """
+    Change.objects.bulk_create(
+        [
+            Change(model=model._meta.model_name, objectId=object_id, action=action)
+            for object_id in dict.fromkeys(object_ids)
+        ],
+        batch_size=1000,
+    )
+
+
+def read_changes(since, limit):
+    """
+    Returns the changes after the since cursor, at most limit entries
+    compacted to the last action of every object, and the cursor of the last
+    entry read. Objects are grouped by action and by model.
+    """
+    entries = list(
+        Change.objects.filter(pk__gt=since)
+        .order_by("pk")
+        .values_list("pk", "model", "objectId", "action")[:limit]
+    )
+    last = {}
+    for _, model, object_id, action in entries:
+        # Later entries replace the earlier actions on the same object.
+        last.pop((model, object_id), None)
+        last[(model, object_id)] = action
+
+    changes = {Change.SAVED: {}, Change.DELETED: {}}
+    for (model, object_id), action in last.items():
+        changes[action].setdefault(model, []).append(object_id)
+    cursor = entries[-1][0] if entries else since
+    return changes, cursor, len(entries) == limit
+
+
+def is_pruned(since):
+    """
+    Tells if entries after a cursor were pruned. sqlite neither reuses nor
+    skips AUTOINCREMENT ids, so the entry after a cursor has the next id.
+    """
+    oldest = Change.objects.order_by("pk").values_list("pk", flat=True).first()
+    return oldest is not None and since + 1 < oldest
+
+
+def latest_cursor():
+    return Change.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+def prune_changes(retention=None, batch_size=None):
+    """
+    Deletes the entries older than retention seconds, in transactions of at
+    most batch_size entries. Returns the number of entries deleted.
+    """
+    config = settings.CHANGE_FEED
+    if retention is None:
+        retention = config["RETENTION"]
+    batch_size = batch_size or config["PRUNE_BATCH_SIZE"]
+    # The latest entry is kept, for is_pruned to know where the log starts.
+    expired = (
+        Change.objects.filter(
+            createdAt__lt=timezone.now() - timedelta(seconds=retention)
+        )
+        .exclude(pk=latest_cursor())
+        .order_by("pk")
+    )
+    total = 0
+    while True:
+        with transaction.atomic():
+            pks = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return total
+            Change.objects.filter(pk__in=pks).delete()
+        total += len(pks)
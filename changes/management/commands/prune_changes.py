@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from changes.log import prune_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the change log entries older than the retention period, in "
+        "small transactions. Meant to be run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention",
+            type=int,
+            help="Seconds the entries are kept for",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Entries deleted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        count = prune_changes(options["retention"], options["batch_size"])
+        self.stdout.write(f"Pruned {count} changes")
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=16)),
+                ('objectId', models.IntegerField()),
+                ('action', models.CharField(choices=[('saved', 'Saved'), ('deleted', 'Deleted')], max_length=8)),
+                ('createdAt', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Change(models.Model):
+    """
+    Entry of the change log: an object of a synced model was saved or
+    deleted. Entries are written in the transaction of the change and their
+    id is the cursor of /changes. sqlite serializes write transactions, so
+    ids are committed in order and a cursor never skips a later commit.
+    """
+
+    SAVED = "saved"
+    DELETED = "deleted"
+    ACTIONS = [(SAVED, "Saved"), (DELETED, "Deleted")]
+
+    id = models.BigAutoField(primary_key=True)
+    # model_name of the changed object: movie, review or celebrity.
+    model = models.CharField(max_length=16)
+    objectId = models.IntegerField()
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    createdAt = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.model} {self.objectId} {self.action}"
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from movies import celebrities
+from movies.models import Celebrity, Movie
+from movies.signals import credits_changed, movies_changed, soft_deleted
+from reviews.models import Review
+from users.models import TomatoeUser
+from .log import record
+from .models import Change
+
+
+@receiver(movies_changed)
+def movies_saved(sender, movie_ids, **kwargs):
+    # Sent for every write to a movie, its rating, genres or credits.
+    record(Movie, movie_ids)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Celebrity)
+def object_saved(sender, instance, **kwargs):
+    record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Celebrity)
+def object_deleted(sender, instance, **kwargs):
+    record(sender, [instance.pk], Change.DELETED)
+
+
+@receiver(credits_changed)
+def celebrity_credits_changed(sender, celebrity_ids, **kwargs):
+    # The credit counts of the celebrities change with their credits.
+    record(Celebrity, celebrity_ids)
+
+
+@receiver(pre_delete, sender=Movie)
+def movie_credits_deleted(sender, instance, **kwargs):
+    record(Celebrity, celebrities.credited_celebrities(instance))
+
+
+@receiver(soft_deleted, sender=Movie)
+def movie_soft_deleted(sender, instance, **kwargs):
+    movie_credits_deleted(sender, instance)
+    reviews = Review.all_objects.filter(movie=instance).values_list("pk", flat=True)
+    record(Review, reviews, Change.DELETED)
+    record(Movie, [instance.pk], Change.DELETED)
+
+
+@receiver(soft_deleted, sender=TomatoeUser)
+def user_soft_deleted(sender, instance, **kwargs):
+    reviews = Review.all_objects.filter(user=instance).values_list("pk", flat=True)
+    record(Review, reviews, Change.DELETED)
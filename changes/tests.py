@@ -0,0 +1,104 @@
+import os
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from changes.models import Change
+from movies import deletion
+from movies.models import Celebrity, Genre, Movie
+from movies.ratings import update_rating
+from reviews.models import Review
+from users.models import TomatoeUser
+
+
+class TestChangeFeed(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("changes")
+        self.user = TomatoeUser.objects.create_user(
+            username="testuser@test.com", password="Testpassword1"
+        )
+        self.celebrity = Celebrity.objects.create(name="Test Celebrity")
+        self.movie = Movie.objects.create(title="Test Movie", year=2020)
+        self.start = self.client.get(self.url, {"since": "latest"}).data["next"]
+
+    def get_changes(self, since=None, **params):
+        since = self.start if since is None else since
+        response = self.client.get(self.url, {"since": since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_writes_are_logged(self):
+        self.movie.cast.add(self.celebrity)
+        self.movie.genres.add(Genre.objects.create(name="Action"))
+        review = Review.objects.create(user=self.user, movie=self.movie, userRating=8)
+        update_rating(self.movie, 8)
+        other = Movie.objects.create(title="Other Movie", year=2020)
+        other_id = other.id
+        other.delete()
+
+        data = self.get_changes()
+        self.assertFalse(data["more"])
+        self.assertEqual(
+            data["changes"]["saved"],
+            {
+                "movie": [self.movie.id],
+                "celebrity": [self.celebrity.id],
+                "review": [review.id],
+            },
+        )
+        self.assertEqual(data["changes"]["deleted"], {"movie": [other_id]})
+        self.assertEqual(self.get_changes(data["next"])["changes"]["saved"], {})
+
+    def test_batches(self):
+        movies = [Movie.objects.create(title=f"Movie {i}", year=2020) for i in range(3)]
+        data = self.get_changes(limit=2)
+        self.assertTrue(data["more"])
+        self.assertEqual(
+            data["changes"]["saved"]["movie"], [movies[0].id, movies[1].id]
+        )
+        data = self.get_changes(data["next"], limit=2)
+        self.assertFalse(data["more"])
+        self.assertEqual(data["changes"]["saved"]["movie"], [movies[2].id])
+
+    def test_soft_deletes_are_logged(self):
+        review = Review.objects.create(user=self.user, movie=self.movie, userRating=8)
+        deletion.delete_user(self.user)
+        data = self.get_changes()
+        self.assertEqual(data["changes"]["deleted"], {"review": [review.id]})
+        deletion.delete_movie(self.movie)
+        data = self.get_changes(data["next"])
+        self.assertEqual(
+            data["changes"]["deleted"],
+            {"review": [review.id], "movie": [self.movie.id]},
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"since": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        CHANGE_FEED={
+            "BATCH_SIZE": 500,
+            "MAX_BATCH_SIZE": 5000,
+            "RETENTION": 3600,
+            "PRUNE_BATCH_SIZE": 1,
+        }
+    )
+    def test_prune(self):
+        for i in range(2):
+            Movie.objects.create(title=f"Movie {i}", year=2020)
+        Change.objects.update(createdAt=timezone.now() - timedelta(hours=2))
+        latest = self.get_changes()["next"]
+        call_command("prune_changes", stdout=open(os.devnull, "w"))
+        # The latest entry is kept.
+        self.assertEqual(list(Change.objects.values_list("pk", flat=True)), [latest])
+
+        response = self.client.get(self.url, {"since": self.start})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.get_changes(latest - 1)["next"], latest)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("", views.ChangeFeedView.as_view(), name="changes"),
+]
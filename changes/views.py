@@ -0,0 +1,64 @@
+from django.conf import settings
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .log import is_pruned, latest_cursor, read_changes
+
+
+def get_non_negative_int(query_params, name, default=None):
+    value = query_params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: "Must be a non negative integer."})
+    if value < 0:
+        raise ValidationError({name: "Must be a non negative integer."})
+    return value
+
+
+@extend_schema(
+    description=(
+        "Movies, reviews and celebrities saved or deleted after the ?since= "
+        "cursor, grouped by action and model, with the cursor to pass next. "
+        "?since=latest only returns the current cursor, to follow the changes "
+        "after a full crawl. ?limit= caps the entries read, and more tells if "
+        "there are further changes."
+    ),
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT, description="Changes after the cursor"
+        ),
+        400: OpenApiResponse(description="Invalid cursor or limit"),
+        410: OpenApiResponse(
+            description="Changes after the cursor were pruned, crawl again"
+        ),
+    },
+)
+class ChangeFeedView(APIView):
+    def get(self, request):
+        config = settings.CHANGE_FEED
+        if request.query_params.get("since") == "latest":
+            return Response(
+                {
+                    "next": latest_cursor(),
+                    "more": False,
+                    "changes": {"saved": {}, "deleted": {}},
+                }
+            )
+
+        since = get_non_negative_int(request.query_params, "since")
+        limit = get_non_negative_int(
+            request.query_params, "limit", config["BATCH_SIZE"]
+        )
+        limit = min(max(limit, 1), config["MAX_BATCH_SIZE"])
+        if is_pruned(since):
+            return Response(
+                {"detail": "Changes after this cursor were pruned."},
+                status=status.HTTP_410_GONE,
+            )
+        changes, cursor, more = read_changes(since, limit)
+        return Response({"next": cursor, "more": more, "changes": changes})
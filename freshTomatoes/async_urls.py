@@ -0,0 +1,22 @@
+"""
+URL configuration of the GET requests served under ASGI. The async read
+views and the live streams come first, every other route falls through to
+freshTomatoes.urls.
+"""
+
+from django.urls import include, path
+
+from movies.async_views import (
+    AsyncMovieDetailView,
+    AsyncMovieListView,
+    MovieRatingsStreamView,
+)
+from reviews.async_views import AsyncReviewListView
+
+urlpatterns = [
+    path("movies/", AsyncMovieListView.as_view()),
+    path("movies/<int:pk>/", AsyncMovieDetailView.as_view()),
+    path("movies/live/", MovieRatingsStreamView.as_view(), name="movie_live"),
+    path("reviews/", AsyncReviewListView.as_view()),
+    path("", include("freshTomatoes.urls")),
+]
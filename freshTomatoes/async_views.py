@@ -0,0 +1,43 @@
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .renderers import dumps
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+def exception_response(exc):
+    """
+    Renders an API exception the way DRF's exception handler does
+    """
+    data = exc.detail
+    if not isinstance(data, (list, dict)):
+        data = {"detail": data}
+    return json_response(data, exc.status_code)
+
+
+class AsyncReadView(View):
+    """
+    Base of the async read views served under ASGI. Subclasses implement
+    get_data() and return the same data as their DRF counterpart; API
+    exceptions are rendered the way DRF's exception handler does. get_data()
+    may set compression_key to tag the response for the compression cache.
+    """
+
+    compression_key = None
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            data = await self.get_data(Request(request), *args, **kwargs)
+        except APIException as exc:
+            return exception_response(exc)
+        response = json_response(data)
+        response.compression_key = self.compression_key
+        return response
+
+    async def get_data(self, request, *args, **kwargs):
+        raise NotImplementedError
@@ -0,0 +1,199 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection, connections
+from django.urls import Resolver404, resolve
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.auth import session_user
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+# Outer request headers every sub-request inherits.
+INHERITED_META = (
+    "HTTP_COOKIE",
+    "HTTP_ACCEPT_LANGUAGE",
+    "HTTP_USER_AGENT",
+    "HTTP_X_FORWARDED_FOR",
+    "REMOTE_ADDR",
+    "SERVER_NAME",
+    "SERVER_PORT",
+    "wsgi.url_scheme",
+)
+
+
+def parse_requests(data):
+    """
+    Validates the sub-requests of a batch
+    """
+    requests = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(requests, list) or not requests:
+        raise ValidationError("requests must be a non empty list.")
+    if len(requests) > settings.BATCH_REQUESTS["MAX_REQUESTS"]:
+        raise ValidationError(
+            f"At most {settings.BATCH_REQUESTS['MAX_REQUESTS']} requests are allowed."
+        )
+    parsed = []
+    for item in requests:
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise ValidationError("Every request needs a path.")
+        method = str(item.get("method", "GET")).upper()
+        if method not in METHODS:
+            raise ValidationError(f"Method {method} is not allowed.")
+        url = urlsplit(item["path"])
+        if not url.path.startswith("/") or url.path.startswith("/batch"):
+            raise ValidationError(f"Invalid path {item['path']}.")
+        parsed.append((method, url.path, url.query, item.get("body")))
+    return parsed
+
+
+def build_request(outer, method, path, query, body, user):
+    content = b"" if body is None else json.dumps(body).encode()
+    environ = {key: outer.META[key] for key in INHERITED_META if key in outer.META}
+    environ.update(
+        {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(content)),
+            "wsgi.input": io.BytesIO(content),
+        }
+    )
+    request = WSGIRequest(environ)
+    # The session user was looked up once for the whole batch, until a
+    # sub-request changes the session cookie.
+    request.session_user = user
+    return request
+
+
+def dispatch(request):
+    """
+    Runs a sub-request through its view and returns its status, headers and
+    data, with the cookies it set
+    """
+    try:
+        match = resolve(request.path_info)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    except Resolver404:
+        not_found = {"status": 404, "headers": {}, "body": {"detail": "Not found."}}
+        return not_found, SimpleCookie()
+    except Exception as exc:
+        response = response_for_exception(request, exc)
+
+    if hasattr(response, "data"):
+        body = response.data
+    elif response.get("Content-Type", "").startswith("application/json"):
+        body = json.loads(response.content or b"null")
+    else:
+        body = response.content.decode(response.charset or "utf-8")
+    headers = {
+        key: value
+        for key, value in response.items()
+        if key not in ("Content-Type", "Content-Length", "Vary")
+    }
+    result = {"status": response.status_code, "headers": headers, "body": body}
+    return result, response.cookies
+
+
+def apply_cookies(cookies, requests):
+    """
+    Passes the cookies a sub-response set or deleted on to the sub-requests
+    after it. A login or logout changes the session cookie, so their session
+    user is looked up again.
+    """
+    for request in requests:
+        for name, morsel in cookies.items():
+            if morsel["max-age"] == 0:
+                request.COOKIES.pop(name, None)
+            else:
+                request.COOKIES[name] = morsel.value
+        if hasattr(request, "session_user"):
+            del request.session_user
+
+
+def dispatch_in_thread(request):
+    try:
+        return dispatch(request)
+    finally:
+        # Worker threads open their own connections, close them with the task.
+        connections.close_all()
+
+
+def run_batch(requests):
+    """
+    Dispatches the sub-requests in order. Runs of consecutive GETs are
+    executed concurrently, unless the batch runs inside a transaction whose
+    uncommitted writes other connections could not see. Returns their
+    results and the cookies they set, for the batch response.
+    """
+    workers = settings.BATCH_REQUESTS["MAX_WORKERS"]
+    concurrent = workers > 1 and not connection.in_atomic_block
+    results = []
+    cookies = SimpleCookie()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        index = 0
+        while index < len(requests):
+            end = index + 1
+            while (
+                concurrent
+                and end < len(requests)
+                and requests[index].method == "GET"
+                and requests[end].method == "GET"
+            ):
+                end += 1
+            if end - index > 1:
+                dispatched = executor.map(dispatch_in_thread, requests[index:end])
+            else:
+                dispatched = [dispatch(requests[index])]
+            for result, set_cookies in dispatched:
+                results.append(result)
+                if set_cookies:
+                    apply_cookies(set_cookies, requests[end:])
+                    cookies.update(set_cookies)
+            index = end
+    return results, cookies
+
+
+@extend_schema(
+    description=(
+        "Run several API requests in one round trip. Consecutive GET requests "
+        "are executed concurrently, the rest in order."
+    ),
+    request=OpenApiTypes.OBJECT,
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Responses of every request, in order",
+        ),
+        400: OpenApiResponse(description="Invalid batch"),
+    },
+)
+class BatchView(APIView):
+    def post(self, request):
+        parsed = parse_requests(request.data)
+        try:
+            user = session_user(request)
+        except ObjectDoesNotExist:
+            user = None
+        requests = [
+            build_request(request, method, path, query, body, user)
+            for method, path, query, body in parsed
+        ]
+        results, cookies = run_batch(requests)
+        response = Response({"responses": results}, status=status.HTTP_200_OK)
+        response.cookies.update(cookies)
+        return response
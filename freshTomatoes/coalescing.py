@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+MISSING = object()
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time: callers asking for a key that is
+    already being computed wait for that computation and share its result or
+    exception. Threads of a worker wait on an event, coroutines of its event
+    loop on a future, and with CROSS_WORKER the workers take turns through a
+    lock in the cache backend.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.futures = {}
+        self.counters = dict.fromkeys(
+            ["computed", "coalesced", "coalesced_across_workers", "lock_timeouts"], 0
+        )
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def do(self, key, func):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            self.count("coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.run(key, func)
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    async def ado(self, key, func):
+        """
+        do() for coroutine functions, called from async views
+        """
+        future = self.futures.get(key)
+        if future is not None:
+            self.count("coalesced")
+            # Followers must not cancel the leader's computation.
+            return await asyncio.shield(future)
+
+        future = self.futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self.arun(key, func)
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            # Retrieve it, so that leaders without followers do not log it.
+            future.exception()
+            raise
+        finally:
+            del self.futures[key]
+
+    def run(self, key, func):
+        config = settings.REQUEST_COALESCING
+        if config["CROSS_WORKER"]:
+            lock_key, result_key = shared_keys(key)
+            token = uuid.uuid4().hex
+            if not cache.add(lock_key, token, config["LOCK_TIMEOUT"]):
+                result = self.wait_shared(lock_key, result_key)
+                if result is not MISSING:
+                    return result
+                self.count("computed")
+                return func()
+            self.count("computed")
+            try:
+                result = func()
+                # Kept as long as the lock could be, for the workers polling.
+                cache.set(f"{result_key}:{token}", result, config["LOCK_TIMEOUT"])
+                return result
+            finally:
+                cache.delete(lock_key)
+        self.count("computed")
+        return func()
+
+    def wait_shared(self, lock_key, result_key):
+        """
+        Polls the result of the worker holding the lock, until it releases
+        it or the lock times out
+        """
+        config = settings.REQUEST_COALESCING
+        token = cache.get(lock_key)
+        deadline = time.monotonic() + config["LOCK_TIMEOUT"]
+        while token is not None and time.monotonic() < deadline:
+            time.sleep(config["POLL_INTERVAL_MS"] / 1000)
+            # The result is stored before the lock is released.
+            held = cache.get(lock_key) == token
+            result = cache.get(f"{result_key}:{token}", MISSING)
+            if result is not MISSING:
+                self.count("coalesced_across_workers")
+                return result
+            if not held:
+                return MISSING
+        if token is not None:
+            self.count("lock_timeouts")
+        return MISSING
+
+    async def arun(self, key, func):
+        config = settings.REQUEST_COALESCING
+        if config["CROSS_WORKER"]:
+            lock_key, result_key = shared_keys(key)
+            token = uuid.uuid4().hex
+            if not await cache.aadd(lock_key, token, config["LOCK_TIMEOUT"]):
+                result = await self.await_shared(lock_key, result_key)
+                if result is not MISSING:
+                    return result
+                self.count("computed")
+                return await func()
+            self.count("computed")
+            try:
+                result = await func()
+                await cache.aset(
+                    f"{result_key}:{token}", result, config["LOCK_TIMEOUT"]
+                )
+                return result
+            finally:
+                await cache.adelete(lock_key)
+        self.count("computed")
+        return await func()
+
+    async def await_shared(self, lock_key, result_key):
+        config = settings.REQUEST_COALESCING
+        token = await cache.aget(lock_key)
+        deadline = time.monotonic() + config["LOCK_TIMEOUT"]
+        while token is not None and time.monotonic() < deadline:
+            await asyncio.sleep(config["POLL_INTERVAL_MS"] / 1000)
+            held = await cache.aget(lock_key) == token
+            result = await cache.aget(f"{result_key}:{token}", MISSING)
+            if result is not MISSING:
+                self.count("coalesced_across_workers")
+                return result
+            if not held:
+                return MISSING
+        if token is not None:
+            self.count("lock_timeouts")
+        return MISSING
+
+
+def shared_keys(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"flight:lock:{digest}", f"flight:result:{digest}"
+
+
+_flight = SingleFlight()
+
+
+def coalesce(key, func):
+    """
+    Returns func(), sharing the call with the concurrent callers of the same
+    key
+    """
+    if not settings.REQUEST_COALESCING["ENABLED"]:
+        return func()
+    return _flight.do(key, func)
+
+
+async def acoalesce(key, func):
+    """
+    Returns await func(), sharing the call with the concurrent callers of the
+    same key
+    """
+    if not settings.REQUEST_COALESCING["ENABLED"]:
+        return await func()
+    return await _flight.ado(key, func)
+
+
+def stats():
+    return _flight.stats()
+
+
+@extend_schema(
+    description=(
+        "Counters of the request coalescing of the worker serving the request: "
+        "computations run, and requests that waited for one of this worker or "
+        "of another worker instead"
+    ),
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT, description="Counters of this worker"
+        ),
+    },
+)
+class CoalescingStatsView(APIView):
+    def get(self, request):
+        return Response(dict(stats(), worker=os.getpid()))
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def gzip_compress(body):
+    # A fixed mtime keeps the output, and so its cache entry, deterministic.
+    return gzip.compress(body, settings.RESPONSE_COMPRESSION["GZIP_LEVEL"], mtime=0)
+
+
+def brotli_compress(body):
+    return brotli.compress(
+        body, quality=settings.RESPONSE_COMPRESSION["BROTLI_QUALITY"]
+    )
+
+
+def zstd_compress(body):
+    level = settings.RESPONSE_COMPRESSION["ZSTD_LEVEL"]
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# Encodings whose backend is installed.
+ENCODERS = {"gzip": gzip_compress}
+if brotli is not None:
+    ENCODERS["br"] = brotli_compress
+if zstandard is not None:
+    ENCODERS["zstd"] = zstd_compress
+
+
+def accepted_encodings(header):
+    """
+    Returns the encodings of an Accept-Encoding header not refused with q=0
+    """
+    accepted = set()
+    for item in header.split(","):
+        encoding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if encoding and quality > 0:
+            accepted.add(encoding.lower())
+    return accepted
+
+
+def negotiate(header):
+    """
+    Returns the first encoding of RESPONSE_COMPRESSION["ENCODINGS"] that is
+    available and accepted by the client, or None
+    """
+    accepted = accepted_encodings(header)
+    for encoding in settings.RESPONSE_COMPRESSION["ENCODINGS"]:
+        if encoding in ENCODERS and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+def compress(body, encoding, key=None):
+    """
+    Compresses a body. Bodies tagged with a key, which identifies the content
+    they were rendered from, are compressed once per encoding and read back
+    from the compression cache by that key, without looking at the body.
+    """
+    if key is None:
+        return ENCODERS[encoding](body)
+    cache = caches[settings.RESPONSE_COMPRESSION["CACHE"]]
+    key = f"compressed:{encoding}:{hashlib.sha256(key.encode()).hexdigest()}"
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = ENCODERS[encoding](body)
+        cache.set(key, compressed)
+    return compressed
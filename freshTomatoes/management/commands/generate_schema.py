@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from freshTomatoes.schema import FORMATS, schema_path, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI schema of the deployed code version"
+
+    def handle(self, *args, **options):
+        if not settings.OPENAPI_SCHEMA["VERSION"]:
+            raise CommandError(
+                "No code version, set RENDER_GIT_COMMIT or CODE_VERSION first."
+            )
+        for schema_format in FORMATS:
+            write_schema(schema_format)
+            self.stdout.write(f"Wrote {schema_path(schema_format)}")
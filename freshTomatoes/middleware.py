@@ -0,0 +1,190 @@
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .compression import compress, negotiate
+from .replication import record_writes, replica_reads
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PRIMARY_PIN_COOKIE = "primary_pin"
+COMPRESSIBLE_TYPES = re.compile(r"^(application/.*(json|yaml)|text/)")
+
+
+class AsyncCapableMiddleware:
+    """
+    Middleware that runs natively in both stacks: handle() serves WSGI
+    requests and ahandle() ASGI ones, so an ASGI request is never handed to
+    a thread just to go through it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Serves safe requests from the read replicas. Clients whose request
+    successfully wrote replicated data are pinned to the primary for
+    REPLICA_PIN_SECONDS so they read their own writes until the next snapshot
+    reaches the replicas.
+    """
+
+    def handle(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            with record_writes() as written:
+                response = self.get_response(request)
+            return self.pin_to_primary(response, written)
+
+        if PRIMARY_PIN_COOKIE in request.COOKIES:
+            return self.get_response(request)
+
+        with replica_reads():
+            return self.get_response(request)
+
+    async def ahandle(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            with record_writes() as written:
+                response = await self.get_response(request)
+            return self.pin_to_primary(response, written)
+
+        if PRIMARY_PIN_COOKIE in request.COOKIES:
+            return await self.get_response(request)
+
+        with replica_reads():
+            return await self.get_response(request)
+
+    def pin_to_primary(self, response, written):
+        # Failed requests and writes outside the replicated apps leave
+        # nothing the replicas could be missing.
+        if not written or response.status_code >= 400:
+            return response
+        response.set_cookie(
+            key=PRIMARY_PIN_COOKIE,
+            value="1",
+            max_age=settings.REPLICA_PIN_SECONDS,
+            secure=True,
+            httponly=True,
+            samesite="None",
+        )
+        return response
+
+
+class CompressionMiddleware(AsyncCapableMiddleware):
+    """
+    Compresses responses of at least RESPONSE_COMPRESSION["MIN_SIZE"] bytes
+    with the preferred encoding the client accepts. Views tag the responses
+    they build from cached documents with a compression_key, whose compressed
+    bodies are cached so they are compressed only once per encoding.
+    """
+
+    def handle(self, request):
+        response = self.get_response(request)
+        encoding = self.get_encoding(request, response)
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding, self.get_key(response))
+        return self.set_content(response, compressed, encoding)
+
+    async def ahandle(self, request):
+        response = await self.get_response(request)
+        encoding = self.get_encoding(request, response)
+        if encoding is None:
+            return response
+        compressed = await sync_to_async(compress, thread_sensitive=False)(
+            response.content, encoding, self.get_key(response)
+        )
+        return self.set_content(response, compressed, encoding)
+
+    def get_encoding(self, request, response):
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not COMPRESSIBLE_TYPES.match(response.get("Content-Type", ""))
+        ):
+            return None
+        patch_vary_headers(response, ["Accept-Encoding"])
+        if len(response.content) < settings.RESPONSE_COMPRESSION["MIN_SIZE"]:
+            return None
+        return negotiate(request.headers.get("Accept-Encoding", ""))
+
+    def get_key(self, response):
+        key = getattr(response, "compression_key", None)
+        if key is None:
+            return None
+        return f"{response.status_code}:{response['Content-Type']}:{key}"
+
+    def set_content(self, response, compressed, encoding):
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The compressed body is no longer byte for byte the one tagged.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware able to run in an async middleware stack. Only the
+    requests for static files are handed to a thread.
+    """
+
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return super().__call__(request)
+
+    async def ahandle(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class AsyncReadMiddleware(AsyncCapableMiddleware):
+    """
+    Routes the GET requests of ASGI servers to the async read views of
+    ASYNC_URLCONF. WSGI requests keep the synchronous views.
+    """
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        if request.method in ("GET", "HEAD"):
+            request.urlconf = settings.ASYNC_URLCONF
+        return await self.get_response(request)
@@ -1,7 +1,90 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 
 
+def generation_key(model):
+    return f"count-generation:{model._meta.label_lower}"
+
+
+def new_generation():
+    # A generation lost to eviction restarts from a value never used before,
+    # so counts cached under an earlier generation cannot be served again.
+    return time.time_ns()
+
+
+def invalidate_counts(models):
+    """
+    Moves the cached counts of lists of the given models to a new
+    generation, so they are counted again
+    """
+    for model in models:
+        try:
+            cache.incr(generation_key(model))
+        except ValueError:
+            cache.set(generation_key(model), new_generation(), None)
+
+
+def get_generations(models):
+    keys = [generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, new_generation(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+async def aget_generations(models):
+    keys = [generation_key(model) for model in models]
+    generations = await cache.aget_many(keys)
+    for key in keys:
+        if key not in generations:
+            await cache.aadd(key, new_generation(), None)
+            generations[key] = await cache.aget(key)
+    return [generations[key] for key in keys]
+
+
+def count_key(queryset, request, models, ignored):
+    """
+    Key of the count of a list: its path and filters, without the parameters
+    that do not change the count, and the current generation of every model
+    the filters read
+    """
+    return generation_count_key(queryset, request, get_generations(models), ignored)
+
+
+async def acount_key(queryset, request, models, ignored):
+    return generation_count_key(
+        queryset, request, await aget_generations(models), ignored
+    )
+
+
+def generation_count_key(queryset, request, generations, ignored):
+    filters = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+        if name not in ignored
+    )
+    digest = hashlib.sha256(repr((request.path, filters)).encode()).hexdigest()
+    versions = ".".join(str(generation) for generation in generations)
+    return f"count:{queryset.model._meta.label_lower}:{versions}:{digest}"
+
+
 class HTTPSPageNumberPagination(PageNumberPagination):
+    # ?count=exact counts every result, through a cache invalidated on writes.
+    # ?count=approx counts at most APPROX_LIMIT results past the page and
+    # ?count=none only reads one row past the page to know if there is a next.
+    count_query_param = "count"
+    count_modes = ("exact", "approx", "none")
+    # Query parameters that do not change the number of results.
+    uncounted_params = ("page", "count", "ordering", "fields", "expand", "format")
+
     def get_next_link(self):
         next_link = super().get_next_link()
         if next_link is not None:
@@ -13,3 +96,138 @@ class HTTPSPageNumberPagination(PageNumberPagination):
         if previous_link is not None:
             return previous_link.replace("http://", "https://")
         return None
+
+    def get_count_mode(self, request):
+        mode = request.query_params.get(self.count_query_param, "exact")
+        if mode not in self.count_modes:
+            message = f"Must be one of {', '.join(self.count_modes)}."
+            raise ValidationError({self.count_query_param: message})
+        return mode
+
+    def get_page_offset(self, request, page_size):
+        """
+        Offset of the requested page, or None when it is not a page number
+        ("last", invalid pages) and the results must be counted
+        """
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            return None
+        return (number - 1) * page_size if number >= 1 else None
+
+    def get_count_key(self, queryset, request, view):
+        """
+        Cache key of the count, for views listing the count_models whose
+        writes change their counts. Other views count every time.
+        """
+        models = getattr(view, "count_models", None)
+        if not models:
+            return None
+        return count_key(queryset, request, models, self.uncounted_params)
+
+    async def aget_count_key(self, queryset, request, view):
+        models = getattr(view, "count_models", None)
+        if not models:
+            return None
+        return await acount_key(queryset, request, models, self.uncounted_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.count_mode = self.get_count_mode(request)
+        self.approximate = False
+        paginator = self.django_paginator_class(queryset, page_size)
+        offset = self.get_page_offset(request, page_size)
+        rows = None
+        if offset is None or self.count_mode == "exact":
+            key = self.get_count_key(queryset, request, view)
+            paginator.count = cache.get(key) if key else None
+            if paginator.count is None:
+                paginator.count = queryset.count()
+                if key:
+                    cache.set(
+                        key, paginator.count, settings.PAGINATION_COUNTS["TIMEOUT"]
+                    )
+        elif self.count_mode == "approx":
+            key = self.get_count_key(queryset, request, view)
+            paginator.count = cache.get(key) if key else None
+            if paginator.count is None:
+                limit = offset + page_size + settings.PAGINATION_COUNTS["APPROX_LIMIT"]
+                paginator.count = queryset[:limit].count()
+                self.approximate = paginator.count == limit
+        else:
+            rows = list(queryset[offset : offset + page_size + 1])
+            paginator.count = offset + len(rows)
+        self.set_page(paginator, request, rows)
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset for async views, counting and fetching the page
+        with the async ORM
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.count_mode = self.get_count_mode(request)
+        self.approximate = False
+        paginator = self.django_paginator_class(queryset, page_size)
+        offset = self.get_page_offset(request, page_size)
+        rows = None
+        # Paginator.count is a cached property, set it to skip the sync count.
+        if offset is None or self.count_mode == "exact":
+            key = await self.aget_count_key(queryset, request, view)
+            paginator.count = await cache.aget(key) if key else None
+            if paginator.count is None:
+                paginator.count = await queryset.acount()
+                if key:
+                    await cache.aset(
+                        key, paginator.count, settings.PAGINATION_COUNTS["TIMEOUT"]
+                    )
+        elif self.count_mode == "approx":
+            key = await self.aget_count_key(queryset, request, view)
+            paginator.count = await cache.aget(key) if key else None
+            if paginator.count is None:
+                limit = offset + page_size + settings.PAGINATION_COUNTS["APPROX_LIMIT"]
+                paginator.count = await queryset[:limit].acount()
+                self.approximate = paginator.count == limit
+        else:
+            rows = [row async for row in queryset[offset : offset + page_size + 1]]
+            paginator.count = offset + len(rows)
+        self.set_page(paginator, request, rows)
+        if rows is None:
+            self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+    def set_page(self, paginator, request, rows):
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        if rows is not None:
+            # The page was read along with the row telling if there is a next.
+            self.page.object_list = rows[: paginator.per_page]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count_mode == "none":
+            response.data["count"] = None
+        elif self.count_mode == "approx":
+            response.data["approximate"] = self.approximate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"]["nullable"] = True
+        return schema
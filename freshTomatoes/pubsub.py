@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    Messages of some keys of a channel, for one consumer running in an event
+    loop. Messages are coalesced per key: a read returns the last message of
+    every key published since the previous read.
+    """
+
+    def __init__(self, broker, channel, keys, loop):
+        self.broker = broker
+        self.channel = channel
+        self.keys = set(keys)
+        self.loop = loop
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def deliver(self, key, message):
+        self.pending[key] = message
+        self.ready.set()
+
+    async def get(self, timeout=None):
+        """
+        Waits for messages, and returns them as {key: message}, or {} once the
+        timeout expires
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self.ready.clear()
+        messages, self.pending = self.pending, {}
+        return messages
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    Dispatches the messages published in this process to the subscriptions
+    to their channel and key, in the event loop of every subscription, so
+    that publishers can be threads of the sync views
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, channel, keys):
+        subscription = Subscription(self, channel, keys, asyncio.get_running_loop())
+        with self.lock:
+            for key in subscription.keys:
+                self.subscriptions.setdefault((channel, key), set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for key in subscription.keys:
+                subscriptions = self.subscriptions.get((subscription.channel, key))
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self.subscriptions[(subscription.channel, key)]
+
+    def dispatch(self, channel, key, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get((channel, key), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.deliver, key, message
+                )
+            except RuntimeError:
+                # Its event loop is closed.
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """
+    Delivers the messages to the subscribers of this process only. Backends
+    shared by the workers (Redis pub/sub, Postgres LISTEN/NOTIFY) send the
+    messages to every process in publish(), and pass the messages they
+    receive to broker.dispatch(). Messages must then be JSON serializable.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, channel, key, message):
+        self.broker.dispatch(channel, key, message)
+
+
+_broker = Broker()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.PUBSUB["BACKEND"])(_broker)
+        return _backend
+
+
+def publish(channel, key, message):
+    get_backend().publish(channel, key, message)
+
+
+def subscribe(channel, keys):
+    """
+    Subscribes the running event loop to the messages of the given keys of a
+    channel
+    """
+    get_backend()
+    return _broker.subscribe(channel, keys)
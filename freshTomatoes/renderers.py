@@ -0,0 +1,58 @@
+import json
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Encodes the values JSON has no type for the way JSONRenderer does, with
+    Decimals such as userRating written as numbers
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _encoder.default(obj)
+
+
+_json_encoder = json.JSONEncoder(
+    default=encode_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+)
+
+
+def dumps(data):
+    if orjson is not None:
+        content = orjson.dumps(
+            data,
+            default=encode_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    else:
+        content = _json_encoder.encode(data).encode()
+    # Same strict javascript subset as JSONRenderer.
+    if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+        content = content.replace(b"\xe2\x80\xa8", b"\\u2028")
+        content = content.replace(b"\xe2\x80\xa9", b"\\u2029")
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSONRenderer backed by orjson when it is installed, and by the C
+    encoder of the json module otherwise. Indented output, asked for by the
+    browsable API, is left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
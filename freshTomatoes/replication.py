@@ -0,0 +1,102 @@
+import os
+import random
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from asgiref.local import Local
+from django.conf import settings
+
+# Apps whose read traffic may be served from a replica.
+REPLICATED_APPS = {"movies", "reviews"}
+
+_state = Local()
+
+
+@contextmanager
+def replica_reads():
+    """
+    Route reads of replicated apps to the replicas inside the block
+    """
+    previous = getattr(_state, "use_replicas", False)
+    _state.use_replicas = True
+    try:
+        yield
+    finally:
+        _state.use_replicas = previous
+
+
+@contextmanager
+def record_writes(written=None):
+    """
+    Collect in the yielded set the labels of the replicated apps written
+    inside the block, adding them to written when given
+    """
+    written = set() if written is None else written
+    previous = getattr(_state, "written", None)
+    _state.written = written
+    try:
+        yield written
+    finally:
+        _state.written = previous
+
+
+def recorded_writes():
+    """
+    Returns the set collecting the writes of the enclosing record_writes()
+    block, None outside of one
+    """
+    return getattr(_state, "written", None)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            replicas
+            and getattr(_state, "use_replicas", False)
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        written = recorded_writes()
+        if written is not None and model._meta.app_label in REPLICATED_APPS:
+            written.add(model._meta.app_label)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def replica_path(alias):
+    """
+    Returns the file path of a replica configured as a read-only sqlite URI
+    """
+    name = str(settings.DATABASES[alias]["NAME"])
+    if name.startswith("file:"):
+        return urlparse(name).path
+    return name
+
+
+def snapshot(source, target):
+    """
+    Copies the sqlite database at source into target using the online backup
+    API, then swaps the copy in atomically so readers never see a partial file
+    """
+    tmp_target = f"{target}.tmp"
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(tmp_target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_target, target)
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+from .compression import accepted_encodings
+
+FORMATS = {
+    "yaml": (OpenApiYamlRenderer, "application/vnd.oai.openapi", "yaml"),
+    "json": (OpenApiJsonRenderer, "application/vnd.oai.openapi+json", "json"),
+}
+
+
+class RenderedSchema:
+    """
+    Rendered schema with its gzip copy and the ETags of both, computed once
+    """
+
+    def __init__(self, body, gzipped=None):
+        self.body = body
+        self.gzipped = gzipped if gzipped is not None else gzip.compress(body, 9)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # Strong ETags identify the bytes sent, which differ once gzipped.
+        self.gzipped_etag = f'"{digest}-gzip"'
+
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def schema_path(schema_format):
+    """
+    Returns the file the schema of the deployed code version is written to,
+    or None when the version is unknown
+    """
+    version = settings.OPENAPI_SCHEMA["VERSION"]
+    if not version:
+        return None
+    extension = FORMATS[schema_format][2]
+    return os.path.join(
+        settings.OPENAPI_SCHEMA["DIR"], f"openapi-{version[:40]}.{extension}"
+    )
+
+
+def generate(schema_format):
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    renderer = FORMATS[schema_format][0]()
+    return renderer.render(schema, renderer_context={})
+
+
+def write_schema(schema_format):
+    """
+    Generates the schema and writes it, with its gzip copy, next to the ones
+    of other code versions
+    """
+    rendered = RenderedSchema(generate(schema_format))
+    path = schema_path(schema_format)
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for target, data in ((path, rendered.body), (f"{path}.gz", rendered.gzipped)):
+            with open(f"{target}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{target}.tmp", target)
+    return rendered
+
+
+def read_schema(schema_format):
+    path = schema_path(schema_format)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+        with open(f"{path}.gz", "rb") as f:
+            gzipped = f.read()
+    except FileNotFoundError:
+        return None
+    return RenderedSchema(body, gzipped)
+
+
+def get_schema(schema_format):
+    """
+    Returns the schema of the deployed code version, read from disk or
+    generated on the first request and kept for the life of the process
+    """
+    key = (schema_format, settings.OPENAPI_SCHEMA["VERSION"])
+    rendered = _schemas.get(key)
+    if rendered is None:
+        with _schemas_lock:
+            rendered = _schemas.get(key)
+            if rendered is None:
+                rendered = read_schema(schema_format) or write_schema(schema_format)
+                _schemas[key] = rendered
+    return rendered
+
+
+class CachedSchemaView(View):
+    """
+    Serves the pregenerated OpenAPI schema. YAML by default, JSON with
+    ?format=json or an Accept header asking for it.
+    """
+
+    def get(self, request, *args, **kwargs):
+        schema_format = request.GET.get("format")
+        if schema_format not in FORMATS:
+            accept = request.headers.get("Accept", "")
+            schema_format = "json" if "json" in accept else "yaml"
+        rendered = get_schema(schema_format)
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        gzipped = "gzip" in accepted or "*" in accepted
+        etag = rendered.gzipped_etag if gzipped else rendered.etag
+
+        if self.matches(etag, request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(
+                rendered.gzipped, content_type=FORMATS[schema_format][1]
+            )
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(
+                rendered.body, content_type=FORMATS[schema_format][1]
+            )
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=0, must-revalidate"
+        patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+        return response
+
+    def matches(self, etag, header):
+        """
+        Whether an If-None-Match header lists the ETag, compared weakly
+        """
+        etags = parse_etags(header)
+        if etags == ["*"]:
+            return True
+        return etag in [tag.removeprefix("W/") for tag in etags]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -47,14 +48,18 @@ INSTALLED_APPS = [
     "rest_framework.authtoken",
     "drf_spectacular",
     "corsheaders",
+    # Project-wide management commands.
+    "freshTomatoes",
     "users",
     "movies",
     "reviews",
+    "changes",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "freshTomatoes.middleware.CompressionMiddleware",
+    "freshTomatoes.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,10 +67,30 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "freshTomatoes.middleware.ReplicaRoutingMiddleware",
+    "freshTomatoes.middleware.AsyncReadMiddleware",
 ]
 
+# Under ASGI, GET requests are resolved against ASYNC_URLCONF first, whose
+# async views serve the movie and review reads without a thread per request.
+ASYNC_URLCONF = "freshTomatoes.async_urls"
+
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Responses of at least MIN_SIZE bytes are compressed with the first of
+# ENCODINGS the client accepts. br and zstd are used when the brotli and
+# zstandard packages are installed. The compressed bodies of responses whose
+# view tags them with a compression key, built from the documents they
+# present, are kept in the CACHE alias.
+RESPONSE_COMPRESSION = {
+    "MIN_SIZE": 1024,
+    "ENCODINGS": ["br", "zstd", "gzip"],
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,
+    "ZSTD_LEVEL": 3,
+    "CACHE": "compression",
+}
+
 CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOW_HEADERS = [
@@ -111,6 +136,192 @@ DATABASES = {
     }
 }
 
+# Read-only copies of the primary database, refreshed with
+# `python manage.py snapshot_replicas`. GET traffic for movies and reviews is
+# spread over them, writes always go to the primary.
+DATABASE_REPLICAS = [
+    f"replica_{i}"
+    for i in range(1, int(os.environ.get("DATABASE_REPLICA_COUNT", 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{BASE_DIR / f'db.{alias}.sqlite3'}?mode=ro",
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["freshTomatoes.replication.ReadReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after a write.
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 30))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Compressed bodies get a cache of their own, so large pages never evict the
+# movie documents, count generations and other entries of the default cache.
+# The rate limit counters and the movie documents get their own too, and
+# both must be shared by every worker (Redis, Memcached) in production: with
+# a per-process cache every worker allows its own RATE requests, and the
+# invalidation of a movie's document only reaches the worker that wrote it
+# while the others serve it stale until MOVIE_CACHE["TIMEOUT"].
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "compression": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "compression",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 500},
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+    },
+    "movies": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "movies",
+    },
+}
+
+
+# Optional single writer thread for review writes. POSTs are queued and
+# committed in batches instead of competing for the sqlite write lock.
+REVIEW_WRITE_QUEUE = {
+    "ENABLED": os.environ.get("REVIEW_WRITE_QUEUE", "") == "1",
+    "MAX_SIZE": 1000,
+    "BATCH_SIZE": 64,
+    # Seconds a request waits for room in a full queue before answering 503.
+    "PUT_TIMEOUT": 1,
+    # Seconds a request waits for its write to be committed.
+    "TIMEOUT": 10,
+}
+
+# Optional write-behind mode for movie ratings. Review votes are accumulated
+# in memory and written in one batched update every FLUSH_INTERVAL_MS
+# milliseconds or every FLUSH_MAX_REVIEWS reviews, whichever comes first.
+RATING_WRITE_BEHIND = {
+    "ENABLED": os.environ.get("RATING_WRITE_BEHIND", "") == "1",
+    "FLUSH_INTERVAL_MS": 500,
+    "FLUSH_MAX_REVIEWS": 100,
+}
+
+# /batch runs up to MAX_REQUESTS sub-requests per call, with up to
+# MAX_WORKERS threads for consecutive GET requests.
+BATCH_REQUESTS = {
+    "MAX_REQUESTS": 20,
+    "MAX_WORKERS": 4,
+}
+
+# Total counts of paginated lists are cached for TIMEOUT seconds per filter
+# set, until a write to a model they read. With ?count=approx, lists count at
+# most APPROX_LIMIT rows past the requested page.
+PAGINATION_COUNTS = {
+    "TIMEOUT": 300,
+    "APPROX_LIMIT": 1000,
+}
+
+# Concurrent identical movie searches and document cache misses wait for one
+# computation instead of each repeating it. With CROSS_WORKER, workers also
+# take turns through a lock in the cache backend, which must then be shared
+# between them (memcached, redis); waiters poll the result every
+# POLL_INTERVAL_MS for up to LOCK_TIMEOUT seconds.
+REQUEST_COALESCING = {
+    "ENABLED": True,
+    "CROSS_WORKER": os.environ.get("REQUEST_COALESCING_CROSS_WORKER", "") == "1",
+    "LOCK_TIMEOUT": 10,
+    "POLL_INTERVAL_MS": 20,
+}
+
+# Movie documents served by /movies/?ids= are cached per movie in the CACHE
+# alias for TIMEOUT seconds and invalidated whenever the movie or its
+# credits change, see CACHES. A request may ask for up to MAX_IDS movies.
+MOVIE_CACHE = {
+    "CACHE": "movies",
+    "TIMEOUT": 3600,
+    "MAX_IDS": 100,
+}
+
+# Leaderboards rank movies by (v * R + m * C) / (v + m), where C is the mean
+# rating of the catalog and m is MIN_VOTES. Each board stores DEPTH entries
+# and serves the first SIZE of them.
+LEADERBOARDS = {
+    "MIN_VOTES": 1000,
+    "SIZE": 100,
+    "DEPTH": 200,
+}
+
+# Number of neighbours precomputed for /movies/<id>/similar/. Credit and
+# genre changes mark the movies they touch as stale, and
+# `python manage.py build_similar_movies --stale`, run periodically,
+# recomputes their neighbours.
+SIMILAR_MOVIES = {
+    "TOP_K": 10,
+}
+
+# Matrix factorization model behind /users/me/recommendations, trained with
+# `python manage.py train_recommender`.
+RECOMMENDER = {
+    "PATH": BASE_DIR / "recommender",
+    "FACTORS": 32,
+    "ITERATIONS": 10,
+    "REGULARIZATION": 0.1,
+}
+
+# Deleted movies and users are hidden from every read at once. Their rows are
+# removed by `python manage.py purge_deleted`, run periodically, once they
+# have been deleted for PURGE_AFTER seconds, in transactions deleting at most
+# BATCH_SIZE rows each.
+SOFT_DELETE = {
+    "PURGE_AFTER": 3600,
+    "BATCH_SIZE": 500,
+}
+
+# Append-only log of the changes to movies, reviews and celebrities, served
+# by /changes?since=<cursor> in batches of BATCH_SIZE entries (at most
+# MAX_BATCH_SIZE with ?limit=). `python manage.py prune_changes`, run
+# periodically, deletes the entries older than RETENTION seconds, in
+# transactions of PRUNE_BATCH_SIZE entries.
+CHANGE_FEED = {
+    "BATCH_SIZE": 500,
+    "MAX_BATCH_SIZE": 5000,
+    "RETENTION": 7 * 24 * 3600,
+    "PRUNE_BATCH_SIZE": 1000,
+}
+
+# Backend of the pub/sub delivering live updates to the event streams of the
+# ASGI workers. LocalBackend only reaches the streams of the process that
+# publishes, a backend shared by the workers reaches all of them.
+PUBSUB = {
+    "BACKEND": "freshTomatoes.pubsub.LocalBackend",
+}
+
+# /movies/live/?ids= streams the rating updates of those movies under ASGI,
+# at most one per movie every INTERVAL_MS, with a comment every KEEPALIVE
+# seconds. Streams end after MAX_DURATION seconds and clients reconnect
+# RETRY_MS later.
+LIVE_RATINGS = {
+    "INTERVAL_MS": 1000,
+    "KEEPALIVE": 15,
+    "MAX_DURATION": 600,
+    "RETRY_MS": 1000,
+}
+
+# Writes of the views with a rate_limit_scope are limited to RATE requests in
+# a sliding window of PERIOD seconds, per IP address and per session token.
+# The counters live in the CACHE alias, see CACHES.
+RATE_LIMITS = {
+    "ENABLED": True,
+    "CACHE": "throttle",
+    "SCOPES": {
+        "login": {"RATE": 10, "PERIOD": 60},
+        "register": {"RATE": 5, "PERIOD": 3600},
+        "reviews": {"RATE": 30, "PERIOD": 60},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -130,6 +341,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashers of every profile. The first hasher of the profile in use
+# hashes new passwords, and passwords stored with one of the others are
+# rehashed with it at their next login. production hashes with argon2id, in
+# about a sixth of the CPU time of Django's PBKDF2, or with scrypt when
+# argon2-cffi is not installed. test hashes with MD5, only fit for the test
+# users created in every setUp. The profile in use is the one named by the
+# PASSWORD_HASHING_PROFILE environment variable, production by default; CI
+# runs the tests with PASSWORD_HASHING_PROFILE=test.
+PASSWORD_HASHING_PROFILES = {
+    "production": [
+        "freshTomatoes.hashers.TunedArgon2PasswordHasher",
+        "freshTomatoes.hashers.TunedScryptPasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ],
+}
+if find_spec("argon2") is None:
+    PASSWORD_HASHING_PROFILES["production"].pop(0)
+PASSWORD_HASHING_PROFILES["test"] = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+    *PASSWORD_HASHING_PROFILES["production"],
+]
+PASSWORD_HASHING_PROFILE = os.environ.get("PASSWORD_HASHING_PROFILE", "production")
+PASSWORD_HASHERS = PASSWORD_HASHING_PROFILES[PASSWORD_HASHING_PROFILE]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -159,7 +395,17 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "freshTomatoes.pagination.HTTPSPageNumberPagination",
     # "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
+    "DEFAULT_RENDERER_CLASSES": [
+        "freshTomatoes.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": ["freshTomatoes.throttling.SlidingWindowThrottle"],
+    # Proxies in front of the app, whose X-Forwarded-For entries are trusted
+    # to identify clients. Render serves the app through one.
+    "NUM_PROXIES": int(
+        os.environ.get("NUM_PROXIES", 1 if RENDER_EXTERNAL_HOSTNAME else 0)
+    ),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -168,3 +414,12 @@ SPECTACULAR_SETTINGS = {
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
 }
+
+# /schema/ is generated once per deployed code version, with the
+# generate_schema command at build time or on the first request, and served
+# from DIR with an ETag and a precompressed gzip copy. Without a VERSION the
+# schema is only kept in memory for the life of the process.
+OPENAPI_SCHEMA = {
+    "VERSION": os.environ.get("RENDER_GIT_COMMIT", os.environ.get("CODE_VERSION", "")),
+    "DIR": BASE_DIR / "schema",
+}
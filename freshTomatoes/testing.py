@@ -0,0 +1,6 @@
+"""
+Settings overrides shared by the test modules of every app
+"""
+
+# Rate limits are only enabled in the tests of the throttle.
+NO_RATE_LIMITS = {"ENABLED": False, "CACHE": "throttle", "SCOPES": {}}
@@ -0,0 +1,768 @@
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, JsonResponse
+from django.db import connection, transaction
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from freshTomatoes import coalescing, compression, pubsub, renderers, schema
+from freshTomatoes.throttling import sliding_window
+from freshTomatoes.middleware import (
+    PRIMARY_PIN_COOKIE,
+    CompressionMiddleware,
+    ReplicaRoutingMiddleware,
+)
+from freshTomatoes.pagination import HTTPSPageNumberPagination, generation_key
+from freshTomatoes.replication import ReadReplicaRouter, replica_reads, snapshot
+from freshTomatoes.testing import NO_RATE_LIMITS
+from movies.async_views import AsyncMovieDetailView, AsyncMovieListView
+from movies.models import Genre, Movie
+from movies.ratings import update_rating
+from reviews.async_views import AsyncReviewListView
+from reviews.models import Review
+from users.models import TomatoeUser
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], RATE_LIMITS=NO_RATE_LIMITS)
+class TestReadReplicaRouter(TestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route_request(self, request, written=None, status=200):
+        routed = {}
+
+        def get_response(request):
+            routed["db"] = self.router.db_for_read(Movie)
+            if written is not None:
+                self.router.db_for_write(written)
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return routed["db"], response
+
+    def test_reads_use_primary_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Movie))
+        self.assertEqual(self.router.db_for_write(Movie), "default")
+
+    def test_replica_reads(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Movie), "replica_1")
+            self.assertEqual(self.router.db_for_read(Review), "replica_1")
+            self.assertIsNone(self.router.db_for_read(TomatoeUser))
+            self.assertEqual(self.router.db_for_write(Movie), "default")
+        self.assertIsNone(self.router.db_for_read(Movie))
+
+    def test_get_is_routed_to_replica(self):
+        db, _ = self.route_request(self.factory.get("/movies/"))
+        self.assertEqual(db, "replica_1")
+
+    def test_write_pins_client_to_primary(self):
+        db, response = self.route_request(self.factory.post("/reviews/"), Review)
+        self.assertIsNone(db)
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        request = self.factory.get("/movies/")
+        request.COOKIES[PRIMARY_PIN_COOKIE] = "1"
+        db, _ = self.route_request(request)
+        self.assertIsNone(db)
+
+    def test_failed_or_unreplicated_write_does_not_pin(self):
+        _, response = self.route_request(
+            self.factory.post("/reviews/"), Review, status=400
+        )
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+        _, response = self.route_request(self.factory.post("/users/login"))
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+        _, response = self.route_request(
+            self.factory.post("/users/login"), TomatoeUser
+        )
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+class TestSnapshot(TestCase):
+    def test_snapshot_copies_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "db.sqlite3")
+            target = os.path.join(tmp, "db.replica_1.sqlite3")
+            connection = sqlite3.connect(source)
+            connection.execute("CREATE TABLE movie (title TEXT)")
+            connection.execute("INSERT INTO movie VALUES ('Test Movie')")
+            connection.commit()
+            connection.close()
+
+            snapshot(source, target)
+
+            replica = sqlite3.connect(f"file:{target}?mode=ro", uri=True)
+            self.assertEqual(
+                replica.execute("SELECT title FROM movie").fetchall(),
+                [("Test Movie",)],
+            )
+            replica.close()
+
+
+class TestCachedSchema(TestCase):
+    def setUp(self):
+        schema._schemas.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(
+            OPENAPI_SCHEMA={"VERSION": "abc123", "DIR": self.tmp.name}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_schema_generated_once(self):
+        with mock.patch.object(schema, "generate", wraps=schema.generate) as generate:
+            response = self.client.get(reverse("schema"))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"openapi:", response.content)
+            schema._schemas.clear()
+            self.client.get(reverse("schema"))
+        # The second process start reads the file written by the first one.
+        generate.assert_called_once_with("yaml")
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmp.name, "openapi-abc123.yaml.gz"))
+        )
+
+    def test_etag_and_gzip(self):
+        response = self.client.get(reverse("schema"), {"format": "json"})
+        etag = response["ETag"]
+        response = self.client.get(
+            reverse("schema"), {"format": "json"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        gzipped_etag = response["ETag"]
+        self.assertEqual(gzipped_etag, f'{etag[:-1]}-gzip"')
+        self.assertIn(b'"openapi"', gzip.decompress(response.content))
+        response = self.client.get(
+            reverse("schema"), {"format": "json"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        # The identity ETag does not validate a cached gzip body.
+        response = self.client.get(
+            reverse("schema"),
+            {"format": "json"},
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("schema"),
+            {"format": "json"},
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzipped_etag,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_refused_gzip_and_other_etags(self):
+        etag = self.client.get(reverse("schema"), {"format": "json"})["ETag"]
+        response = self.client.get(
+            reverse("schema"), {"format": "json"}, HTTP_ACCEPT_ENCODING="gzip;q=0"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get(
+            reverse("schema"),
+            {"format": "json"},
+            HTTP_IF_NONE_MATCH=f'"x{etag[1:-1]}x"',
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("schema"),
+            {"format": "json"},
+            HTTP_IF_NONE_MATCH=f'"other", W/{etag}',
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class TestCompressionMiddleware(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["compression"].clear()
+        self.factory = RequestFactory()
+        self.data = {"results": [{"title": f"Test Movie {i}"} for i in range(100)]}
+
+    def get(self, data, accept_encoding="gzip, deflate", key=None):
+        request = self.factory.get("/movies/", HTTP_ACCEPT_ENCODING=accept_encoding)
+
+        def get_response(request):
+            response = JsonResponse(data)
+            response.compression_key = key
+            return response
+
+        return CompressionMiddleware(get_response)(request)
+
+    def test_compresses_large_responses(self):
+        response = self.get(self.data)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn(b"Test Movie 99", gzip.decompress(response.content))
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+
+    def test_skips_small_or_refused(self):
+        self.assertFalse(self.get({"id": 1}).has_header("Content-Encoding"))
+        response = self.get(self.data, "gzip;q=0, identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_negotiation(self):
+        self.assertEqual(compression.negotiate("deflate, gzip;q=0.5"), "gzip")
+        self.assertIn(compression.negotiate("*"), compression.ENCODERS)
+        self.assertIsNone(compression.negotiate("identity"))
+
+    def test_keyed_bodies_compressed_once(self):
+        with mock.patch.dict(
+            compression.ENCODERS, {"gzip": mock.Mock(wraps=compression.gzip_compress)}
+        ):
+            first = self.get(self.data, key="movies:1")
+            second = self.get(self.data, key="movies:1")
+            compression.ENCODERS["gzip"].assert_called_once()
+            self.get(self.data)
+            self.get(self.data)
+            self.assertEqual(compression.ENCODERS["gzip"].call_count, 3)
+        self.assertEqual(first.content, second.content)
+
+
+class TestFastJSONRenderer(TestCase):
+    data = {
+        "results": [
+            {
+                "id": "1",
+                "title": "Amélie \u2028",
+                "userRating": Decimal("7.25"),
+                "votes": 1000,
+                "genres": [{"id": 1, "genre": "Drama"}],
+                "created": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+                "poster": None,
+            }
+        ],
+        "buckets": {"10": 1},
+    }
+
+    def test_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        for backend in {renderers.orjson, None}:
+            with mock.patch.object(renderers, "orjson", backend):
+                content = renderers.FastJSONRenderer().render(self.data)
+            self.assertEqual(json.loads(content), json.loads(expected))
+            self.assertNotIn(b"\xe2\x80\xa8", content)
+
+    def test_indent_uses_json_renderer(self):
+        content = renderers.FastJSONRenderer().render(
+            self.data, "application/json; indent=4"
+        )
+        self.assertIn(b'\n    "results"', content)
+
+
+class BatchTestMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.user = TomatoeUser.objects.create_user(
+            username="testuser@test.com",
+            name="Test User",
+            tel="123456789",
+            email="testuser@test.com",
+            password="Testpassword1",
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.cookies["session"] = token.key
+        self.movies = [
+            Movie.objects.create(title=f"Test Movie {i}", year=2020) for i in range(3)
+        ]
+
+    def batch(self, *requests):
+        response = self.client.post(
+            reverse("batch"), {"requests": list(requests)}, format="json"
+        )
+        return response
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestBatchView(BatchTestMixin, TestCase):
+    def test_batch(self):
+        movie = self.movies[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(
+                {"path": f"/movies/{movie.id}/"},
+                {"path": "/users/me"},
+                {
+                    "method": "POST",
+                    "path": "/reviews/",
+                    "body": {"movie": movie.id, "userRating": 8, "body": "Great"},
+                },
+                {"path": f"/reviews/?movie_id={movie.id}"},
+                {"path": "/unknown/"},
+            )
+        self.assertEqual(response.status_code, 200)
+        statuses = [item["status"] for item in response.data["responses"]]
+        self.assertEqual(statuses, [200, 200, 201, 200, 404])
+        self.assertEqual(response.data["responses"][0]["body"]["title"], movie.title)
+        self.assertEqual(
+            response.data["responses"][1]["body"]["email"], "testuser@test.com"
+        )
+        token_queries = [q for q in queries if "authtoken_token" in q["sql"]]
+        self.assertEqual(len(token_queries), 1)
+
+    def test_login_and_logout_inside_batch(self):
+        self.client.cookies.clear()
+        response = self.batch(
+            {"path": "/users/me"},
+            {
+                "method": "POST",
+                "path": "/users/login",
+                "body": {"username": "testuser@test.com", "password": "Testpassword1"},
+            },
+            {"path": "/users/me"},
+            {"method": "DELETE", "path": "/users/logout"},
+            {"path": "/users/me"},
+        )
+        statuses = [item["status"] for item in response.data["responses"]]
+        self.assertEqual(statuses, [401, 201, 200, 204, 401])
+        # The logout's deletion of the session cookie reaches the client.
+        self.assertEqual(response.cookies["session"]["max-age"], 0)
+
+        response = self.batch(
+            {
+                "method": "POST",
+                "path": "/users/login",
+                "body": {"username": "testuser@test.com", "password": "Testpassword1"},
+            },
+        )
+        self.assertTrue(response.cookies["session"].value)
+
+    def test_invalid_batch(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch({"path": "/batch"}).status_code, 400)
+        self.assertEqual(
+            self.batch({"method": "TRACE", "path": "/movies/"}).status_code, 400
+        )
+
+
+class TestConcurrentBatch(BatchTestMixin, TransactionTestCase):
+    def test_concurrent_gets_keep_order(self):
+        response = self.batch(
+            *[{"path": f"/movies/{movie.id}/"} for movie in reversed(self.movies)]
+        )
+        self.assertEqual(
+            [item["body"]["title"] for item in response.data["responses"]],
+            [movie.title for movie in reversed(self.movies)],
+        )
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestAsyncReads(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.user = TomatoeUser.objects.create_user(
+            username="testuser@test.com",
+            name="Test User",
+            tel="123456789",
+            email="testuser@test.com",
+            password="Testpassword1",
+        )
+        genre = Genre.objects.create(name="Action")
+        self.movies = []
+        for i in range(3):
+            movie = Movie.objects.create(
+                title=f"Test Movie {i}", year=2020 + i, userRating=7 + i, votes=10
+            )
+            movie.genres.add(genre)
+            self.movies.append(movie)
+        Review.objects.create(
+            user=self.user, movie=self.movies[0], userRating=8, comment="Good"
+        )
+
+    async def assert_same_response(self, path, view_class):
+        response = await self.async_client.get(path)
+        self.assertEqual(response.resolver_match.func.view_class, view_class)
+        expected = await sync_to_async(self.client.get)(path)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_movie_list(self):
+        await self.assert_same_response("/movies/", AsyncMovieListView)
+        await self.assert_same_response(
+            "/movies/?search=movie&ordering=-year&fields=id,title",
+            AsyncMovieListView,
+        )
+        await self.assert_same_response("/movies/?page=9", AsyncMovieListView)
+        await self.assert_same_response("/movies/?fields=unknown", AsyncMovieListView)
+
+    async def test_movie_multi_get(self):
+        ids = ",".join(str(movie.id) for movie in reversed(self.movies))
+        await self.assert_same_response(f"/movies/?ids={ids}", AsyncMovieListView)
+
+    async def test_movie_detail(self):
+        movie = self.movies[0]
+        await self.assert_same_response(f"/movies/{movie.id}/", AsyncMovieDetailView)
+        await self.assert_same_response(
+            f"/movies/{movie.id}/?histogram=true&expand=genres", AsyncMovieDetailView
+        )
+        await self.assert_same_response("/movies/0/", AsyncMovieDetailView)
+
+    async def test_review_list(self):
+        movie = self.movies[0]
+        await self.assert_same_response(
+            f"/reviews/?movie_id={movie.id}&ordering=-userRating", AsyncReviewListView
+        )
+
+    async def test_other_requests_fall_through(self):
+        response = await self.async_client.get(reverse("leaderboard"))
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post("/movies/", {})
+        self.assertEqual(
+            response.resolver_match.func.view_class.__name__, "MovieListView"
+        )
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = coalescing.SingleFlight()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def compute(self):
+        self.calls += 1
+        self.release.wait(5)
+        return {"calls": self.calls}
+
+    def test_concurrent_calls_share_one_computation(self):
+        results = []
+
+        def call():
+            results.append(self.flight.do("key", self.compute))
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while self.flight.stats()["coalesced"] < 3:
+            self.release.wait(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"calls": 1}] * 4)
+        self.assertEqual(self.flight.stats()["computed"], 1)
+        # Later calls compute again.
+        self.assertEqual(self.flight.do("key", self.compute), {"calls": 2})
+
+    def test_followers_get_the_exception(self):
+        errors = []
+
+        def fail():
+            self.release.wait(5)
+            raise ValueError("failed")
+
+        def call():
+            try:
+                self.flight.do("key", fail)
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while self.flight.stats()["coalesced"] < 1:
+            self.release.wait(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
+
+    def test_async_calls_share_one_computation(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return self.calls
+
+        async def main():
+            return await asyncio.gather(
+                *[self.flight.ado("key", compute) for _ in range(3)]
+            )
+
+        self.assertEqual(asyncio.run(main()), [1, 1, 1])
+        self.assertEqual(self.flight.stats()["coalesced"], 2)
+
+    @override_settings(
+        REQUEST_COALESCING={
+            "ENABLED": True,
+            "CROSS_WORKER": True,
+            "LOCK_TIMEOUT": 1,
+            "POLL_INTERVAL_MS": 10,
+        }
+    )
+    def test_cross_worker(self):
+        self.release.set()
+        lock_key, result_key = coalescing.shared_keys("key")
+        # Another worker is computing the key, and stores its result.
+        cache.add(lock_key, "other")
+        cache.set(f"{result_key}:other", "shared")
+        self.assertEqual(self.flight.do("key", self.compute), "shared")
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.flight.stats()["coalesced_across_workers"], 1)
+
+        # The other worker released the lock without a result.
+        cache.delete(f"{result_key}:other")
+        threading.Timer(0.05, cache.delete, [lock_key]).start()
+        self.assertEqual(self.flight.do("key", self.compute), {"calls": 1})
+
+        # The lock is free: this worker computes and releases it.
+        self.assertEqual(self.flight.do("key", self.compute), {"calls": 2})
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_stats_view(self):
+        response = APIClient().get(reverse("coalescing"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("coalesced", response.data)
+        self.assertIn("coalesced_across_workers", response.data)
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestPaginationCounts(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(HTTPSPageNumberPagination, "page_size", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.url = reverse("movie_list")
+        for i in range(5):
+            Movie.objects.create(title=f"Test Movie {i}", year=2020)
+
+    def test_exact_count_is_cached_until_a_write(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(self.url, {"title": "movie", "ordering": "year"})
+        self.assertEqual(response.data["count"], 5)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(
+                self.url, {"ordering": "-year", "title": "movie"}
+            )
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(second), len(first) - 1)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Movie.objects.create(title="Test Movie 5", year=2020)
+        response = self.client.get(self.url, {"title": "movie"})
+        self.assertEqual(response.data["count"], 6)
+
+    def test_evicted_generation_is_not_reused(self):
+        for title, count in (("Test Movie 5", 6), ("Test Movie 6", 7)):
+            # The generation is lost, then a write starts a new one.
+            cache.delete(generation_key(Movie))
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                Movie.objects.create(title=title, year=2020)
+            self.assertEqual(self.client.get(self.url).data["count"], count)
+
+    def test_review_counts_follow_review_writes(self):
+        user = TomatoeUser.objects.create_user(
+            username="testuser@test.com",
+            name="Test User",
+            tel="123456789",
+            email="testuser@test.com",
+            password="Testpassword1",
+        )
+        url = reverse("review_list")
+        self.assertEqual(self.client.get(url).data["count"], 0)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Review.objects.create(user=user, movie=Movie.objects.first(), userRating=8)
+        self.assertEqual(self.client.get(url).data["count"], 1)
+
+    def test_no_count(self):
+        response = self.client.get(self.url, {"count": "none"})
+        self.assertIsNone(response.data["count"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIn("page=2", response.data["next"])
+
+        response = self.client.get(self.url, {"count": "none", "page": 3})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+        self.assertIn("page=2", response.data["previous"])
+
+        response = self.client.get(self.url, {"count": "none", "page": 4})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAGINATION_COUNTS={"TIMEOUT": 300, "APPROX_LIMIT": 1})
+    def test_approximate_count(self):
+        response = self.client.get(self.url, {"count": "approx"})
+        self.assertEqual(response.data["count"], 3)
+        self.assertTrue(response.data["approximate"])
+        self.assertIn("page=2", response.data["next"])
+
+        response = self.client.get(self.url, {"count": "approx", "page": 3})
+        self.assertEqual(response.data["count"], 5)
+        self.assertFalse(response.data["approximate"])
+
+    def test_invalid_count_mode(self):
+        response = self.client.get(self.url, {"count": "some"})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_counts(self):
+        for mode in ("exact", "approx", "none"):
+            response = await AsyncClient().get(self.url, {"count": mode, "page": 2})
+            expected = await sync_to_async(self.client.get)(
+                self.url, {"count": mode, "page": 2}
+            )
+            self.assertEqual(response.json(), expected.json())
+
+    async def test_async_counts_keep_the_cache_off_the_event_loop(self):
+        def off_the_loop(method):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    return method(*args, **kwargs)
+                raise AssertionError(f"{method.__name__} blocked the event loop")
+
+            return wrapper
+
+        with mock.patch.multiple(
+            LocMemCache,
+            get=off_the_loop(LocMemCache.get),
+            get_many=off_the_loop(LocMemCache.get_many),
+            add=off_the_loop(LocMemCache.add),
+        ):
+            response = await AsyncClient().get(self.url, {"count": "exact"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 5)
+
+
+class TestLiveRatings(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title="Test Movie", year=2020, userRating=7, votes=1
+        )
+
+    def rate(self, rating):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_rating(self.movie, rating)
+
+    async def test_messages_are_coalesced_per_key(self):
+        broker = pubsub.Broker()
+        subscription = broker.subscribe("ratings", [1, 2])
+        broker.dispatch("ratings", 1, "first")
+        await sync_to_async(broker.dispatch, thread_sensitive=False)(
+            "ratings", 1, "second"
+        )
+        broker.dispatch("ratings", 3, "other")
+        self.assertEqual(await subscription.get(1), {1: "second"})
+        self.assertEqual(await subscription.get(0.01), {})
+        subscription.close()
+        self.assertEqual(broker.subscriptions, {})
+
+    @override_settings(
+        LIVE_RATINGS={
+            "INTERVAL_MS": 10,
+            "KEEPALIVE": 15,
+            "MAX_DURATION": 5,
+            "RETRY_MS": 1000,
+        }
+    )
+    async def test_stream(self):
+        response = await AsyncClient().get(f"/movies/live/?ids={self.movie.id}")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b"retry: 1000\n\n")
+
+        def data(event):
+            self.assertTrue(event.startswith(b"event: rating\n"))
+            return json.loads(event.split(b"data: ")[1])
+
+        expected = {"id": self.movie.id, "userRating": 7.0, "votes": 1}
+        self.assertEqual(data(await anext(events)), expected)
+        await sync_to_async(self.rate)(9)
+        expected = {"id": self.movie.id, "userRating": 8.0, "votes": 2}
+        self.assertEqual(data(await anext(events)), expected)
+        await events.aclose()
+
+    async def test_stream_needs_ids(self):
+        response = await AsyncClient().get("/movies/live/")
+        self.assertEqual(response.status_code, 400)
+
+
+RATE_LIMITS = {
+    "ENABLED": True,
+    "CACHE": "throttle",
+    "SCOPES": {"login": {"RATE": 2, "PERIOD": 60}},
+}
+
+
+@override_settings(RATE_LIMITS=RATE_LIMITS)
+class TestRateLimits(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.client = APIClient()
+        self.credentials = {"username": "testuser@test.com", "password": "wrong"}
+
+    def test_sliding_window(self):
+        # Half of the previous window's 4 requests still count, at 30s.
+        cache.set("key:8", 4)
+        self.assertEqual(sliding_window(cache, "key", 3, 60, 570), 0)
+        wait = sliding_window(cache, "key", 3, 60, 570)
+        self.assertAlmostEqual(wait, 15)
+        self.assertEqual(cache.get("key:9"), 1)
+
+    def test_login_limit(self):
+        url = reverse("login")
+        for _ in range(2):
+            response = self.client.post(url, self.credentials, format="json")
+            self.assertEqual(response.status_code, 401)
+
+        with mock.patch("users.serializers.authenticate") as authenticate:
+            response = self.client.post(url, self.credentials, format="json")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        authenticate.assert_not_called()
+
+        # Other clients have their own limit.
+        response = self.client.post(
+            url, self.credentials, format="json", REMOTE_ADDR="10.0.0.1"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_session_token_limit(self):
+        self.client.cookies["session"] = "token"
+        url = reverse("login")
+        for address in ("10.0.0.1", "10.0.0.2"):
+            self.client.post(url, self.credentials, format="json", REMOTE_ADDR=address)
+        response = self.client.post(
+            url, self.credentials, format="json", REMOTE_ADDR="10.0.0.3"
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_refused_request_counts_for_no_ident(self):
+        url = reverse("login")
+        for _ in range(2):
+            self.client.post(url, self.credentials, format="json")
+        # Refused for its address, so its session token is not counted.
+        self.client.cookies["session"] = "token"
+        response = self.client.post(url, self.credentials, format="json")
+        self.assertEqual(response.status_code, 429)
+        for address in ("10.0.0.1", "10.0.0.2"):
+            response = self.client.post(
+                url, self.credentials, format="json", REMOTE_ADDR=address
+            )
+            self.assertEqual(response.status_code, 401)
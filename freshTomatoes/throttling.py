@@ -0,0 +1,103 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+
+def sliding_window(cache, key, rate, period, now):
+    """
+    Counts a request in the sliding window of a key and returns 0 when it is
+    allowed, or the seconds to wait otherwise. The window is estimated from
+    the counts of the current and previous fixed windows, weighted by their
+    overlap with it, and counted with the atomic incr of the cache so that
+    concurrent requests of every worker are all counted.
+    """
+    window, offset = divmod(now, period)
+    current_key = f"{key}:{int(window)}"
+    previous = cache.get(f"{key}:{int(window) - 1}", 0)
+    cache.add(current_key, 0, math.ceil(2 * period))
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.add(current_key, 1, math.ceil(2 * period))
+        current = 1
+    overlap = 1 - offset / period
+    if previous * overlap + current <= rate:
+        return 0
+
+    # Refused requests are not counted.
+    uncount(cache, key, period, now)
+    current -= 1
+    if previous and current + 1 <= rate:
+        # Allowed once enough of the previous window slides out.
+        return (1 - (rate - current - 1) / previous) * period - offset
+    # Allowed in the next window, once enough of this one slides out.
+    overlap = 1 - (rate - 1) / current if current else 0
+    return period - offset + max(overlap, 0) * period
+
+
+def uncount(cache, key, period, now):
+    """
+    Takes back a request counted by sliding_window() at the same time
+    """
+    try:
+        cache.decr(f"{key}:{int(now // period)}")
+    except ValueError:
+        # The window expired, and its count with it.
+        pass
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Limits the writes of the views whose rate_limit_scope is one of
+    RATE_LIMITS["SCOPES"], in a sliding window per IP address and, for
+    logged in clients, per session token. DRF checks throttles before the
+    handler runs, so refused requests never reach serializer validation nor
+    authenticate().
+    """
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_idents(self, request):
+        idents = [f"ip:{self.get_ident(request)}"]
+        token = request.COOKIES.get("session")
+        if token:
+            digest = hashlib.sha256(token.encode()).hexdigest()
+            idents.append(f"token:{digest}")
+        return idents
+
+    def allow_request(self, request, view):
+        config = settings.RATE_LIMITS
+        scope = getattr(view, "rate_limit_scope", None)
+        if (
+            not config["ENABLED"]
+            or request.method in SAFE_METHODS
+            or scope not in config["SCOPES"]
+        ):
+            return True
+
+        limit = config["SCOPES"][scope]
+        cache = caches[config["CACHE"]]
+        now = time.time()
+        waits = {
+            key: sliding_window(cache, key, limit["RATE"], limit["PERIOD"], now)
+            for key in (
+                f"throttle:{scope}:{ident}" for ident in self.get_idents(request)
+            )
+        }
+        self.retry_after = max(waits.values())
+        if self.retry_after:
+            # A request refused for one ident counts for none of them.
+            for key, wait in waits.items():
+                if not wait:
+                    uncount(cache, key, limit["PERIOD"], now)
+        return self.retry_after == 0
+
+    def wait(self):
+        return self.retry_after
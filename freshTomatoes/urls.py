@@ -16,15 +16,23 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView
+from drf_spectacular.views import SpectacularRedocView
+
+from .batch import BatchView
+from .coalescing import CoalescingStatsView
+from .schema import CachedSchemaView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("schema/", CachedSchemaView.as_view(), name="schema"),
     path(
         "schema/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"
     ),
     path("users/", include("users.urls")),
     path("movies/", include("movies.urls")),
+    path("celebrities/", include("movies.celebrity_urls")),
     path("reviews/", include("reviews.urls")),
+    path("changes", include("changes.urls")),
+    path("batch", BatchView.as_view(), name="batch"),
+    path("coalescing", CoalescingStatsView.as_view(), name="coalescing"),
 ]
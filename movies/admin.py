@@ -1,12 +1,34 @@
 from django.contrib import admin
-from movies import models
+from movies import celebrities, models
+from movies.signals import credits_changed
+
+
+class CreditInline(admin.TabularInline):
+    model = models.Credit
+    ordering = ["role", "order"]
+    raw_id_fields = ["celebrity"]
 
 
 class AuthorAdmin(admin.ModelAdmin):
-    pass
+    inlines = [CreditInline]
+
+    def save_related(self, request, form, formsets, change):
+        before = celebrities.credited_celebrities(form.instance)
+        super().save_related(request, form, formsets, change)
+        # Inline credits are saved one by one, without credits_changed.
+        credits_changed.send(
+            sender=models.Credit,
+            movie_ids=[form.instance.id],
+            celebrity_ids=before | celebrities.credited_celebrities(form.instance),
+        )
 
 
 admin.site.register(models.Movie, AuthorAdmin)
 admin.site.register(models.Genre)
 admin.site.register(models.Celebrity)
 admin.site.register(models.Rating)
+admin.site.register(models.RatingHistogram)
+admin.site.register(models.LeaderboardEntry)
+admin.site.register(models.LeaderboardPrior)
+admin.site.register(models.SimilarMovie)
+admin.site.register(models.MovieDocument)
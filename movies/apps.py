@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MoviesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "movies"
+
+    def ready(self):
+        from . import live, signals  # noqa: F401
@@ -0,0 +1,94 @@
+from django.http import StreamingHttpResponse
+from django.views import View
+from rest_framework import filters
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from freshTomatoes.async_views import AsyncReadView, exception_response
+from freshTomatoes.coalescing import acoalesce
+from freshTomatoes.pagination import HTTPSPageNumberPagination
+from . import live
+from .documents import RELATIONS, aget_movie_documents, select_movie_fields
+from .models import Movie, RatingHistogram
+from .ratings import histogram_stats
+from .views import (
+    MovieListView,
+    filter_movies,
+    get_movie_fields,
+    get_movie_ids,
+    get_requested_fields,
+    list_key,
+    present_documents,
+)
+
+
+class AsyncMovieListView(AsyncReadView):
+    """
+    Async MovieListView.list, including search and ?ids= multi-get
+    """
+
+    ordering_fields = MovieListView.ordering_fields
+    count_models = MovieListView.count_models
+
+    async def get_data(self, request):
+        if "ids" in request.query_params:
+            movie_ids = get_movie_ids(request.query_params["ids"])
+            fields, expand = get_requested_fields(request.query_params, RELATIONS)
+            documents = await aget_movie_documents(movie_ids)
+            data, self.compression_key = present_documents(documents, fields, expand)
+            return data
+
+        return await acoalesce(list_key(request), lambda: self.get_list_data(request))
+
+    async def get_list_data(self, request):
+        fields, expand = get_requested_fields(request.query_params)
+        queryset, self.ordering = filter_movies(
+            Movie.objects.all(), request.query_params
+        )
+        queryset = filters.OrderingFilter().filter_queryset(request, queryset, self)
+        queryset = select_movie_fields(queryset, fields, expand)
+        paginator = HTTPSPageNumberPagination()
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        data = [get_movie_fields(movie, fields, expand) for movie in page]
+        return paginator.get_paginated_response(data).data
+
+
+class AsyncMovieDetailView(AsyncReadView):
+    """
+    Async MovieDetailView.get
+    """
+
+    async def get_data(self, request, pk):
+        fields, expand = get_requested_fields(request.query_params, RELATIONS)
+        documents = await aget_movie_documents([pk])
+        if not documents:
+            raise NotFound()
+        movies, key = present_documents(documents, fields, expand)
+        data = movies[0]
+        if request.query_params.get("histogram") in ("true", "1"):
+            histogram = await RatingHistogram.objects.filter(movie_id=pk).afirst()
+            data["histogram"] = histogram_stats(histogram)
+        else:
+            self.compression_key = key
+        return data
+
+
+class MovieRatingsStreamView(View):
+    """
+    Server-sent events stream of the ratings of the movies of ?ids=, pushed
+    as they change instead of polled from /movies/<id>/
+    """
+
+    async def get(self, request):
+        try:
+            movie_ids = get_movie_ids(request.GET.get("ids", ""))
+            if not movie_ids:
+                raise ValidationError({"ids": "At least one movie id is required."})
+        except APIException as exc:
+            return exception_response(exc)
+        response = StreamingHttpResponse(
+            live.stream_ratings(movie_ids), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Proxies must pass the events on as they come.
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+def movie_key(movie_id):
+    return f"movie:{movie_id}"
+
+
+def invalidated_key(movie_id):
+    return f"movie-invalidated:{movie_id}"
+
+
+def get_cache():
+    return caches[settings.MOVIE_CACHE["CACHE"]]
+
+
+def get_movies(movie_ids):
+    """
+    Returns the {movie_id: document} mapping of the cached movies among the
+    given ones, with one cache round trip
+    """
+    keys = {movie_key(movie_id): movie_id for movie_id in movie_ids}
+    cached = get_cache().get_many(keys)
+    return {keys[key]: document for key, document in cached.items()}
+
+
+async def aget_movies(movie_ids):
+    keys = {movie_key(movie_id): movie_id for movie_id in movie_ids}
+    cached = await get_cache().aget_many(keys)
+    return {keys[key]: document for key, document in cached.items()}
+
+
+def fresh_documents(documents, invalidated):
+    """
+    Keeps the documents generated after the last invalidation of their movie.
+    A reader that loaded a document before a write committed must not cache
+    it once the write invalidated it.
+    """
+    fresh = {}
+    for movie_id, document in documents.items():
+        stamp = invalidated.get(invalidated_key(movie_id))
+        if stamp is None or datetime.fromisoformat(document["_version"]) >= stamp:
+            fresh[movie_key(movie_id)] = document
+    return fresh
+
+
+def set_movies(documents):
+    cache = get_cache()
+    invalidated = cache.get_many([invalidated_key(movie_id) for movie_id in documents])
+    cache.set_many(
+        fresh_documents(documents, invalidated), settings.MOVIE_CACHE["TIMEOUT"]
+    )
+
+
+async def aset_movies(documents):
+    cache = get_cache()
+    invalidated = await cache.aget_many(
+        [invalidated_key(movie_id) for movie_id in documents]
+    )
+    await cache.aset_many(
+        fresh_documents(documents, invalidated), settings.MOVIE_CACHE["TIMEOUT"]
+    )
+
+
+def invalidate_movies(movie_ids, since=None):
+    """
+    Drops the cached documents of the movies, and keeps the ones generated
+    before since, by default now, from being cached again
+    """
+    since = since or timezone.now()
+    cache = get_cache()
+    cache.set_many(
+        {invalidated_key(movie_id): since for movie_id in movie_ids},
+        settings.MOVIE_CACHE["TIMEOUT"],
+    )
+    cache.delete_many([movie_key(movie_id) for movie_id in movie_ids])
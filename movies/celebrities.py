@@ -0,0 +1,43 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Celebrity, Credit
+
+# Role counted into each denormalized column.
+CREDIT_COUNTS = {
+    "directedCount": Credit.DIRECTOR,
+    "actedCount": Credit.CAST,
+}
+
+
+def count_credits(celebrity_ids=None):
+    """
+    Recounts the movies directed and acted in by the given celebrities, or by
+    every celebrity, from the credits index on celebrity and role. Deleted
+    movies are not counted.
+    """
+    counts = {}
+    for column, role in CREDIT_COUNTS.items():
+        credits = (
+            Credit.objects.filter(
+                celebrity_id=OuterRef("pk"), role=role, movie__deletedAt__isnull=True
+            )
+            .order_by()
+            .values("celebrity_id")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        counts[column] = Coalesce(Subquery(credits), 0)
+    celebrities = Celebrity.objects.all()
+    if celebrity_ids is not None:
+        celebrities = celebrities.filter(pk__in=list(celebrity_ids))
+    return celebrities.update(**counts)
+
+
+def credited_celebrities(movie):
+    """
+    Returns the ids of the directors and cast of a movie
+    """
+    return set(
+        Credit.objects.filter(movie_id=movie.id).values_list("celebrity_id", flat=True)
+    )
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("", views.CelebrityListView.as_view(), name="celebrity_list"),
+    path("<int:pk>/", views.CelebrityDetailView.as_view(), name="celebrity_detail"),
+]
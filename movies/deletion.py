@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from freshTomatoes.text import fold
+from . import ratings
+from .models import Credit, Movie, SimilarMovie
+from .signals import soft_deleted
+
+
+def delete_movie(movie):
+    """
+    Soft deletes a movie: it and its reviews disappear from every read at
+    once, and purge_deleted removes their rows later
+    """
+    with transaction.atomic():
+        movie.deletedAt = timezone.now()
+        Movie.all_objects.filter(pk=movie.pk).update(deletedAt=movie.deletedAt)
+        soft_deleted.send(sender=Movie, instance=movie)
+
+
+def delete_user(user):
+    """
+    Soft deletes a user: they are logged out and their reviews disappear from
+    every read at once, then their votes leave the ratings and histograms.
+    purge_deleted removes their rows later.
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        user.deletedAt = timezone.now()
+        user.is_active = False
+        # Frees the username, which can be registered again right away.
+        user.username = f"deleted-{user.pk}"
+        User.all_objects.filter(pk=user.pk).update(
+            deletedAt=user.deletedAt,
+            is_active=False,
+            username=user.username,
+            foldedUsername=fold(user.username),
+        )
+        Token.objects.filter(user_id=user.pk).delete()
+        soft_deleted.send(sender=User, instance=user)
+    remove_votes(user.pk)
+
+
+def remove_votes(user_id, batch_size=None):
+    """
+    Takes the votes of a deleted user out of the ratings and histograms of
+    the movies they reviewed, one update per movie, in transactions of at
+    most batch_size movies.
+    """
+    Review = apps.get_model("reviews", "Review")
+    batch_size = batch_size or settings.SOFT_DELETE["BATCH_SIZE"]
+    # The ratings of deleted movies are purged with them.
+    totals = {
+        movie_id: (rating_sum, votes)
+        for movie_id, rating_sum, votes in Review.all_objects.filter(
+            user_id=user_id, movie__deletedAt__isnull=True
+        )
+        .values("movie_id")
+        .annotate(rating_sum=Sum("userRating"), votes=Count("id"))
+        .values_list("movie_id", "rating_sum", "votes")
+    }
+    movie_ids = sorted(totals)
+    for start in range(0, len(movie_ids), batch_size):
+        batch = movie_ids[start : start + batch_size]
+        with transaction.atomic():
+            ratings.remove_ratings({movie_id: totals[movie_id] for movie_id in batch})
+            ratings.rebuild_histograms(batch)
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Deletes the rows of a queryset in transactions of at most batch_size rows,
+    so the purge never holds locks on many rows at once
+    """
+    model = queryset.model
+    total = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return total
+            model._base_manager.filter(pk__in=pks).delete()
+        total += len(pks)
+
+
+def purge_movie(movie_id, batch_size):
+    Review = apps.get_model("reviews", "Review")
+    for queryset in (
+        Review.all_objects.filter(movie_id=movie_id),
+        Credit.objects.filter(movie_id=movie_id),
+        Movie.genres.through.objects.filter(movie_id=movie_id),
+        SimilarMovie.objects.filter(similar_id=movie_id),
+    ):
+        delete_in_batches(queryset, batch_size)
+    # Its histogram, document and leaderboard rows are deleted along with it.
+    Movie.all_objects.filter(pk=movie_id).delete()
+
+
+def purge_user(user_id, batch_size):
+    """
+    Deletes the reviews of a deleted user, whose votes already left the
+    ratings when they were deleted, then the user
+    """
+    Review = apps.get_model("reviews", "Review")
+    delete_in_batches(Review.all_objects.filter(user_id=user_id), batch_size)
+    # Their tokens are deleted along with them.
+    get_user_model().all_objects.filter(pk=user_id).delete()
+
+
+def purge_deleted(purge_after=None, batch_size=None):
+    """
+    Removes the rows of the movies and users deleted at least purge_after
+    seconds ago. Returns the number of movies and users purged.
+    """
+    config = settings.SOFT_DELETE
+    if purge_after is None:
+        purge_after = config["PURGE_AFTER"]
+    batch_size = batch_size or config["BATCH_SIZE"]
+    deleted_before = timezone.now() - timedelta(seconds=purge_after)
+
+    User = get_user_model()
+    user_ids = list(
+        User.all_objects.filter(deletedAt__lte=deleted_before).values_list(
+            "pk", flat=True
+        )
+    )
+    for user_id in user_ids:
+        purge_user(user_id, batch_size)
+    movie_ids = list(
+        Movie.all_objects.filter(deletedAt__lte=deleted_before).values_list(
+            "pk", flat=True
+        )
+    )
+    for movie_id in movie_ids:
+        purge_movie(movie_id, batch_size)
+    return len(movie_ids), len(user_ids)
@@ -0,0 +1,254 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from freshTomatoes.coalescing import acoalesce, coalesce
+from . import caching
+from .models import Credit, Genre, Movie, MovieDocument
+
+# Keys of the movie documents, in the order they are rendered.
+MOVIE_FIELDS = [
+    "id",
+    "title",
+    "year",
+    "runtime",
+    "rating",
+    "directors",
+    "userRating",
+    "votes",
+    "genres",
+    "cast",
+    "poster",
+]
+RELATIONS = ["rating", "directors", "genres", "cast"]
+INFO_FIELDS = [field for field in MOVIE_FIELDS if field not in RELATIONS]
+# Role of the credits of the directors and cast relations.
+CREDIT_ROLES = {"directors": Credit.DIRECTOR, "cast": Credit.CAST}
+# Columns a field is read from, when it is not a column itself.
+FIELD_COLUMNS = {
+    "userRating": ["userRating", "votes"],
+    "votes": ["userRating", "votes"],
+}
+
+
+def build_movie_fields(movie, fields, expand, current_rating=None):
+    """
+    Builds the document of a movie with the requested fields and relations,
+    in the order of get_movie_data. The rating is the stored one unless a
+    current_rating(movie) function returning (userRating, votes) is given.
+    """
+    if "userRating" in fields or "votes" in fields:
+        if current_rating is not None:
+            user_rating, votes = current_rating(movie)
+        else:
+            user_rating, votes = movie.userRating, movie.votes
+    data = {}
+    for key in MOVIE_FIELDS:
+        if key in fields:
+            if key == "id":
+                data["id"] = str(movie.id)
+            elif key == "runtime":
+                data["runtime"] = movie.runtime if movie.runtime is not None else "--"
+            elif key == "userRating":
+                data["userRating"] = user_rating
+            elif key == "votes":
+                data["votes"] = votes
+            else:
+                data[key] = getattr(movie, key)
+        elif key in expand:
+            if key == "rating":
+                data["rating"] = (
+                    {"id": movie.rating.id, "rating": movie.rating.name}
+                    if movie.rating is not None and movie.rating.name is not None
+                    else {"id": -1, "rating": "--"}
+                )
+            elif key == "genres":
+                data["genres"] = [
+                    {"id": genre.id, "genre": genre.name}
+                    for genre in movie.genres.all()
+                ]
+            else:
+                data[key] = [
+                    {"id": celebrity.id, "name": celebrity.name}
+                    for celebrity in get_credited(movie, key)
+                ]
+    return data
+
+
+def credits_prefetch(key):
+    """
+    Prefetches the directors or cast credits of movies, in billing order, to
+    the <key>_credits attribute get_credited reads
+    """
+    credits = (
+        Credit.objects.filter(role=CREDIT_ROLES[key])
+        .select_related("celebrity")
+        .only("movie", "role", "order", "celebrity__id", "celebrity__name")
+        .order_by("order", "celebrity_id")
+    )
+    return Prefetch("credits", queryset=credits, to_attr=f"{key}_credits")
+
+
+def get_credited(movie, key):
+    """
+    Returns the directors or cast of a movie, from their prefetched credits
+    when there are
+    """
+    credits = getattr(movie, f"{key}_credits", None)
+    if credits is None:
+        return getattr(movie, key).all()
+    return [credit.celebrity for credit in credits]
+
+
+def select_movie_fields(queryset, fields, expand):
+    """
+    Restricts a movie queryset to the columns and relations the requested
+    fields are built from
+    """
+    columns = {"id"}
+    for field in fields:
+        columns.update(FIELD_COLUMNS.get(field, [field]))
+    if "rating" in expand:
+        columns.update(["rating__id", "rating__name"])
+        queryset = queryset.select_related("rating")
+    queryset = queryset.only(*columns)
+    if "genres" in expand:
+        queryset = queryset.prefetch_related(
+            Prefetch("genres", queryset=Genre.objects.only("id", "name"))
+        )
+    for key in CREDIT_ROLES:
+        if key in expand:
+            queryset = queryset.prefetch_related(credits_prefetch(key))
+    return queryset
+
+
+def build_documents(movie_ids):
+    """
+    Returns the {movie_id: document} mapping of the existing movies among the
+    given ones, built from the movie tables
+    """
+    movies = select_movie_fields(
+        Movie.objects.filter(pk__in=list(movie_ids)), INFO_FIELDS, RELATIONS
+    )
+    return {
+        movie.id: build_movie_fields(movie, INFO_FIELDS, RELATIONS) for movie in movies
+    }
+
+
+def get_movie_documents(movie_ids):
+    """
+    Returns the stored documents of the given movies in the order of the
+    ids, skipping missing movies. Documents are read through the movie cache,
+    then from MovieDocument with one primary key lookup; the ones never
+    stored are built and saved.
+    """
+    documents = caching.get_movies(movie_ids)
+    missing = [movie_id for movie_id in movie_ids if movie_id not in documents]
+    if missing:
+        # Concurrent misses of the same movies wait for one read.
+        documents.update(
+            coalesce(documents_key(missing), lambda: read_documents(missing))
+        )
+    return [documents[movie_id] for movie_id in movie_ids if movie_id in documents]
+
+
+async def aget_movie_documents(movie_ids):
+    """
+    get_movie_documents for async views
+    """
+    documents = await caching.aget_movies(movie_ids)
+    missing = [movie_id for movie_id in movie_ids if movie_id not in documents]
+    if missing:
+        documents.update(
+            await acoalesce(documents_key(missing), lambda: aread_documents(missing))
+        )
+    return [documents[movie_id] for movie_id in movie_ids if movie_id in documents]
+
+
+def documents_key(movie_ids):
+    return "movie-documents:" + ",".join(str(movie_id) for movie_id in movie_ids)
+
+
+def versioned(data, updated):
+    """
+    Cached copy of a document, with the time it was generated as its
+    _version. Only the fields of MOVIE_FIELDS are ever presented.
+    """
+    return dict(data, _version=updated.isoformat())
+
+
+def read_documents(movie_ids):
+    """
+    Reads the documents of movies missing from the cache from MovieDocument,
+    storing the ones never stored, and caches them
+    """
+    stored = {
+        movie_id: versioned(data, updated)
+        for movie_id, data, updated in MovieDocument.objects.filter(
+            pk__in=movie_ids
+        ).values_list("movie_id", "data", "updated")
+    }
+    stored.update(
+        store_documents([movie_id for movie_id in movie_ids if movie_id not in stored])
+    )
+    caching.set_movies(stored)
+    return stored
+
+
+async def aread_documents(movie_ids):
+    stored = {
+        movie_id: versioned(data, updated)
+        async for movie_id, data, updated in MovieDocument.objects.filter(
+            pk__in=movie_ids
+        ).values_list("movie_id", "data", "updated")
+    }
+    never_stored = [movie_id for movie_id in movie_ids if movie_id not in stored]
+    if never_stored:
+        stored.update(await sync_to_async(store_documents)(never_stored))
+    await caching.aset_movies(stored)
+    return stored
+
+
+def store_documents(movie_ids):
+    """
+    Builds and saves the documents of movies that have none
+    """
+    # Stamped with the time the movies were read, before building them.
+    generated = timezone.now()
+    built = build_documents(movie_ids)
+    MovieDocument.objects.bulk_create(
+        (
+            MovieDocument(movie_id=movie_id, data=data)
+            for movie_id, data in built.items()
+        ),
+        ignore_conflicts=True,
+    )
+    return {movie_id: versioned(data, generated) for movie_id, data in built.items()}
+
+
+def refresh_documents(movie_ids):
+    """
+    Regenerates the stored documents of the given movies
+    """
+    movie_ids = list(movie_ids)
+    started = timezone.now()
+    built = build_documents(movie_ids)
+    with transaction.atomic():
+        MovieDocument.objects.filter(pk__in=movie_ids).delete()
+        MovieDocument.objects.bulk_create(
+            MovieDocument(movie_id=movie_id, data=data)
+            for movie_id, data in built.items()
+        )
+    # The documents just stored, updated after started, may be cached.
+    caching.invalidate_movies(movie_ids, since=started)
+
+
+def rebuild_documents(batch_size=500):
+    """
+    Regenerates the documents of the whole catalog
+    """
+    movie_ids = list(Movie.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(movie_ids), batch_size):
+        refresh_documents(movie_ids[start : start + batch_size])
+    return len(movie_ids)
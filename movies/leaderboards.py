@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, F, FloatField, Value
+from django.db.models.functions import Cast
+
+from .models import Genre, LeaderboardEntry, LeaderboardPrior, Movie
+
+OVERALL = "overall"
+PRIOR_ID = 1
+
+
+def genre_board(genre_id):
+    return f"genre:{genre_id}"
+
+
+def decade_board(year):
+    return f"decade:{year - year % 10}"
+
+
+def bayesian_score(user_rating, votes, mean, min_votes):
+    """
+    Weighted rating that pulls movies with few votes towards the mean rating
+    of the catalog: (v * R + m * C) / (v + m)
+    """
+    if votes + min_votes <= 0:
+        return float(mean)
+    return (votes * float(user_rating) + min_votes * mean) / (votes + min_votes)
+
+
+def score_expression(mean, min_votes):
+    return (
+        F("votes") * Cast("userRating", FloatField())
+        + Value(min_votes * mean, output_field=FloatField())
+    ) / (F("votes") + Value(min_votes, output_field=FloatField()))
+
+
+def catalog_mean():
+    mean = Movie.objects.filter(votes__gt=0).aggregate(mean=Avg("userRating"))
+    return float(mean["mean"] or 0)
+
+
+def prior_mean():
+    """
+    Mean rating of the rated movies, stored with the boards until the next
+    full rebuild
+    """
+    mean = LeaderboardPrior.objects.filter(pk=PRIOR_ID).values_list("mean", flat=True)
+    mean = mean.first()
+    if mean is None:
+        # The first worker to store a mean wins, the others read it back.
+        prior, _ = LeaderboardPrior.objects.get_or_create(
+            pk=PRIOR_ID, defaults={"mean": catalog_mean()}
+        )
+        mean = prior.mean
+    return mean
+
+
+def boards_for(movie, genre_ids):
+    return [OVERALL, decade_board(movie.year)] + [
+        genre_board(genre_id) for genre_id in genre_ids
+    ]
+
+
+def board_movies(board):
+    movies = Movie.objects.all()
+    if board.startswith("genre:"):
+        movies = movies.filter(genres__id=int(board.split(":")[1]))
+    elif board.startswith("decade:"):
+        start = int(board.split(":")[1])
+        movies = movies.filter(year__gte=start, year__lt=start + 10)
+    return movies
+
+
+def best_movies(board, limit, exclude=()):
+    """
+    Ranks the movies of a board straight from the Movie table
+    """
+    config = settings.LEADERBOARDS
+    return list(
+        board_movies(board)
+        .exclude(pk__in=exclude)
+        .annotate(score=score_expression(prior_mean(), config["MIN_VOTES"]))
+        .order_by("-score", "id")
+        .values_list("id", "score")[:limit]
+    )
+
+
+def write_board(board, ranked):
+    """
+    Stores a board ranked as a list of (movie_id, score), only writing the
+    entries whose rank or score changed
+    """
+    with transaction.atomic():
+        entries = LeaderboardEntry.objects.filter(board=board)
+        existing = {entry.movie_id: entry for entry in entries}
+        ranks = {movie_id: rank for rank, (movie_id, _) in enumerate(ranked, start=1)}
+        # Ranks are unique within a board, so moved entries first step aside
+        # past every rank in use before taking their new ones.
+        offset = max((entry.rank for entry in existing.values()), default=0)
+        LeaderboardEntry.objects.filter(
+            pk__in=[
+                entry.pk
+                for movie_id, entry in existing.items()
+                if movie_id not in ranks
+            ]
+        ).delete()
+
+        moved, changed, created = [], [], []
+        for rank, (movie_id, score) in enumerate(ranked, start=1):
+            entry = existing.get(movie_id)
+            if entry is None:
+                created.append(
+                    LeaderboardEntry(
+                        board=board, rank=rank, movie_id=movie_id, score=score
+                    )
+                )
+            elif entry.rank != rank or entry.score != score:
+                if entry.rank != rank:
+                    moved.append(entry)
+                entry.rank, entry.score = rank, score
+                changed.append(entry)
+
+        if moved:
+            for entry in moved:
+                entry.rank += offset
+            LeaderboardEntry.objects.bulk_update(moved, ["rank"])
+            for entry in moved:
+                entry.rank -= offset
+        LeaderboardEntry.objects.bulk_update(changed, ["rank", "score"])
+        LeaderboardEntry.objects.bulk_create(created)
+
+
+def all_boards():
+    boards = [OVERALL]
+    boards += [
+        genre_board(genre_id) for genre_id in Genre.objects.values_list("id", flat=True)
+    ]
+    years = Movie.objects.values_list("year", flat=True).distinct()
+    boards += sorted({decade_board(year) for year in years})
+    return boards
+
+
+def rebuild():
+    """
+    Recomputes the prior mean and every leaderboard from scratch
+    """
+    LeaderboardPrior.objects.update_or_create(
+        pk=PRIOR_ID, defaults={"mean": catalog_mean()}
+    )
+    depth = settings.LEADERBOARDS["DEPTH"]
+    boards = all_boards()
+    for board in boards:
+        write_board(board, best_movies(board, depth))
+    LeaderboardEntry.objects.exclude(board__in=boards).delete()
+    return len(boards)
+
+
+def refresh_movies(movie_ids):
+    """
+    Moves the given movies to their new positions in every board they are or
+    were part of. Boards keep DEPTH entries, more than are served, so movies
+    whose score went down can be re-ranked against the ones below them
+    without scanning the catalog; a board is only refilled from the Movie
+    table when one of its entries left it or fell below its lowest entry.
+    """
+    config = settings.LEADERBOARDS
+    mean = prior_mean()
+    movie_ids = set(movie_ids)
+
+    scores = {}
+    memberships = {}
+    movies = Movie.objects.filter(pk__in=movie_ids).prefetch_related("genres")
+    for movie in movies:
+        scores[movie.id] = bayesian_score(
+            movie.userRating, movie.votes, mean, config["MIN_VOTES"]
+        )
+        genre_ids = [genre.id for genre in movie.genres.all()]
+        memberships[movie.id] = set(boards_for(movie, genre_ids))
+
+    boards = set(
+        LeaderboardEntry.objects.filter(movie_id__in=movie_ids).values_list(
+            "board", flat=True
+        )
+    )
+    for movie_boards in memberships.values():
+        boards |= movie_boards
+
+    for board in boards:
+        refresh_board(board, scores, memberships)
+
+
+def refresh_board(board, scores=None, memberships=None, refill=False):
+    config = settings.LEADERBOARDS
+    scores = scores or {}
+    memberships = memberships or {}
+
+    before = list(
+        LeaderboardEntry.objects.filter(board=board)
+        .order_by("rank")
+        .values_list("movie_id", "score")
+    )
+    entries = {movie_id: score for movie_id, score in before if movie_id not in scores}
+    # Movies off a full board score at most its lowest entry, so a changed
+    # movie that falls below it is left out and ranked again by the refill.
+    floor = None
+    if len(before) >= config["DEPTH"]:
+        floor = min(score for _, score in before)
+    for movie_id, score in scores.items():
+        if board in memberships.get(movie_id, ()):
+            if floor is None or score >= floor:
+                entries[movie_id] = score
+
+    ranked = list(entries.items())
+    left = refill or any(movie_id not in entries for movie_id, _ in before)
+    if left and len(ranked) < config["DEPTH"]:
+        ranked += best_movies(
+            board, config["DEPTH"] - len(ranked), exclude=list(entries)
+        )
+    ranked.sort(key=lambda entry: (-entry[1], entry[0]))
+    ranked = ranked[: config["DEPTH"]]
+
+    if refill or ranked != before:
+        write_board(board, ranked)
+
+
+def refresh_boards(boards):
+    """
+    Closes the gaps left by deleted movies and refills the boards
+    """
+    for board in boards:
+        refresh_board(board, refill=True)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from freshTomatoes import pubsub
+from freshTomatoes.renderers import dumps
+from .models import Movie
+from .ratings import pending_rating
+from .signals import on_commit_batch, rating_changed
+
+CHANNEL = "ratings"
+
+
+def rating_message(movie_id, user_rating, votes):
+    user_rating, votes = pending_rating(movie_id, user_rating, votes)
+    return {"id": movie_id, "userRating": float(user_rating), "votes": votes}
+
+
+def publish_ratings(movie_ids):
+    """
+    Publishes the committed ratings of the given movies to their live streams
+    """
+    movies = Movie.objects.filter(pk__in=list(movie_ids)).values_list(
+        "id", "userRating", "votes"
+    )
+    for movie_id, user_rating, votes in movies:
+        pubsub.publish(CHANNEL, movie_id, rating_message(movie_id, user_rating, votes))
+
+
+@receiver(rating_changed)
+def rating_published(sender, movie_ids, **kwargs):
+    on_commit_batch(publish_ratings, movie_ids)
+
+
+def sse_event(data, event="rating"):
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def stream_ratings(movie_ids):
+    """
+    Server-sent events of the ratings of the given movies: their current
+    ratings, then their updates, at most one per movie every INTERVAL_MS
+    """
+    config = settings.LIVE_RATINGS
+    # Subscribed before the ratings are read, so that no update is missed.
+    subscription = pubsub.subscribe(CHANNEL, movie_ids)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n".encode()
+        movies = Movie.objects.filter(pk__in=movie_ids).values_list(
+            "id", "userRating", "votes"
+        )
+        async for movie_id, user_rating, votes in movies:
+            yield sse_event(rating_message(movie_id, user_rating, votes))
+
+        # Streams end once in a while, as disconnected clients are only
+        # noticed when writing to them, and clients reconnect after RETRY_MS.
+        deadline = time.monotonic() + config["MAX_DURATION"]
+        while (remaining := deadline - time.monotonic()) > 0:
+            messages = await subscription.get(min(config["KEEPALIVE"], remaining))
+            if not messages:
+                yield b": keepalive\n\n"
+                continue
+            for message in messages.values():
+                yield sse_event(message)
+            # The updates published meanwhile are coalesced per movie.
+            await asyncio.sleep(config["INTERVAL_MS"] / 1000)
+    finally:
+        subscription.close()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from movies import similarity
+
+
+class Command(BaseCommand):
+    help = "Recomputes the most similar movies of every movie"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Only recompute the movies whose credits or neighbours changed",
+        )
+
+    def handle(self, *args, **options):
+        if options["stale"]:
+            count = similarity.refresh_stale()
+            self.stdout.write(f"Refreshed neighbours of {count} stale movies")
+            return
+        count = similarity.rebuild()
+        self.stdout.write(f"Computed neighbours of {count} movies")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies import celebrities
+
+
+class Command(BaseCommand):
+    help = "Recounts the movies directed and acted in by every celebrity"
+
+    def handle(self, *args, **options):
+        count = celebrities.count_credits()
+        self.stdout.write(f"Counted credits of {count} celebrities")
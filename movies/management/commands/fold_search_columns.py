@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from freshTomatoes.pagination import invalidate_counts
+from freshTomatoes.text import refold
+from movies.models import Celebrity, Genre, Movie, Rating
+from users.models import TomatoeUser
+
+MODELS = [Movie, Celebrity, Genre, Rating, TomatoeUser]
+
+
+class Command(BaseCommand):
+    help = "Recomputes the case-folded search columns used by the text filters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            count = refold(model, options["batch_size"])
+            self.stdout.write(f"Folded {count} {model._meta.verbose_name_plural}")
+        invalidate_counts(MODELS)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from movies import deletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes the rows of soft deleted movies and users, with their reviews "
+        "and credits, in small transactions. Meant to be run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge-after",
+            type=int,
+            help="Seconds since their deletion after which rows are purged",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows deleted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        movies, users = deletion.purge_deleted(
+            options["purge_after"], options["batch_size"]
+        )
+        self.stdout.write(f"Purged {movies} movies and {users} users")
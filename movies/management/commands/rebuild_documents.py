@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies import documents
+
+
+class Command(BaseCommand):
+    help = "Regenerates the denormalized document of every movie"
+
+    def handle(self, *args, **options):
+        count = documents.rebuild_documents()
+        self.stdout.write(f"Regenerated documents of {count} movies")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies import leaderboards
+
+
+class Command(BaseCommand):
+    help = "Recomputes every leaderboard and the mean rating they are weighted with"
+
+    def handle(self, *args, **options):
+        count = leaderboards.rebuild()
+        self.stdout.write(f"Rebuilt {count} leaderboards")
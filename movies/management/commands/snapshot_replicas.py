@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from freshTomatoes.replication import replica_path, snapshot
+
+
+class Command(BaseCommand):
+    help = "Copies the primary sqlite database into every configured read replica"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep refreshing the replicas every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                "No replicas configured, set DATABASE_REPLICA_COUNT first."
+            )
+        source = str(settings.DATABASES["default"]["NAME"])
+
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                snapshot(source, replica_path(alias))
+                self.stdout.write(f"Refreshed {alias}")
+            if options["interval"] <= 0:
+                return
+            time.sleep(options["interval"])
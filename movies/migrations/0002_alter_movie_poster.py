@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='poster',
+            field=models.URLField(null=True),
+        ),
+    ]
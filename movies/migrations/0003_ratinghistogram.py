@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_histograms(apps, schema_editor):
+    # Histograms of the movies reviewed before they were maintained.
+    Review = apps.get_model("reviews", "Review")
+    RatingHistogram = apps.get_model("movies", "RatingHistogram")
+    reviews = Review.objects.values_list("movie_id", "userRating")
+    histograms = {}
+    for movie_id, rating in reviews.iterator():
+        histogram = histograms.setdefault(movie_id, RatingHistogram(movie_id=movie_id))
+        score = rating.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        field = f"bucket_{int(score)}"
+        setattr(histogram, field, getattr(histogram, field) + 1)
+    RatingHistogram.objects.bulk_create(histograms.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_alter_movie_poster'),
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingHistogram',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='histogram', serialize=False, to='movies.movie')),
+                ('bucket_0', models.PositiveIntegerField(default=0)),
+                ('bucket_1', models.PositiveIntegerField(default=0)),
+                ('bucket_2', models.PositiveIntegerField(default=0)),
+                ('bucket_3', models.PositiveIntegerField(default=0)),
+                ('bucket_4', models.PositiveIntegerField(default=0)),
+                ('bucket_5', models.PositiveIntegerField(default=0)),
+                ('bucket_6', models.PositiveIntegerField(default=0)),
+                ('bucket_7', models.PositiveIntegerField(default=0)),
+                ('bucket_8', models.PositiveIntegerField(default=0)),
+                ('bucket_9', models.PositiveIntegerField(default=0)),
+                ('bucket_10', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_ratinghistogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=64)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='movies.movie')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('board', 'rank'), name='unique_board_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('board', 'movie'), name='unique_board_movie'),
+        ),
+    ]
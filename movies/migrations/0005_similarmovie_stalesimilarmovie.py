@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_leaderboardentry_leaderboardprior'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_movies', to='movies.movie')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaleSimilarMovie',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='movies.movie')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarmovie',
+            constraint=models.UniqueConstraint(fields=('movie', 'rank'), name='unique_similar_movie_rank'),
+        ),
+    ]
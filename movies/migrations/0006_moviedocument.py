@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_similarmovie_stalesimilarmovie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieDocument',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='movies.movie')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_credits(apps, schema_editor):
+    # Counts of the celebrities credited before they were maintained.
+    Movie = apps.get_model("movies", "Movie")
+    Celebrity = apps.get_model("movies", "Celebrity")
+    counts = {}
+    for column, field in [("directedCount", "directors"), ("actedCount", "cast")]:
+        through = Movie._meta.get_field(field).remote_field.through
+        credits = (
+            through.objects.filter(celebrity_id=OuterRef("pk"))
+            .order_by()
+            .values("celebrity_id")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        counts[column] = Coalesce(Subquery(credits), 0)
+    Celebrity.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_moviedocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='celebrity',
+            name='actedCount',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='celebrity',
+            name='directedCount',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(count_credits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+from freshTomatoes.text import refold
+
+# Folded column of the text field of every model.
+FOLDED_FIELDS = {
+    "Movie": {"title": "foldedTitle"},
+    "Celebrity": {"name": "foldedName"},
+    "Genre": {"name": "foldedName"},
+    "Rating": {"name": "foldedName"},
+}
+
+
+def fold_columns(apps, schema_editor):
+    for model_name, folded_fields in FOLDED_FIELDS.items():
+        refold(apps.get_model("movies", model_name), folded_fields=folded_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_celebrity_credit_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='celebrity',
+            name='foldedName',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=256),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='foldedName',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=128),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='foldedTitle',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=256),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='foldedName',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fold_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Role of the credits of the former many-to-many fields.
+ROLES = {"directors": "director", "cast": "cast"}
+
+
+def copy_credits(apps, schema_editor):
+    Movie = apps.get_model("movies", "Movie")
+    Credit = apps.get_model("movies", "Credit")
+    for field, role in ROLES.items():
+        through = Movie._meta.get_field(field).remote_field.through
+        # Credits were listed in the order of the table's unique
+        # (movie_id, celebrity_id) index, which becomes their billing.
+        rows = through.objects.order_by("movie_id", "celebrity_id").values_list(
+            "movie_id", "celebrity_id"
+        )
+        credits = []
+        orders = {}
+        for movie_id, celebrity_id in rows.iterator():
+            orders[movie_id] = orders.get(movie_id, -1) + 1
+            credits.append(
+                Credit(
+                    movie_id=movie_id,
+                    celebrity_id=celebrity_id,
+                    role=role,
+                    order=orders[movie_id],
+                )
+            )
+        Credit.objects.bulk_create(credits, batch_size=1000)
+
+
+def restore_credits(apps, schema_editor):
+    Movie = apps.get_model("movies", "Movie")
+    Credit = apps.get_model("movies", "Credit")
+    for field, role in ROLES.items():
+        through = Movie._meta.get_field(field).remote_field.through
+        rows = Credit.objects.filter(role=role).values_list("movie_id", "celebrity_id")
+        through.objects.bulk_create(
+            [
+                through(movie_id=movie_id, celebrity_id=celebrity_id)
+                for movie_id, celebrity_id in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_folded_search_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Credit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('director', 'Director'), ('cast', 'Cast')], max_length=8)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('celebrity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.celebrity')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='credit',
+            index=models.Index(fields=['celebrity', 'role'], name='movies_cred_celebri_f95452_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='credit',
+            constraint=models.UniqueConstraint(fields=('movie', 'role', 'celebrity'), name='unique_credit'),
+        ),
+        migrations.RunPython(copy_credits, restore_credits),
+        migrations.RemoveField(
+            model_name='movie',
+            name='cast',
+        ),
+        migrations.RemoveField(
+            model_name='movie',
+            name='directors',
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='celebrities',
+            field=models.ManyToManyField(blank=True, related_name='movies', through='movies.Credit', to='movies.celebrity'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_credit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='deletedAt',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(condition=models.Q(('deletedAt__isnull', False)), fields=['deletedAt'], name='movie_deleted_at'),
+        ),
+    ]
@@ -1,31 +1,181 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from freshTomatoes.text import FoldedFieldsMixin
 
-class Genre(models.Model):
+
+class ActiveManager(models.Manager):
+    """
+    Default manager of soft deleted models, hiding the deleted rows until
+    purge_deleted removes them
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deletedAt__isnull=True)
+
+
+class RoleCredits:
+    """
+    The celebrities credited in one role of a movie, in billing order, or the
+    movies a celebrity is credited in with that role. Managed like a
+    many-to-many relation (all, add, set, remove, clear) on top of Credit;
+    every change sends signals.credits_changed.
+    """
+
+    def __init__(self, instance, role, reverse=False):
+        self.instance = instance
+        self.role = role
+        self.reverse = reverse
+        # Credit column of the instance and of the related objects.
+        self.own, self.other = (
+            ("celebrity", "movie") if reverse else ("movie", "celebrity")
+        )
+
+    def get_credits(self):
+        return Credit.objects.filter(role=self.role, **{self.own: self.instance})
+
+    def all(self):
+        """
+        Returns a queryset of the credited objects. Lists of movies prefetch
+        the credits of each role with documents.credits_prefetch instead.
+        """
+        related = self.instance.movies if self.reverse else self.instance.celebrities
+        return related.filter(credits__role=self.role).order_by("credits__order", "pk")
+
+    def add(self, *objs):
+        related_ids = list(dict.fromkeys(getattr(obj, "pk", obj) for obj in objs))
+        existing = set(self.get_credits().values_list(f"{self.other}_id", flat=True))
+        related_ids = [pk for pk in related_ids if pk not in existing]
+        if not related_ids:
+            return
+        if self.reverse:
+            # Appended to the billing of every movie.
+            last = dict(
+                Credit.objects.filter(role=self.role, movie_id__in=related_ids)
+                .values("movie_id")
+                .annotate(last=models.Max("order"))
+                .values_list("movie_id", "last")
+            )
+            credits = [
+                Credit(
+                    movie_id=pk,
+                    celebrity=self.instance,
+                    role=self.role,
+                    order=last.get(pk, -1) + 1,
+                )
+                for pk in related_ids
+            ]
+        else:
+            last = self.get_credits().aggregate(last=models.Max("order"))["last"]
+            start = -1 if last is None else last
+            credits = [
+                Credit(
+                    movie=self.instance,
+                    celebrity_id=pk,
+                    role=self.role,
+                    order=start + position,
+                )
+                for position, pk in enumerate(related_ids, start=1)
+            ]
+        Credit.objects.bulk_create(credits)
+        self.changed(related_ids)
+
+    def set(self, objs):
+        """
+        Replaces the related objects. The order of a movie's celebrities is
+        their billing order.
+        """
+        related_ids = list(dict.fromkeys(getattr(obj, "pk", obj) for obj in objs))
+        credits = self.get_credits().order_by("order", f"{self.other}_id")
+        current = list(credits.values_list(f"{self.other}_id", flat=True))
+        if current == related_ids:
+            return
+        if self.reverse:
+            self.remove(*[pk for pk in current if pk not in related_ids])
+            self.add(*related_ids)
+            return
+        credits.delete()
+        Credit.objects.bulk_create(
+            Credit(movie=self.instance, celebrity_id=pk, role=self.role, order=order)
+            for order, pk in enumerate(related_ids)
+        )
+        self.changed(set(current) | set(related_ids))
+
+    def remove(self, *objs):
+        related_ids = [getattr(obj, "pk", obj) for obj in objs]
+        credits = self.get_credits().filter(**{f"{self.other}_id__in": related_ids})
+        removed = list(credits.values_list(f"{self.other}_id", flat=True))
+        if removed:
+            credits.delete()
+            self.changed(removed)
+
+    def clear(self):
+        self.remove(*self.get_credits().values_list(f"{self.other}_id", flat=True))
+
+    def changed(self, related_ids):
+        from .signals import credits_changed
+
+        own_ids = [self.instance.pk]
+        movie_ids, celebrity_ids = (
+            (related_ids, own_ids) if self.reverse else (own_ids, related_ids)
+        )
+        credits_changed.send(
+            sender=Credit, movie_ids=list(movie_ids), celebrity_ids=list(celebrity_ids)
+        )
+
+
+class CreditsDescriptor:
+    def __init__(self, role, reverse=False):
+        self.role = role
+        self.reverse = reverse
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return RoleCredits(instance, self.role, self.reverse)
+
+
+class Genre(FoldedFieldsMixin, models.Model):
     name = models.CharField(max_length=128)
+    # Case-folded name without accents, the column the filters search.
+    foldedName = models.CharField(max_length=128, db_index=True, editable=False)
+
+    folded_fields = {"name": "foldedName"}
 
     def __str__(self):
         return self.name
 
 
-class Celebrity(models.Model):
+class Celebrity(FoldedFieldsMixin, models.Model):
     name = models.CharField(max_length=256)
+    foldedName = models.CharField(max_length=256, db_index=True, editable=False)
+    # Number of movies directed and acted in, kept up to date on credit changes.
+    directedCount = models.PositiveIntegerField(default=0, db_index=True)
+    actedCount = models.PositiveIntegerField(default=0, db_index=True)
+    movie_directors = CreditsDescriptor("director", reverse=True)
+    movie_cast = CreditsDescriptor("cast", reverse=True)
+
+    folded_fields = {"name": "foldedName"}
 
     def __str__(self):
         return self.name
 
 
-class Rating(models.Model):
+class Rating(FoldedFieldsMixin, models.Model):
     name = models.CharField(max_length=32)
+    foldedName = models.CharField(max_length=32, db_index=True, editable=False)
+
+    folded_fields = {"name": "foldedName"}
 
     def __str__(self):
         return self.name
 
 
-class Movie(models.Model):
+class Movie(FoldedFieldsMixin, models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=256)
+    foldedTitle = models.CharField(max_length=256, db_index=True, editable=False)
     year = models.IntegerField(
         validators=[MinValueValidator(1895), MaxValueValidator(3000)]
     )
@@ -34,8 +184,12 @@ class Movie(models.Model):
     )
     genres = models.ManyToManyField(Genre, related_name="movie_genres", blank=True)
     runtime = models.IntegerField(null=True)
-    directors = models.ManyToManyField(Celebrity, related_name="movie_directors")
-    cast = models.ManyToManyField(Celebrity, related_name="movie_cast", blank=True)
+    # Director and cast credits, stored in Credit.
+    celebrities = models.ManyToManyField(
+        Celebrity, through="Credit", related_name="movies", blank=True
+    )
+    directors = CreditsDescriptor("director")
+    cast = CreditsDescriptor("cast")
     poster = models.URLField(null=True)
     userRating = models.DecimalField(
         default=0,
@@ -44,6 +198,178 @@ class Movie(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(10)],
     )
     votes = models.IntegerField(default=0)
+    # Set when the movie is deleted, until purge_deleted removes its rows.
+    deletedAt = models.DateTimeField(null=True, editable=False)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    folded_fields = {"title": "foldedTitle"}
+
+    class Meta:
+        # Only deleted movies are indexed, for the purge. An index on every
+        # row would be picked by planners over the selective search indexes.
+        indexes = [
+            models.Index(
+                fields=["deletedAt"],
+                condition=models.Q(deletedAt__isnull=False),
+                name="movie_deleted_at",
+            )
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.year})"
+
+
+class Credit(models.Model):
+    """
+    Director or cast credit of a celebrity in a movie. order is the billing
+    order of the celebrity among the movie's credits of the same role.
+    """
+
+    DIRECTOR = "director"
+    CAST = "cast"
+    ROLES = [(DIRECTOR, "Director"), (CAST, "Cast")]
+
+    movie = models.ForeignKey(Movie, related_name="credits", on_delete=models.CASCADE)
+    celebrity = models.ForeignKey(
+        Celebrity, related_name="credits", on_delete=models.CASCADE
+    )
+    role = models.CharField(max_length=8, choices=ROLES)
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["movie", "role", "celebrity"], name="unique_credit"
+            ),
+        ]
+        # Filmographies and credit counts are read by celebrity.
+        indexes = [models.Index(fields=["celebrity", "role"])]
+
+    def __str__(self):
+        return f"{self.celebrity_id} ({self.role}) in {self.movie_id}"
+
+
+class RatingHistogram(models.Model):
+    """
+    Number of reviews of a movie for each score, rounded to the nearest integer
+    """
+
+    SCORES = range(11)
+
+    movie = models.OneToOneField(
+        Movie, primary_key=True, related_name="histogram", on_delete=models.CASCADE
+    )
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+    bucket_10 = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def bucket(score):
+        return f"bucket_{score}"
+
+    def counts(self):
+        return [getattr(self, self.bucket(score)) for score in self.SCORES]
+
+    def __str__(self):
+        return f"Histogram of {self.movie_id}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Precomputed position of a movie in a leaderboard, ranked by its Bayesian
+    weighted score. Boards are named "overall", "genre:<id>" or "decade:<year>".
+    """
+
+    board = models.CharField(max_length=64)
+    rank = models.PositiveIntegerField()
+    movie = models.ForeignKey(
+        Movie, related_name="leaderboard_entries", on_delete=models.CASCADE
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["board", "rank"], name="unique_board_rank"),
+            models.UniqueConstraint(
+                fields=["board", "movie"], name="unique_board_movie"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.board} #{self.rank}: {self.movie_id}"
+
+
+class LeaderboardPrior(models.Model):
+    """
+    Mean rating C the leaderboards are scored with, stored with them so every
+    worker scores with the same one until the next rebuild. Single row.
+    """
+
+    mean = models.FloatField()
+
+    def __str__(self):
+        return f"Leaderboard prior mean: {self.mean}"
+
+
+class SimilarMovie(models.Model):
+    """
+    Precomputed neighbours of a movie, ranked by the similarity of their
+    genres, directors and cast
+    """
+
+    movie = models.ForeignKey(
+        Movie, related_name="similar_movies", on_delete=models.CASCADE
+    )
+    rank = models.PositiveIntegerField()
+    similar = models.ForeignKey(Movie, related_name="+", on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["movie", "rank"], name="unique_similar_movie_rank"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} #{self.rank}: {self.similar_id}"
+
+
+class StaleSimilarMovie(models.Model):
+    """
+    Movie whose features or neighbours changed since its neighbours were
+    computed, until `build_similar_movies --stale` recomputes them
+    """
+
+    movie = models.OneToOneField(
+        Movie, primary_key=True, related_name="+", on_delete=models.CASCADE
+    )
+
+    def __str__(self):
+        return f"Stale neighbours: {self.movie_id}"
+
+
+class MovieDocument(models.Model):
+    """
+    Denormalized get_movie_data document of a movie, regenerated whenever the
+    movie, its credits or its rating change
+    """
+
+    movie = models.OneToOneField(
+        Movie, primary_key=True, related_name="document", on_delete=models.CASCADE
+    )
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Document of {self.movie_id}"
@@ -0,0 +1,324 @@
+import atexit
+import math
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Movie, RatingHistogram
+from .signals import rating_changed
+
+TWO_PLACES = Decimal("0.01")
+
+
+def combine_rating(user_rating, votes, rating_sum, new_votes):
+    """
+    Returns the average rating and vote count after adding new_votes votes
+    whose ratings add up to rating_sum
+    """
+    total_votes = votes + new_votes
+    if total_votes <= 0:
+        return Decimal(0), 0
+    average = (Decimal(user_rating) * votes + Decimal(rating_sum)) / total_votes
+    return average.quantize(TWO_PLACES), total_votes
+
+
+class RatingBuffer:
+    """
+    Accumulates rating deltas per movie in memory and writes them to the
+    database in one batched update, every flush_interval_ms milliseconds or
+    once flush_max_reviews reviews are pending, whichever comes first.
+    """
+
+    def __init__(self, flush_interval_ms=500, flush_max_reviews=100):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_reviews = flush_max_reviews
+        self.pending = {}
+        self.flushing = {}
+        self.reviews = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.flush_interval <= 0:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="rating-flusher", daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # The deltas are kept and retried on the next tick.
+                pass
+
+    def add(self, movie_id, rating_sum, votes=1):
+        self.start()
+        with self.lock:
+            delta = self.pending.setdefault(movie_id, [Decimal(0), 0])
+            delta[0] += Decimal(rating_sum)
+            delta[1] += votes
+            self.reviews += 1
+            full = self.reviews >= self.flush_max_reviews
+        if full:
+            self.flush()
+
+    def delta(self, movie_id):
+        """
+        Returns the (rating_sum, votes) not yet written for a movie
+        """
+        rating_sum, votes = Decimal(0), 0
+        with self.lock:
+            for deltas in (self.flushing, self.pending):
+                if movie_id in deltas:
+                    rating_sum += deltas[movie_id][0]
+                    votes += deltas[movie_id][1]
+        return rating_sum, votes
+
+    def flush(self):
+        """
+        Writes the pending deltas in their own transaction. Raises
+        RuntimeError inside an outer atomic block, whose rollback would lose
+        or replay the deltas after they left the buffer.
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.pending = self.pending, {}
+                self.reviews = 0
+            if not self.flushing:
+                return
+            try:
+                with transaction.atomic(durable=True):
+                    # Registered first so the deltas leave the buffer before
+                    # any other callback of the commit reads the ratings.
+                    transaction.on_commit(self.committed)
+                    movies = Movie.objects.in_bulk(list(self.flushing))
+                    for movie_id, (rating_sum, votes) in self.flushing.items():
+                        movie = movies.get(movie_id)
+                        if movie is not None:
+                            movie.userRating, movie.votes = combine_rating(
+                                movie.userRating, movie.votes, rating_sum, votes
+                            )
+                    Movie.objects.bulk_update(movies.values(), ["userRating", "votes"])
+                    rating_changed.send(sender=Movie, movie_ids=list(movies))
+            except Exception:
+                with self.lock:
+                    for movie_id, (rating_sum, votes) in self.flushing.items():
+                        delta = self.pending.setdefault(movie_id, [Decimal(0), 0])
+                        delta[0] += rating_sum
+                        delta[1] += votes
+                    self.flushing = {}
+                raise
+
+    def committed(self):
+        with self.lock:
+            self.flushing = {}
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            config = settings.RATING_WRITE_BEHIND
+            _buffer = RatingBuffer(
+                flush_interval_ms=config["FLUSH_INTERVAL_MS"],
+                flush_max_reviews=config["FLUSH_MAX_REVIEWS"],
+            )
+            atexit.register(_buffer.stop)
+        return _buffer
+
+
+def update_rating(movie, rating, previous=None):
+    """
+    Adds a vote to the movie's rating, or replaces the previous rating of the
+    same review, either right away or through the write-behind buffer
+    """
+    if previous is None:
+        apply_rating(movie, rating, 1)
+    else:
+        apply_rating(movie, Decimal(rating) - Decimal(previous), 0)
+    update_histogram(movie.id, rating, previous)
+
+
+def remove_rating(movie, rating):
+    """
+    Takes the vote of a deleted review out of the movie's rating
+    """
+    apply_rating(movie, -Decimal(rating), -1)
+    update_histogram(movie.id, None, rating)
+
+
+def remove_ratings(totals):
+    """
+    Takes the votes of deleted reviews out of the ratings of several movies
+    at once. totals maps the id of every movie to the (rating_sum, votes) of
+    its deleted reviews.
+    """
+    if settings.RATING_WRITE_BEHIND["ENABLED"]:
+
+        def add_to_buffer():
+            for movie_id, (rating_sum, votes) in totals.items():
+                get_buffer().add(movie_id, -Decimal(rating_sum), -votes)
+
+        transaction.on_commit(add_to_buffer)
+        return
+
+    with transaction.atomic():
+        movies = Movie.all_objects.select_for_update().in_bulk(list(totals))
+        for movie_id, movie in movies.items():
+            rating_sum, votes = totals[movie_id]
+            movie.userRating, movie.votes = combine_rating(
+                movie.userRating, movie.votes, -Decimal(rating_sum), -votes
+            )
+        Movie.all_objects.bulk_update(movies.values(), ["userRating", "votes"])
+        rating_changed.send(sender=Movie, movie_ids=list(movies))
+
+
+def apply_rating(movie, rating_sum, votes):
+    if settings.RATING_WRITE_BEHIND["ENABLED"]:
+        # Only votes whose review was committed reach the buffer.
+        transaction.on_commit(
+            lambda: get_buffer().add(movie.id, rating_sum, votes)
+        )
+        return
+
+    with transaction.atomic():
+        # The movie may have been loaded before other writes to its rating,
+        # and its row stays locked until the new rating is saved.
+        movie.userRating, movie.votes = (
+            Movie.all_objects.select_for_update()
+            .values_list("userRating", "votes")
+            .get(pk=movie.pk)
+        )
+        movie.userRating, movie.votes = combine_rating(
+            movie.userRating, movie.votes, rating_sum, votes
+        )
+        movie.save(update_fields=["userRating", "votes"])
+        rating_changed.send(sender=Movie, movie_ids=[movie.id])
+
+
+def score_bucket(rating):
+    return int(Decimal(rating).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def update_histogram(movie_id, rating=None, previous=None):
+    """
+    Moves one review between the score buckets of a movie's histogram. A
+    missing histogram is rebuilt from the movie's reviews.
+    """
+    changes = {}
+    if previous is not None:
+        field = RatingHistogram.bucket(score_bucket(previous))
+        changes[field] = Greatest(F(field) - 1, 0)
+    if rating is not None:
+        field = RatingHistogram.bucket(score_bucket(rating))
+        if field in changes:
+            changes.pop(field)
+        else:
+            changes[field] = F(field) + 1
+    if not changes:
+        return
+    if not RatingHistogram.objects.filter(movie_id=movie_id).update(**changes):
+        rebuild_histograms([movie_id])
+
+
+def rebuild_histograms(movie_ids=None):
+    """
+    Recomputes the histograms of the given movies, or of every reviewed movie,
+    from their reviews
+    """
+    Review = apps.get_model("reviews", "Review")
+    reviews = Review.objects.all()
+    if movie_ids is not None:
+        reviews = reviews.filter(movie_id__in=movie_ids)
+
+    histograms = {}
+    for movie_id, rating in reviews.values_list("movie_id", "userRating").iterator():
+        histogram = histograms.setdefault(movie_id, RatingHistogram(movie_id=movie_id))
+        field = RatingHistogram.bucket(score_bucket(rating))
+        setattr(histogram, field, getattr(histogram, field) + 1)
+
+    with transaction.atomic():
+        existing = RatingHistogram.objects.all()
+        if movie_ids is not None:
+            existing = existing.filter(movie_id__in=movie_ids)
+        existing.delete()
+        RatingHistogram.objects.bulk_create(histograms.values())
+    return len(histograms)
+
+
+def histogram_stats(histogram):
+    """
+    Returns the score distribution of a histogram with its mean, median and
+    standard deviation, computed from the buckets alone
+    """
+    counts = histogram.counts() if histogram is not None else [0] * 11
+    total = sum(counts)
+    data = {
+        "buckets": {str(score): count for score, count in enumerate(counts)},
+        "count": total,
+        "mean": None,
+        "median": None,
+        "stddev": None,
+    }
+    if not total:
+        return data
+
+    mean = sum(score * count for score, count in enumerate(counts)) / total
+    variance = (
+        sum(count * (score - mean) ** 2 for score, count in enumerate(counts)) / total
+    )
+
+    def nth_score(n):
+        seen = 0
+        for score, count in enumerate(counts):
+            seen += count
+            if seen > n:
+                return score
+
+    median = (nth_score((total - 1) // 2) + nth_score(total // 2)) / 2
+    data["mean"] = round(mean, 2)
+    data["median"] = median
+    data["stddev"] = round(math.sqrt(variance), 2)
+    return data
+
+
+def current_rating(movie):
+    """
+    Returns the movie's userRating and votes including the deltas that are
+    still waiting in the write-behind buffer
+    """
+    return pending_rating(movie.id, movie.userRating, movie.votes)
+
+
+def pending_rating(movie_id, user_rating, votes):
+    """
+    Adds the deltas still waiting in the write-behind buffer to a stored
+    userRating and votes
+    """
+    if _buffer is None:
+        return user_rating, votes
+    rating_sum, new_votes = _buffer.delta(movie_id)
+    # Overwritten reviews leave a rating_sum without new votes.
+    if not rating_sum and not new_votes:
+        return user_rating, votes
+    return combine_rating(user_rating, votes, rating_sum, new_votes)
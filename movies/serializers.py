@@ -1,9 +1,56 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Movie
+from .models import Celebrity, Movie
+
+# Credits of a movie, set in billing order.
+CREDIT_FIELDS = ["directors", "cast"]
 
 
 class MovieSerializer(serializers.ModelSerializer):
+    directors = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Celebrity.objects.all()
+    )
+    cast = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Celebrity.objects.all(), required=False
+    )
+
     class Meta:
         model = Movie
-        fields = "__all__"
+        exclude = ["foldedTitle", "deletedAt", "celebrities"]
         read_only_fields = ["id", "userRating", "votes"]
+
+    # The movie, its credits, the credit counts of the celebrities and the
+    # change log entries of all of them are written together or not at all.
+    def create(self, validated_data):
+        credits = pop_credits(validated_data)
+        with transaction.atomic():
+            movie = super().create(validated_data)
+            set_credits(movie, credits)
+        return movie
+
+    def update(self, instance, validated_data):
+        credits = pop_credits(validated_data)
+        with transaction.atomic():
+            movie = super().update(instance, validated_data)
+            set_credits(movie, credits)
+        return movie
+
+
+def pop_credits(validated_data):
+    return {
+        field: validated_data.pop(field)
+        for field in CREDIT_FIELDS
+        if field in validated_data
+    }
+
+
+def set_credits(movie, credits):
+    for field, celebrities in credits.items():
+        getattr(movie, field).set(celebrities)
+
+
+class CelebritySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Celebrity
+        exclude = ["foldedName"]
+        read_only_fields = ["id", "directedCount", "actedCount"]
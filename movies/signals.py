@@ -0,0 +1,178 @@
+from asgiref.local import Local
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from freshTomatoes.pagination import invalidate_counts
+from . import caching, celebrities, documents, leaderboards, similarity
+from .models import (
+    Celebrity,
+    Genre,
+    LeaderboardEntry,
+    Movie,
+    MovieDocument,
+    Rating,
+    SimilarMovie,
+)
+
+# Sent with movie_ids once the userRating or votes of those movies changed.
+rating_changed = Signal()
+# Sent with movie_ids and celebrity_ids once credits between them changed.
+credits_changed = Signal()
+# Sent with the instance once a movie or user is soft deleted.
+soft_deleted = Signal()
+# Sent with movie_ids whenever the documents of those movies change.
+movies_changed = Signal()
+
+
+# Ids waiting for the commit, per database connection and func.
+_pending = Local()
+
+
+def on_commit_batch(func, ids):
+    """
+    Calls func(ids) once the current transaction commits, merging the ids of
+    every call made for the same func before the commit. Each call registers
+    a flush, so the ids outlive the rollback of the savepoint that registered
+    the first one; the first flush to run takes them all and the others find
+    nothing left.
+    """
+    connection = transaction.get_connection()
+    batches = getattr(_pending, connection.alias, None)
+    if batches is None:
+        batches = {}
+        setattr(_pending, connection.alias, batches)
+    batches.setdefault(func, set()).update(ids)
+
+    def flush():
+        batch = batches.pop(func, None)
+        if batch:
+            func(batch)
+
+    transaction.on_commit(flush)
+
+
+def invalidate_movies(movie_ids, counts=True):
+    """
+    Drops the stored and cached documents of the movies now, and regenerates
+    them once the transaction commits. Unless only their rating changed, the
+    cached counts of the movie lists are invalidated then too.
+    """
+    MovieDocument.objects.filter(pk__in=list(movie_ids)).delete()
+    caching.invalidate_movies(movie_ids)
+    movies_changed.send(sender=Movie, movie_ids=movie_ids)
+    on_commit_batch(documents.refresh_documents, movie_ids)
+    if counts:
+        on_commit_batch(invalidate_counts, [Movie])
+
+
+@receiver(rating_changed)
+def refresh_leaderboards(sender, movie_ids, **kwargs):
+    invalidate_movies(movie_ids, counts=False)
+    on_commit_batch(leaderboards.refresh_movies, movie_ids)
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, update_fields=None, **kwargs):
+    # Rating updates announce themselves through rating_changed.
+    if update_fields is not None and set(update_fields) <= {"userRating", "votes"}:
+        return
+    invalidate_movies([instance.id])
+    on_commit_batch(leaderboards.refresh_movies, [instance.id])
+
+
+def changed_pks(sender, instance, action, reverse, pk_set):
+    """
+    Returns the primary keys of the other side of an m2m_changed signal.
+    clear() does not send them, so they are read on pre_clear and kept on the
+    instance until post_clear.
+    """
+    if action == "pre_clear":
+        column = similarity.THROUGH_COLUMNS[sender]
+        if reverse:
+            credits = sender.objects.filter(**{column: instance.pk})
+            pks = credits.values_list("movie_id", flat=True)
+        else:
+            credits = sender.objects.filter(movie_id=instance.pk)
+            pks = credits.values_list(column, flat=True)
+        instance.__dict__.setdefault("_cleared_pks", {})[sender] = set(pks)
+    elif action == "post_clear":
+        return instance.__dict__.get("_cleared_pks", {}).pop(sender, set())
+    elif action in ("post_add", "post_remove"):
+        return set(pk_set or ())
+    return set()
+
+
+def credited_movies(instance, reverse, pks):
+    """
+    Returns the ids of the movies whose credits an m2m_changed signal is about
+    """
+    if not pks:
+        return []
+    return list(pks) if reverse else [instance.id]
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    pks = changed_pks(sender, instance, action, reverse, pk_set)
+    movie_ids = credited_movies(instance, reverse, pks)
+    if movie_ids:
+        invalidate_movies(movie_ids)
+        on_commit_batch(leaderboards.refresh_movies, movie_ids)
+        similarity.mark_stale(movie_ids)
+
+
+@receiver(credits_changed)
+def movie_credits_changed(sender, movie_ids, celebrity_ids, **kwargs):
+    invalidate_movies(movie_ids)
+    similarity.mark_stale(movie_ids)
+    celebrities.count_credits(celebrity_ids)
+
+
+@receiver(pre_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    invalidate_movies([instance.id])
+    # The credits are deleted with the movie, without credits_changed.
+    on_commit_batch(
+        celebrities.count_credits, celebrities.credited_celebrities(instance)
+    )
+    boards = LeaderboardEntry.objects.filter(movie=instance).values_list(
+        "board", flat=True
+    )
+    on_commit_batch(leaderboards.refresh_boards, list(boards))
+    listed_by = SimilarMovie.objects.filter(similar=instance).values_list(
+        "movie_id", flat=True
+    )
+    similarity.mark_stale(list(listed_by))
+
+
+@receiver(soft_deleted, sender=Movie)
+def movie_soft_deleted(sender, instance, **kwargs):
+    movie_deleted(sender, instance)
+    # Deleting the movie's row would have deleted them along with it.
+    LeaderboardEntry.objects.filter(movie=instance).delete()
+    SimilarMovie.objects.filter(movie=instance).delete()
+
+
+# Lookups of the movies whose documents show the name of a genre, celebrity
+# or rating.
+CREDITED_MOVIES = {
+    Genre: "genres",
+    Celebrity: "credits__celebrity",
+    Rating: "rating",
+}
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Celebrity)
+@receiver(post_save, sender=Rating)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Celebrity)
+@receiver(pre_delete, sender=Rating)
+def credit_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    movies = Movie.objects.filter(**{CREDITED_MOVIES[sender]: instance})
+    movie_ids = set(movies.values_list("id", flat=True))
+    if movie_ids:
+        invalidate_movies(movie_ids)
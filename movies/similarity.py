@@ -0,0 +1,216 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Credit, Movie, SimilarMovie, StaleSimilarMovie
+
+# Through tables whose rows become the features of a movie, besides its
+# director and cast credits.
+CREDITS = {
+    "genre": (Movie.genres.through, "genre_id"),
+}
+THROUGH_COLUMNS = {through: column for through, column in CREDITS.values()}
+
+
+class FeatureIndex:
+    """
+    Sparse movies x features matrix (genres, directors and cast), stored as
+    posting lists. Features are weighted by their inverse document frequency
+    and movies are compared with the cosine similarity of their vectors.
+    """
+
+    def __init__(self, movie_ids, credits):
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.rows = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+
+        postings = {}
+        self.features = [[] for _ in movie_ids]
+        for feature, movie_id in credits:
+            row = self.rows.get(movie_id)
+            if row is not None:
+                postings.setdefault(feature, []).append(row)
+                self.features[row].append(feature)
+
+        total = max(len(movie_ids), 1)
+        self.postings = {
+            feature: np.asarray(rows, dtype=np.int64)
+            for feature, rows in postings.items()
+        }
+        # Squared inverse document frequency of every feature.
+        self.weights = {
+            feature: math.log(total / len(rows)) ** 2 + 1e-9
+            for feature, rows in self.postings.items()
+        }
+        self.norms = np.zeros(len(movie_ids))
+        for row, features in enumerate(self.features):
+            self.norms[row] = math.sqrt(sum(self.weights[f] for f in features))
+
+    def similarities(self, row):
+        """
+        Cosine similarity of one movie with every movie of the index
+        """
+        features = self.features[row]
+        if not features:
+            return np.zeros(len(self.movie_ids))
+        rows = np.concatenate([self.postings[f] for f in features])
+        weights = np.concatenate(
+            [np.full(len(self.postings[f]), self.weights[f]) for f in features]
+        )
+        dots = np.bincount(rows, weights=weights, minlength=len(self.movie_ids))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = dots / (self.norms[row] * self.norms)
+        scores = np.nan_to_num(scores)
+        scores[row] = 0
+        return scores
+
+    def neighbours(self, row, k, scores=None):
+        if scores is None:
+            scores = self.similarities(row)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((self.movie_ids[top], -scores[top]))]
+        return [
+            (int(self.movie_ids[i]), float(scores[i])) for i in top if scores[i] > 0
+        ]
+
+
+def load_index():
+    movie_ids = list(Movie.objects.order_by("id").values_list("id", flat=True))
+    credits = []
+    for kind, (through, column) in CREDITS.items():
+        credits += [
+            ((kind, feature), movie_id)
+            for movie_id, feature in through.objects.values_list("movie_id", column)
+        ]
+    # The role of a credit is its kind of feature.
+    credits += [
+        ((role, celebrity_id), movie_id)
+        for movie_id, role, celebrity_id in Credit.objects.values_list(
+            "movie_id", "role", "celebrity_id"
+        )
+    ]
+    return FeatureIndex(movie_ids, credits)
+
+
+def write_neighbours(neighbours):
+    """
+    Replaces the stored neighbours of the movies in the {movie_id: [(id,
+    score)]} mapping
+    """
+    with transaction.atomic():
+        SimilarMovie.objects.filter(movie_id__in=list(neighbours)).delete()
+        SimilarMovie.objects.bulk_create(
+            (
+                SimilarMovie(
+                    movie_id=movie_id, rank=rank, similar_id=similar_id, score=score
+                )
+                for movie_id, similar in neighbours.items()
+                for rank, (similar_id, score) in enumerate(similar, start=1)
+            ),
+            batch_size=1000,
+        )
+
+
+def rebuild(batch_size=500):
+    """
+    Recomputes the neighbours of every movie
+    """
+    stale = list(StaleSimilarMovie.objects.values_list("movie_id", flat=True))
+    index = load_index()
+    k = settings.SIMILAR_MOVIES["TOP_K"]
+    batch = {}
+    for row, movie_id in enumerate(index.movie_ids.tolist()):
+        batch[movie_id] = index.neighbours(row, k)
+        if len(batch) >= batch_size:
+            write_neighbours(batch)
+            batch = {}
+    write_neighbours(batch)
+    StaleSimilarMovie.objects.filter(movie_id__in=stale).delete()
+    return len(index.movie_ids)
+
+
+def mark_stale(movie_ids):
+    """
+    Queues the movies whose credits changed, or whose neighbours were
+    deleted, for the next `build_similar_movies --stale`
+    """
+    StaleSimilarMovie.objects.bulk_create(
+        [StaleSimilarMovie(movie_id=movie_id) for movie_id in movie_ids],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_stale():
+    """
+    Recomputes the neighbours of the movies marked stale, with one load of
+    the index for all of them. Returns the number of stale movies.
+    """
+    with transaction.atomic():
+        movie_ids = list(StaleSimilarMovie.objects.values_list("movie_id", flat=True))
+        StaleSimilarMovie.objects.filter(movie_id__in=movie_ids).delete()
+    if not movie_ids:
+        return 0
+    try:
+        refresh_movies(movie_ids)
+    except Exception:
+        mark_stale(Movie.objects.filter(pk__in=movie_ids).values_list("id", flat=True))
+        raise
+    return len(movie_ids)
+
+
+def refresh_movies(movie_ids):
+    """
+    Recomputes the neighbours of movies whose credits changed, and of the
+    movies whose neighbours they are or now deserve to be. Loads the whole
+    index, so it runs offline through refresh_stale() rather than on writes.
+    """
+    index = load_index()
+    k = settings.SIMILAR_MOVIES["TOP_K"]
+    movie_ids = [movie_id for movie_id in movie_ids if movie_id in index.rows]
+    if not movie_ids:
+        return
+
+    # Movies listing a changed movie, and the score of the k-th neighbour of
+    # the movies that have k of them.
+    affected = set(movie_ids)
+    minimums = np.zeros(len(index.movie_ids))
+    full = np.zeros(len(index.movie_ids), dtype=bool)
+    stored = SimilarMovie.objects.filter(Q(similar_id__in=movie_ids) | Q(rank=k))
+    for movie_id, rank, similar_id, score in stored.values_list(
+        "movie_id", "rank", "similar_id", "score"
+    ):
+        if similar_id in movie_ids:
+            affected.add(movie_id)
+        row = index.rows.get(movie_id)
+        if rank == k and row is not None:
+            minimums[row], full[row] = score, True
+
+    # A full movie only takes a changed movie that beats its k-th neighbour.
+    # One with fewer neighbours already lists every movie similar to it, so
+    # it only changes when a changed movie it does not list becomes similar.
+    for movie_id in movie_ids:
+        scores = index.similarities(index.rows[movie_id])
+        candidates = np.where(full, scores > minimums, scores > 0)
+        affected.update(index.movie_ids[candidates].tolist())
+
+    refresh_rows(affected, index)
+
+
+def refresh_rows(movie_ids, index=None):
+    """
+    Recomputes the neighbours of the given movies
+    """
+    index = index or load_index()
+    k = settings.SIMILAR_MOVIES["TOP_K"]
+    write_neighbours(
+        {
+            movie_id: index.neighbours(index.rows[movie_id], k)
+            for movie_id in movie_ids
+            if movie_id in index.rows
+        }
+    )
@@ -1,9 +1,43 @@
-from django.test import TestCase
+import os
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from movies.models import Movie, Genre, Celebrity, Rating
+from changes.models import Change
+from freshTomatoes.testing import NO_RATE_LIMITS
+from freshTomatoes.text import fold
+from movies import caching, deletion, documents, leaderboards, similarity
+from movies.models import (
+    Credit,
+    Movie,
+    MovieDocument,
+    Genre,
+    Celebrity,
+    Rating,
+    RatingHistogram,
+    LeaderboardEntry,
+    LeaderboardPrior,
+    StaleSimilarMovie,
+)
+from movies.ratings import (
+    RatingBuffer,
+    current_rating,
+    get_buffer,
+    histogram_stats,
+    update_rating,
+)
+from movies.signals import on_commit_batch
+from reviews.models import Review
 from users.models import TomatoeUser
 
 
@@ -66,6 +100,7 @@ class TestMovieDetailView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestMovieUserCreateView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -116,6 +151,7 @@ class TestMovieUserCreateView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestMovieCreateView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -176,7 +212,27 @@ class TestMovieCreateView(TestCase):
         response = self.client.post(self.movie_list_url, movie_data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_failed_credits_roll_back_the_movie(self):
+        movie_data = {
+            "title": "Test Movie",
+            "year": 2020,
+            "rating": self.rating.id,
+            "runtime": 120,
+            "genres": [self.genre.id],
+            "directors": [self.celebrity.id],
+        }
+        client = APIClient(raise_request_exception=False)
+        client.cookies = self.client.cookies
+        with mock.patch(
+            "movies.serializers.set_credits", side_effect=RuntimeError("boom")
+        ):
+            response = client.post(self.movie_list_url, movie_data, format="json")
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Movie.objects.filter(title="Test Movie").exists())
+        self.assertFalse(Change.objects.filter(model="movie").exists())
+
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestMovieFiltering(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -307,6 +363,7 @@ class TestMovieFiltering(TestCase):
         self.assertEqual(data[2]["votes"], self.movie.votes)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestMovieUpdateView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -433,3 +490,813 @@ class TestMovieUpdateView(TestCase):
             self.movie_detail_url, self.movie_data, format="json"
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestRatingWriteBehind(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rating = Rating.objects.create(name="PG-13")
+        self.movie = Movie.objects.create(
+            title="Test Movie",
+            year=2020,
+            rating=self.rating,
+            runtime=120,
+            userRating=7.5,
+            votes=2,
+        )
+        self.buffer = RatingBuffer(flush_interval_ms=0, flush_max_reviews=3)
+
+    def test_buffer_flushes_after_max_reviews(self):
+        self.buffer.add(self.movie.id, Decimal("9"))
+        self.buffer.add(self.movie.id, Decimal("10"))
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 2)
+        self.assertEqual(self.buffer.delta(self.movie.id), (Decimal("19"), 2))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.buffer.add(self.movie.id, Decimal("8"))
+        # Until the flush commits, its deltas are still counted.
+        self.assertEqual(self.buffer.delta(self.movie.id), (Decimal("27"), 3))
+        for callback in callbacks:
+            callback()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 5)
+        self.assertEqual(self.movie.userRating, Decimal("8.40"))
+        self.assertEqual(self.buffer.delta(self.movie.id), (Decimal("0"), 0))
+
+    def test_flush_refused_inside_transaction(self):
+        self.buffer.add(self.movie.id, Decimal("9"))
+        with transaction.atomic():
+            self.assertRaises(RuntimeError, self.buffer.flush)
+        self.assertEqual(self.buffer.delta(self.movie.id), (Decimal("9"), 1))
+
+    @override_settings(
+        RATING_WRITE_BEHIND={
+            "ENABLED": True,
+            "FLUSH_INTERVAL_MS": 0,
+            "FLUSH_MAX_REVIEWS": 100,
+        }
+    )
+    def test_reads_merge_pending_votes(self):
+        user = TomatoeUser.objects.create_user(
+            username="testuser@test.com", password="Testpassword1"
+        )
+        self.client.post(
+            reverse("login"),
+            {"username": "testuser@test.com", "password": "Testpassword1"},
+            format="json",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("review_list"),
+                {"movie": self.movie.id, "userRating": 10},
+                format="json",
+            )
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 2)
+
+        response = self.client.get(
+            reverse("movie_detail", kwargs={"pk": self.movie.id})
+        )
+        self.assertEqual(response.data["votes"], 3)
+        self.assertEqual(response.data["userRating"], Decimal("8.33"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            get_buffer().flush()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 3)
+        self.assertEqual(current_rating(self.movie), (Decimal("8.33"), 3))
+        self.assertEqual(user.review_set.count(), 1)
+
+    @override_settings(
+        RATING_WRITE_BEHIND={
+            "ENABLED": True,
+            "FLUSH_INTERVAL_MS": 0,
+            "FLUSH_MAX_REVIEWS": 100,
+        }
+    )
+    def test_reads_merge_pending_overwrite(self):
+        # A review of 9 among the 2 votes is overwritten with 1.
+        with self.captureOnCommitCallbacks(execute=True):
+            update_rating(self.movie, 1, previous=9)
+        self.assertEqual(get_buffer().delta(self.movie.id), (Decimal("-8"), 0))
+        self.assertEqual(current_rating(self.movie), (Decimal("3.50"), 2))
+
+        response = self.client.get(
+            reverse("movie_detail", kwargs={"pk": self.movie.id})
+        )
+        self.assertEqual(response.data["userRating"], Decimal("3.50"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            get_buffer().flush()
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.userRating, self.movie.votes), (Decimal("3.50"), 2))
+
+
+class TestOnCommitBatch(TestCase):
+    def test_calls_merge_until_commit(self):
+        calls = []
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_batch(calls.append, [1])
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                on_commit_batch(calls.append, [2])
+                raise RuntimeError
+            on_commit_batch(calls.append, [3])
+        # The ids of the rolled back savepoint are flushed along with the rest.
+        self.assertEqual(calls, [{1, 2, 3}])
+
+
+class TestHistogramStats(TestCase):
+    def test_stats_from_buckets(self):
+        histogram = RatingHistogram(bucket_2=1, bucket_6=2, bucket_10=1)
+        stats = histogram_stats(histogram)
+        self.assertEqual(stats["count"], 4)
+        self.assertEqual(stats["mean"], 6)
+        self.assertEqual(stats["median"], 6)
+        self.assertEqual(stats["stddev"], 2.83)
+
+    def test_stats_of_missing_histogram(self):
+        stats = histogram_stats(None)
+        self.assertEqual(stats["count"], 0)
+        self.assertIsNone(stats["mean"])
+
+
+class TestLeaderboards(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.genre = Genre.objects.create(name="Drama")
+        self.rating = Rating.objects.create(name="PG-13")
+        self.newcomer = Movie.objects.create(
+            title="Newcomer", year=2021, rating=self.rating, userRating=10, votes=1
+        )
+        self.classic = Movie.objects.create(
+            title="Classic", year=1994, rating=self.rating, userRating=9, votes=100000
+        )
+        self.average = Movie.objects.create(
+            title="Average", year=1998, rating=self.rating, userRating=6, votes=5000
+        )
+        self.classic.genres.add(self.genre)
+        self.newcomer.genres.add(self.genre)
+        leaderboards.rebuild()
+
+    def get_titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie["title"] for movie in response.data["results"]]
+
+    def test_overall_leaderboard(self):
+        response = self.client.get(reverse("leaderboard"))
+        data = response.data["results"]
+        self.assertEqual(
+            [movie["title"] for movie in data], ["Classic", "Newcomer", "Average"]
+        )
+        self.assertEqual([movie["rank"] for movie in data], [1, 2, 3])
+
+    def test_genre_and_decade_leaderboards(self):
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard_genre", kwargs={"genre": "drama"})),
+            ["Classic", "Newcomer"],
+        )
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard_decade", kwargs={"decade": 1990})),
+            ["Classic", "Average"],
+        )
+        response = self.client.get(
+            reverse("leaderboard_genre", kwargs={"genre": "Western"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leaderboards_follow_rating_changes(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.average.userRating = 9.5
+            self.average.votes = 200000
+            self.average.save()
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard")), ["Average", "Classic", "Newcomer"]
+        )
+
+        entry = LeaderboardEntry.objects.get(board="overall", movie=self.newcomer)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            for _ in range(3):
+                update_rating(self.newcomer, 0)
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard")), ["Average", "Classic", "Newcomer"]
+        )
+        self.assertLess(
+            LeaderboardEntry.objects.get(board="overall", movie=self.newcomer).score,
+            entry.score,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.average.year = 2005
+            self.average.save()
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard_decade", kwargs={"decade": 1990})),
+            ["Classic"],
+        )
+
+    def test_refresh_only_writes_changed_entries(self):
+        entries = dict(
+            LeaderboardEntry.objects.filter(board="overall").values_list(
+                "movie_id", "pk"
+            )
+        )
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.newcomer.userRating = 9.9
+            self.newcomer.save()
+            self.average.userRating = 9.5
+            self.average.votes = 200000
+            self.average.save()
+        self.assertEqual(
+            self.get_titles(reverse("leaderboard")), ["Average", "Classic", "Newcomer"]
+        )
+        # Entries are moved in place rather than deleted and reinserted.
+        self.assertEqual(
+            dict(
+                LeaderboardEntry.objects.filter(board="overall").values_list(
+                    "movie_id", "pk"
+                )
+            ),
+            entries,
+        )
+
+    @override_settings(LEADERBOARDS={"MIN_VOTES": 1000, "SIZE": 1, "DEPTH": 2})
+    def test_movies_falling_below_the_board_are_reranked(self):
+        leaderboards.rebuild()
+        Movie.objects.filter(pk=self.classic.pk).update(userRating=1)
+        Movie.objects.filter(pk=self.newcomer.pk).update(userRating=0, votes=1000)
+        leaderboards.refresh_movies([self.classic.pk, self.newcomer.pk])
+        self.assertEqual(
+            list(
+                LeaderboardEntry.objects.filter(board="overall")
+                .order_by("rank")
+                .values_list("movie_id", flat=True)
+            ),
+            [self.average.pk, self.newcomer.pk],
+        )
+
+    def test_prior_mean_is_stored_with_the_boards(self):
+        mean = leaderboards.prior_mean()
+        self.assertEqual(LeaderboardPrior.objects.get().mean, mean)
+        Movie.objects.filter(pk=self.average.pk).update(userRating=1)
+        self.assertEqual(leaderboards.prior_mean(), mean)
+        leaderboards.rebuild()
+        self.assertLess(leaderboards.prior_mean(), mean)
+
+
+class TestSimilarMovies(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.drama = Genre.objects.create(name="Drama")
+        self.director = Celebrity.objects.create(name="Test Director")
+        self.actor = Celebrity.objects.create(name="Test Actor")
+        self.other_actor = Celebrity.objects.create(name="Other Actor")
+        self.movies = [
+            Movie.objects.create(title=f"Test Movie {i}", year=2020) for i in range(4)
+        ]
+        first, second, third, _ = self.movies
+        first.genres.add(self.drama)
+        first.directors.add(self.director)
+        first.cast.add(self.actor)
+        second.directors.add(self.director)
+        second.cast.add(self.actor)
+        third.genres.add(self.drama)
+        third.cast.add(self.other_actor)
+        similarity.rebuild()
+
+    def get_similar(self, movie):
+        response = self.client.get(reverse("movie_similar", kwargs={"pk": movie.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie["title"] for movie in response.data]
+
+    def test_similar_movies(self):
+        first, second, third, fourth = self.movies
+        self.assertEqual(self.get_similar(first), [second.title, third.title])
+        self.assertEqual(self.get_similar(fourth), [])
+        response = self.client.get(reverse("movie_similar", kwargs={"pk": 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_movies_follow_credit_changes(self):
+        first, second, third, fourth = self.movies
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            fourth.directors.add(self.director)
+            fourth.cast.add(self.actor, self.other_actor)
+        # Writes only mark the movie, the neighbours are recomputed offline.
+        self.assertEqual(self.get_similar(fourth), [])
+        call_command("build_similar_movies", "--stale", stdout=StringIO())
+        self.assertIn(second.title, self.get_similar(fourth))
+        self.assertIn(fourth.title, self.get_similar(first))
+        self.assertIn(fourth.title, self.get_similar(third))
+        self.assertFalse(StaleSimilarMovie.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            second.delete()
+        call_command("build_similar_movies", "--stale", stdout=StringIO())
+        self.assertNotIn(second.title, self.get_similar(first))
+
+    def test_full_neighbours_ignore_weaker_movies(self):
+        first, second, third, fourth = self.movies
+        with override_settings(SIMILAR_MOVIES={"TOP_K": 1}):
+            similarity.rebuild()
+            with mock.patch.object(
+                similarity, "refresh_rows", wraps=similarity.refresh_rows
+            ) as refresh_rows:
+                fourth.genres.add(self.drama)
+                similarity.refresh_stale()
+        # first keeps second, which beats fourth, so it is not recomputed.
+        self.assertNotIn(first.id, refresh_rows.call_args.args[0])
+        self.assertIn(fourth.id, refresh_rows.call_args.args[0])
+
+
+class TestSparseFieldsets(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.genre = Genre.objects.create(name="Action")
+        self.celebrity = Celebrity.objects.create(name="Test Celebrity")
+        self.rating = Rating.objects.create(name="PG-13")
+        for i in range(3):
+            movie = Movie.objects.create(
+                title=f"Test Movie {i}", year=2020, rating=self.rating, runtime=120
+            )
+            movie.genres.add(self.genre)
+            movie.directors.add(self.celebrity)
+            movie.cast.add(self.celebrity)
+        self.movie = movie
+
+    def test_list_fields(self):
+        response = self.client.get(reverse("movie_list"), {"fields": "id,title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data["results"][0]), ["id", "title"])
+
+    def test_list_expand(self):
+        # Count, page joined with its rating, and one query per m2m relation.
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse("movie_list"),
+                {"fields": "title", "expand": "rating,cast,genres"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        movie = response.data["results"][0]
+        self.assertEqual(list(movie), ["title", "rating", "genres", "cast"])
+        self.assertEqual(
+            movie["cast"], [{"id": self.celebrity.id, "name": "Test Celebrity"}]
+        )
+        self.assertEqual(movie["rating"], {"id": self.rating.id, "rating": "PG-13"})
+
+    def test_detail_fields(self):
+        url = reverse("movie_detail", kwargs={"pk": self.movie.id})
+        response = self.client.get(url)
+        self.assertIn("directors", response.data)
+        response = self.client.get(url, {"fields": "title,votes", "expand": ""})
+        self.assertEqual(response.data, {"title": "Test Movie 2", "votes": 0})
+
+    def test_unknown_fields(self):
+        response = self.client.get(reverse("movie_list"), {"fields": "title,budget"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("movie_list"), {"expand": "reviews"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestMovieMultiGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["movies"].clear()
+        self.client = APIClient()
+        self.genre = Genre.objects.create(name="Action")
+        self.celebrity = Celebrity.objects.create(name="Test Celebrity")
+        self.movies = []
+        for i in range(3):
+            movie = Movie.objects.create(title=f"Test Movie {i}", year=2020)
+            movie.genres.add(self.genre)
+            movie.cast.add(self.celebrity)
+            self.movies.append(movie)
+
+    def get_movies(self, *movie_ids, **params):
+        ids = ",".join(str(movie_id) for movie_id in movie_ids)
+        response = self.client.get(reverse("movie_list"), dict(params, ids=ids))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_keeps_order_of_ids(self):
+        first, second, third = self.movies
+        data = self.get_movies(third.id, 9999, first.id, third.id)
+        self.assertEqual([movie["title"] for movie in data], [third.title, first.title])
+        self.assertEqual(
+            data[0]["cast"], [{"id": self.celebrity.id, "name": "Test Celebrity"}]
+        )
+
+    def test_reads_through_cache(self):
+        first, second, third = self.movies
+        with self.assertNumQueries(6):
+            self.get_movies(first.id, second.id)
+        # The documents were stored, a cold cache reads them back at once.
+        caches["movies"].clear()
+        with self.assertNumQueries(1):
+            self.get_movies(first.id, second.id)
+        with self.assertNumQueries(0):
+            data = self.get_movies(first.id, second.id, fields="title", expand="")
+        self.assertEqual(data, [{"title": first.title}, {"title": second.title}])
+
+    def test_invalidated_by_changes(self):
+        first, second, third = self.movies
+        self.get_movies(first.id, second.id)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            first.title = "Renamed Movie"
+            first.save()
+            update_rating(second, Decimal(8))
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.genre.name = "Adventure"
+            self.genre.save()
+        data = self.get_movies(first.id, second.id)
+        self.assertEqual(data[0]["title"], "Renamed Movie")
+        self.assertEqual(data[1]["votes"], 1)
+        self.assertEqual(data[1]["genres"][0]["genre"], "Adventure")
+
+    def test_compression_key_follows_documents(self):
+        first, second, third = self.movies
+        url = reverse("movie_list")
+        key = self.client.get(url, {"ids": f"{first.id}"}).compression_key
+        self.assertIsNotNone(key)
+        self.assertEqual(
+            self.client.get(url, {"ids": f"{first.id}"}).compression_key, key
+        )
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            update_rating(first, Decimal(8))
+        self.assertNotEqual(
+            self.client.get(url, {"ids": f"{first.id}"}).compression_key, key
+        )
+
+    def test_invalid_ids(self):
+        response = self.client.get(reverse("movie_list"), {"ids": "1,two"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        ids = ",".join(str(i) for i in range(1, 102))
+        response = self.client.get(reverse("movie_list"), {"ids": ids})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestMovieDocuments(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["movies"].clear()
+        self.client = APIClient()
+        self.celebrity = Celebrity.objects.create(name="Test Celebrity")
+        self.movie = Movie.objects.create(title="Test Movie", year=2020)
+        self.movie.directors.add(self.celebrity)
+        self.url = reverse("movie_detail", kwargs={"pk": self.movie.id})
+
+    def test_detail_reads_stored_document(self):
+        self.assertEqual(documents.rebuild_documents(), 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["directors"][0]["name"], "Test Celebrity")
+        response = self.client.get(reverse("movie_detail", kwargs={"pk": 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_documents_regenerated_on_commit(self):
+        documents.rebuild_documents()
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.celebrity.name = "Renamed Celebrity"
+            self.celebrity.save()
+            self.assertFalse(MovieDocument.objects.exists())
+        document = MovieDocument.objects.get(pk=self.movie.id)
+        self.assertEqual(document.data["directors"][0]["name"], "Renamed Celebrity")
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            update_rating(self.movie, Decimal(6))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["userRating"], Decimal(6))
+        self.assertEqual(response.data["votes"], 1)
+
+    def test_stale_reader_cannot_cache_an_invalidated_document(self):
+        documents.get_movie_documents([self.movie.id])
+        # Loaded by a reader before the write below commits.
+        stale = caching.get_movies([self.movie.id])
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.movie.title = "Renamed Movie"
+            self.movie.save()
+        caching.set_movies(stale)
+        self.assertEqual(caching.get_movies([self.movie.id]), {})
+        document = documents.get_movie_documents([self.movie.id])[0]
+        self.assertEqual(document["title"], "Renamed Movie")
+        self.assertIn(self.movie.id, caching.get_movies([self.movie.id]))
+
+
+class TestCelebrities(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.director = Celebrity.objects.create(name="Test Director")
+        self.actor = Celebrity.objects.create(name="Test Actor")
+        self.namesake = Celebrity.objects.create(name="Test Actor")
+        self.old = Movie.objects.create(title="Old Movie", year=1990)
+        self.new = Movie.objects.create(title="New Movie", year=2020)
+        self.old.directors.add(self.director)
+        self.new.directors.add(self.director)
+        self.old.cast.add(self.actor, self.director)
+        self.director.movie_cast.add(self.new)
+
+    def get_counts(self, celebrity):
+        celebrity.refresh_from_db()
+        return celebrity.directedCount, celebrity.actedCount
+
+    def test_credit_counts(self):
+        self.assertEqual(self.get_counts(self.director), (2, 2))
+        self.assertEqual(self.get_counts(self.actor), (0, 1))
+        self.old.cast.clear()
+        self.assertEqual(self.get_counts(self.director), (2, 1))
+        self.assertEqual(self.get_counts(self.actor), (0, 0))
+        self.director.movie_directors.remove(self.old)
+        self.assertEqual(self.get_counts(self.director), (1, 1))
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.new.delete()
+        self.assertEqual(self.get_counts(self.director), (0, 0))
+
+    def test_celebrity_list(self):
+        response = self.client.get(
+            reverse("celebrity_list"), {"ordering": "-actedCount"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["id"], self.director.id)
+        response = self.client.get(reverse("celebrity_list"), {"search": "actor"})
+        self.assertEqual(
+            [celebrity["id"] for celebrity in response.data["results"]],
+            [self.actor.id, self.namesake.id],
+        )
+
+    def test_celebrity_detail(self):
+        url = reverse("celebrity_detail", kwargs={"pk": self.director.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["directedCount"], 2)
+        self.assertEqual(
+            [movie["title"] for movie in response.data["directed"]],
+            ["New Movie", "Old Movie"],
+        )
+        url = reverse("celebrity_detail", kwargs={"pk": self.namesake.id})
+        self.assertEqual(self.client.get(url).data["acted"], [])
+        url = reverse("celebrity_detail", kwargs={"pk": 9999})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestFoldedSearch(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["movies"].clear()
+        self.client = APIClient()
+        self.url = reverse("movie_list")
+        self.celebrity = Celebrity.objects.create(name="Penélope Cruz")
+        self.movie = Movie.objects.create(title="Amélie", year=2001)
+        self.movie.cast.add(self.celebrity)
+        Movie.objects.create(title="Famélique", year=2001)
+
+    def titles(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(movie["title"] for movie in response.data["results"])
+
+    def test_fold(self):
+        self.assertEqual(fold("Amélie ÉCOLE Straße"), "amelie ecole strasse")
+        self.assertEqual(self.movie.foldedTitle, "amelie")
+        self.movie.title = "Le Fabuleux Destin d'Amélie Poulain"
+        self.movie.save(update_fields=["title"])
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.foldedTitle, "le fabuleux destin d'amelie poulain")
+
+    def test_match_modes(self):
+        self.assertEqual(self.titles({"title": "AMÉL"}), ["Amélie", "Famélique"])
+        self.assertEqual(self.titles({"title": "amé", "match": "prefix"}), ["Amélie"])
+        self.assertEqual(self.titles({"title": "amélie", "match": "exact"}), ["Amélie"])
+        self.assertEqual(self.titles({"title": "ame", "match": "exact"}), [])
+        self.assertEqual(
+            self.titles({"cast": "penelope", "match": "prefix"}), ["Amélie"]
+        )
+        self.assertEqual(self.titles({"search": "CRUZ"}), ["Amélie"])
+        response = self.client.get(self.url, {"title": "ame", "match": "fuzzy"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prefix_uses_index(self):
+        plan = Movie.objects.filter(foldedTitle__gte="ame", foldedTitle__lt="amf")
+        self.assertIn("foldedTitle", plan.explain())
+        self.assertIn("INDEX", plan.explain())
+
+    def test_fold_search_columns(self):
+        Movie.objects.bulk_create([Movie(title="Ça", year=2017)])
+        self.assertEqual(self.titles({"title": "ca", "match": "exact"}), [])
+        call_command("fold_search_columns", stdout=open(os.devnull, "w"))
+        self.assertEqual(self.titles({"title": "ca", "match": "exact"}), ["Ça"])
+
+
+class TestCredits(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["movies"].clear()
+        self.celebrities = [
+            Celebrity.objects.create(name=f"Test Celebrity {i}") for i in range(4)
+        ]
+        self.movie = Movie.objects.create(title="Test Movie", year=2020)
+
+    def cast_names(self, movie):
+        data = documents.build_documents([movie.id])[movie.id]
+        return [celebrity["name"] for celebrity in data["cast"]]
+
+    def test_billing_order(self):
+        first, second, third, fourth = self.celebrities
+        self.movie.cast.set([third, first, second])
+        self.assertEqual(
+            self.cast_names(self.movie),
+            ["Test Celebrity 2", "Test Celebrity 0", "Test Celebrity 1"],
+        )
+        self.movie.cast.add(fourth, first)
+        self.movie.cast.remove(third)
+        self.assertEqual(
+            [celebrity.name for celebrity in self.movie.cast.all()],
+            ["Test Celebrity 0", "Test Celebrity 1", "Test Celebrity 3"],
+        )
+        self.assertEqual(list(self.movie.directors.all()), [])
+
+    def test_credits_are_read_in_one_query_per_role(self):
+        self.movie.directors.add(self.celebrities[0])
+        self.movie.cast.add(*self.celebrities)
+        # The movie with its rating, its genres and its credits of each role.
+        with self.assertNumQueries(4):
+            data = documents.build_documents([self.movie.id])[self.movie.id]
+        self.assertEqual(len(data["directors"]), 1)
+        self.assertEqual(len(data["cast"]), 4)
+
+        celebrity = self.celebrities[0]
+        url = reverse("celebrity_detail", kwargs={"pk": celebrity.id})
+        # The celebrity, and its credits with their movies.
+        with self.assertNumQueries(2):
+            response = APIClient().get(url)
+        self.assertEqual(response.data["directed"][0]["title"], "Test Movie")
+        self.assertEqual(response.data["acted"][0]["title"], "Test Movie")
+
+    def test_prefetched_credits_keep_the_billing_order(self):
+        first, second, third, fourth = self.celebrities
+        self.movie.cast.set([second, first])
+        self.movie.directors.set([third])
+        movie = Movie.objects.prefetch_related(
+            documents.credits_prefetch("directors"), documents.credits_prefetch("cast")
+        ).get(pk=self.movie.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(documents.get_credited(movie, "cast"), [second, first])
+            self.assertEqual(documents.get_credited(movie, "directors"), [third])
+        self.assertEqual(list(third.movies.all()), [self.movie])
+        self.assertEqual(list(fourth.movies.all()), [])
+
+    def test_search_ranks_cast_before_directors(self):
+        celebrity = self.celebrities[0]
+        directed = Movie.objects.create(title="Directed", year=2020)
+        directed.directors.add(celebrity)
+        self.movie.cast.add(celebrity)
+        response = APIClient().get(
+            reverse("movie_list"), {"search": "test celebrity 0"}
+        )
+        self.assertEqual(
+            [movie["title"] for movie in response.data["results"]],
+            ["Test Movie", "Directed"],
+        )
+
+
+class TestCreditsMigration(TransactionTestCase):
+    before = [("movies", "0008_folded_search_columns")]
+    after = [("movies", "0009_credit")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_credits_are_copied_in_billing_order(self):
+        apps = self.migrate(self.before)
+        Movie = apps.get_model("movies", "Movie")
+        Celebrity = apps.get_model("movies", "Celebrity")
+        movie = Movie.objects.create(title="Test Movie", year=2020)
+        first, second = [
+            Celebrity.objects.create(name=f"Test Celebrity {i}") for i in range(2)
+        ]
+        movie.cast.add(second, first)
+        movie.directors.add(second)
+
+        apps = self.migrate(self.after)
+        Credit = apps.get_model("movies", "Credit")
+        credits = Credit.objects.order_by("role", "order")
+        self.assertEqual(
+            list(credits.values_list("role", "celebrity_id", "order")),
+            [("cast", first.pk, 0), ("cast", second.pk, 1), ("director", second.pk, 0)],
+        )
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestSoftDelete(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["movies"].clear()
+        self.celebrity = Celebrity.objects.create(name="Test Celebrity")
+        self.movie = Movie.objects.create(title="Test Movie", year=2020)
+        self.other = Movie.objects.create(title="Other Movie", year=2020)
+        self.users = [
+            TomatoeUser.objects.create_user(
+                username=f"user{i}@test.com", password="Testpassword1"
+            )
+            for i in range(2)
+        ]
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.movie.cast.add(self.celebrity)
+            self.other.cast.add(self.celebrity)
+            for user, rating in zip(self.users, [4, 8]):
+                for movie in (self.movie, self.other):
+                    Review.objects.create(user=user, movie=movie, userRating=rating)
+                    update_rating(movie, rating)
+
+    def test_deleted_movie_is_hidden(self):
+        client = APIClient()
+        client.get(reverse("review_list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_movie(self.movie)
+
+        response = client.get(reverse("movie_list"))
+        self.assertEqual(response.data["count"], 1)
+        response = client.get(reverse("movie_detail", kwargs={"pk": self.movie.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = client.get(reverse("review_list"))
+        self.assertEqual(response.data["count"], 2)
+
+        url = reverse("celebrity_detail", kwargs={"pk": self.celebrity.id})
+        response = client.get(url)
+        self.assertEqual(response.data["actedCount"], 1)
+        self.assertEqual(
+            [movie["title"] for movie in response.data["acted"]], ["Other Movie"]
+        )
+
+    def test_purge_movie(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_movie(self.movie)
+        # Not purged before PURGE_AFTER.
+        self.assertEqual(deletion.purge_deleted(), (0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(deletion.purge_deleted(0, batch_size=1), (1, 0))
+        self.assertFalse(Movie.all_objects.filter(pk=self.movie.id).exists())
+        self.assertEqual(Review.all_objects.count(), 2)
+        self.assertEqual(Credit.objects.count(), 1)
+        self.assertFalse(RatingHistogram.objects.filter(movie=self.movie).exists())
+
+    def test_deleting_a_user_does_not_query_per_review(self):
+        other = TomatoeUser.objects.create_user(
+            username="user2@test.com", password="Testpassword1"
+        )
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            for i in range(5):
+                movie = Movie.objects.create(title=f"Movie {i}", year=2020)
+                for user in (self.users[1], other):
+                    Review.objects.create(user=user, movie=movie, userRating=6)
+                    update_rating(movie, 6)
+        with CaptureQueriesContext(connection) as few:
+            deletion.delete_user(self.users[0])
+        with CaptureQueriesContext(connection) as many:
+            deletion.delete_user(self.users[1])
+        self.assertEqual(len(many), len(few))
+
+    def test_deleted_user_is_hidden_then_purged(self):
+        client = APIClient()
+        client.post(
+            reverse("login"),
+            {"username": "user1@test.com", "password": "Testpassword1"},
+            format="json",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.delete(reverse("me"))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(client.get(reverse("me")).status_code, 401)
+        response = client.get(reverse("review_list"))
+        self.assertEqual(response.data["count"], 2)
+        # Their votes are taken out of the ratings at once.
+        for movie in (self.movie, self.other):
+            movie.refresh_from_db()
+            self.assertEqual((movie.userRating, movie.votes), (Decimal(4), 1))
+            histogram = RatingHistogram.objects.get(movie=movie)
+            self.assertEqual(histogram_stats(histogram)["count"], 1)
+        # The username can be registered again.
+        TomatoeUser.objects.create_user(
+            username="user1@test.com", password="Testpassword1"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "purge_deleted",
+                "--purge-after=0",
+                "--batch-size=1",
+                stdout=open(os.devnull, "w"),
+            )
+        self.assertFalse(TomatoeUser.all_objects.filter(pk=self.users[1].id).exists())
+        self.assertEqual(Review.all_objects.count(), 2)
+        for movie in (self.movie, self.other):
+            movie.refresh_from_db()
+            self.assertEqual((movie.userRating, movie.votes), (Decimal(4), 1))
+            histogram = RatingHistogram.objects.get(movie=movie)
+            self.assertEqual(histogram_stats(histogram)["count"], 1)
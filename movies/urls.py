@@ -3,5 +3,26 @@ from . import views
 
 urlpatterns = [
     path("", views.MovieListView.as_view(), name="movie_list"),
+    path("leaderboard/", views.LeaderboardView.as_view(), name="leaderboard"),
+    path(
+        "leaderboard/genre/<str:genre>/",
+        views.LeaderboardView.as_view(),
+        name="leaderboard_genre",
+    ),
+    path(
+        "leaderboard/decade/<int:decade>/",
+        views.LeaderboardView.as_view(),
+        name="leaderboard_decade",
+    ),
     path("<int:pk>/", views.MovieDetailView.as_view(), name="movie_detail"),
+    path(
+        "<int:pk>/similar/",
+        views.SimilarMoviesView.as_view(),
+        name="movie_similar",
+    ),
+    path(
+        "<int:pk>/histogram/",
+        views.MovieHistogramView.as_view(),
+        name="movie_histogram",
+    ),
 ]
@@ -1,21 +1,43 @@
+from decimal import Decimal
+
 from rest_framework import generics, filters, status
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Case, When
+from django.db.models import Case, OuterRef, Subquery, When
 
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from .models import Movie
-from . import serializers
+from .documents import (
+    INFO_FIELDS,
+    RELATIONS,
+    build_movie_fields,
+    get_movie_documents,
+    select_movie_fields,
+)
+from .models import (
+    Celebrity,
+    Credit,
+    Genre,
+    LeaderboardEntry,
+    Movie,
+    RatingHistogram,
+    SimilarMovie,
+)
+from .ratings import current_rating, histogram_stats, pending_rating
+from . import deletion, leaderboards, serializers
+from freshTomatoes.coalescing import coalesce
+from freshTomatoes.text import get_match, text_filter
+from users.auth import session_user
 
 
 @extend_schema(
     methods=["GET"],
-    description="Retrieve a list of all movies",
+    description="Retrieve a list of all movies, or the movies of ?ids= in that order",
     responses={
         200: OpenApiResponse(description="List of movies retrieved successfully"),
+        400: OpenApiResponse(description="Invalid ids or fields"),
     },
 )
 @extend_schema(
@@ -34,6 +56,8 @@ class MovieListView(generics.ListCreateAPIView):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["year", "userRating", "runtime", "votes"]
     ordering = ["id"]
+    # Models whose writes change the counts of the list and its filters.
+    count_models = [Movie]
 
     def post(self, request):
         user = get_user(self.request)
@@ -47,86 +71,34 @@ class MovieListView(generics.ListCreateAPIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def list(self, request, *args, **kwargs):
+        if "ids" in request.query_params:
+            return self.multi_get(request)
+        # Concurrent identical searches wait for one query.
+        return Response(
+            coalesce(list_key(request), lambda: self.get_list_data(request))
+        )
+
+    def get_list_data(self, request):
+        fields, expand = get_requested_fields(request.query_params)
         queryset = self.filter_queryset(self.get_queryset())
+        queryset = select_movie_fields(queryset, fields, expand)
         page = self.paginate_queryset(queryset)
         if page is not None:
-            data = [get_movie_info(movie) for movie in page]
-            return self.get_paginated_response(data)
-        data = [get_movie_info(movie) for movie in queryset]
-        return Response(data)
-
-    def filter_queryset(self, queryset):
-        query_params = self.request.query_params
-        try:
-            if "search" in query_params:
-                search_term = query_params["search"]
-                queryset_title_ids = list(
-                    queryset.filter(title__icontains=search_term).values_list(
-                        "id", flat=True
-                    )
-                )
-                queryset_cast_ids = list(
-                    queryset.filter(cast__name__icontains=search_term).values_list(
-                        "id", flat=True
-                    )
-                )
-                queryset_directors_ids = list(
-                    queryset.filter(directors__name__icontains=search_term).values_list(
-                        "id", flat=True
-                    )
-                )
-
-                # The queryset is ordered by relevance in 'title', 'cast', and 'directors'.
-                ids_ordered = (
-                    queryset_title_ids
-                    + [id for id in queryset_cast_ids if id not in queryset_title_ids]
-                    + [
-                        id
-                        for id in queryset_directors_ids
-                        if id not in queryset_title_ids and id not in queryset_cast_ids
-                    ]
-                )
-                ordering = Case(
-                    *[When(pk=pk, then=pos) for pos, pk in enumerate(ids_ordered)]
-                )
-                queryset = queryset.filter(id__in=ids_ordered).order_by(ordering)
-
-                # Avoid django from default ordering.
-                self.ordering = None
-            else:
-                # If 'search' is not present, the queryset is ordered by 'id'.
-                self.ordering = ["id"]
-
-            if "title" in query_params:
-                queryset = queryset.filter(title__icontains=query_params["title"])
-
-            if "cast" in query_params:
-                queryset = queryset.filter(cast__name__icontains=query_params["cast"])
+            data = [get_movie_fields(movie, fields, expand) for movie in page]
+            return self.get_paginated_response(data).data
+        return [get_movie_fields(movie, fields, expand) for movie in queryset]
 
-            if "director" in query_params:
-                queryset = queryset.filter(
-                    directors__name__icontains=query_params["director"]
-                )
-
-            if "genres" in query_params:
-                queryset = queryset.filter(
-                    genres__name__icontains=query_params["genres"]
-                )
+    def multi_get(self, request):
+        """
+        Returns the movies of ?ids= in the order they were asked for
+        """
+        movie_ids = get_movie_ids(request.query_params["ids"])
+        fields, expand = get_requested_fields(request.query_params, RELATIONS)
+        data, key = get_stored_movies(movie_ids, fields, expand)
+        return stored_movies_response(request, data, key)
 
-            if "rating" in query_params:
-                queryset = queryset.filter(
-                    rating__name__icontains=query_params["rating"]
-                )
-
-            if "year" in query_params:
-                queryset = queryset.filter(year=query_params["year"])
-            else:
-                if "start" in query_params:
-                    queryset = queryset.filter(year__gte=query_params["start"])
-                if "end" in query_params:
-                    queryset = queryset.filter(year__lte=query_params["end"])
-        except (ValueError, TypeError):
-            raise ValidationError("The query parameters must be of the correct type.")
+    def filter_queryset(self, queryset):
+        queryset, self.ordering = filter_movies(queryset, self.request.query_params)
         return super().filter_queryset(queryset)
 
 
@@ -162,9 +134,15 @@ class MovieDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.MovieSerializer
 
     def get(self, request, *args, **kwargs):
-        instance = self.get_object()
-        data = get_movie_data(instance)
-        return Response(data)
+        fields, expand = get_requested_fields(request.query_params, RELATIONS)
+        movies, key = get_stored_movies([self.kwargs["pk"]], fields, expand)
+        if not movies:
+            raise NotFound()
+        data = movies[0]
+        if request.query_params.get("histogram") in ("true", "1"):
+            data["histogram"] = get_histogram_data(self.kwargs["pk"])
+            key = None
+        return stored_movies_response(request, data, key)
 
     def put(self, request, *args, **kwargs):
         user = get_user(self.request)
@@ -194,10 +172,161 @@ class MovieDetailView(generics.RetrieveUpdateDestroyAPIView):
             return user
         return super().delete(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        deletion.delete_movie(instance)
+
+
+@extend_schema(
+    methods=["GET"],
+    description="Retrieve the score distribution of a specific movie's reviews",
+    responses={
+        200: OpenApiResponse(description="Histogram retrieved successfully"),
+        404: OpenApiResponse(description="Movie not found"),
+    },
+)
+class MovieHistogramView(generics.RetrieveAPIView):
+    queryset = Movie.objects.all()
+    serializer_class = serializers.MovieSerializer
+
+    def get(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(get_histogram_data(instance.id))
+
+
+@extend_schema(
+    methods=["GET"],
+    description=(
+        "Retrieve the best rated movies overall, of a genre or of a decade, "
+        "ranked by their Bayesian weighted score"
+    ),
+    responses={
+        200: OpenApiResponse(description="Leaderboard retrieved successfully"),
+        404: OpenApiResponse(description="Genre not found"),
+    },
+)
+class LeaderboardView(generics.ListAPIView):
+    serializer_class = serializers.MovieSerializer
+
+    def get_board(self):
+        if "genre" in self.kwargs:
+            genre = Genre.objects.filter(name__iexact=self.kwargs["genre"]).first()
+            if genre is None:
+                raise NotFound("Genre not found.")
+            return leaderboards.genre_board(genre.id)
+        if "decade" in self.kwargs:
+            return leaderboards.decade_board(self.kwargs["decade"])
+        return leaderboards.OVERALL
+
+    def get_queryset(self):
+        return (
+            LeaderboardEntry.objects.filter(
+                board=self.get_board(), rank__lte=settings.LEADERBOARDS["SIZE"]
+            )
+            .select_related("movie")
+            .order_by("rank")
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = [get_leaderboard_entry(entry) for entry in page]
+            return self.get_paginated_response(data)
+        data = [get_leaderboard_entry(entry) for entry in queryset]
+        return Response(data)
+
+
+@extend_schema(
+    methods=["GET"],
+    description=(
+        "Retrieve the movies most similar to a specific movie by genres, "
+        "directors and cast"
+    ),
+    responses={
+        200: OpenApiResponse(description="Similar movies retrieved successfully"),
+        404: OpenApiResponse(description="Movie not found"),
+    },
+)
+class SimilarMoviesView(generics.ListAPIView):
+    serializer_class = serializers.MovieSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return (
+            SimilarMovie.objects.filter(movie_id=self.kwargs["pk"])
+            .select_related("similar")
+            .order_by("rank")
+        )
+
+    def list(self, request, *args, **kwargs):
+        data = [
+            dict(get_movie_info(entry.similar), score=round(entry.score, 4))
+            for entry in self.get_queryset()
+        ]
+        if not data and not Movie.objects.filter(pk=kwargs["pk"]).exists():
+            raise NotFound()
+        return Response(data)
+
+
+@extend_schema(
+    methods=["GET"],
+    description=(
+        "Retrieve a list of celebrities, optionally searched by name and "
+        "ordered by their number of movies"
+    ),
+    responses={
+        200: OpenApiResponse(description="List of celebrities retrieved successfully"),
+    },
+)
+class CelebrityListView(generics.ListAPIView):
+    queryset = Celebrity.objects.all()
+    serializer_class = serializers.CelebritySerializer
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["name", "directedCount", "actedCount"]
+    ordering = ["id"]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if "search" in self.request.query_params:
+            queryset = queryset.filter(
+                text_filter(
+                    "foldedName",
+                    self.request.query_params["search"],
+                    get_match(self.request.query_params),
+                )
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = [get_celebrity_info(celebrity) for celebrity in page]
+            return self.get_paginated_response(data)
+        data = [get_celebrity_info(celebrity) for celebrity in queryset]
+        return Response(data)
+
+
+@extend_schema(
+    methods=["GET"],
+    description="Retrieve a celebrity with the movies they directed and acted in",
+    responses={
+        200: OpenApiResponse(description="Celebrity retrieved successfully"),
+        404: OpenApiResponse(description="Celebrity not found"),
+    },
+)
+class CelebrityDetailView(generics.RetrieveAPIView):
+    queryset = Celebrity.objects.all()
+    serializer_class = serializers.CelebritySerializer
+
+    def get(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(get_celebrity_data(instance))
+
 
 def get_user(request):
     try:
-        user = Token.objects.get(key=request.COOKIES.get("session")).user
+        user = session_user(request)
 
         if user is None:
             return Response(
@@ -218,41 +347,218 @@ def get_user(request):
         )
 
 
+# Text filters of the movie list and the folded columns they match.
+TEXT_FILTERS = {
+    "title": "foldedTitle",
+    "genres": "genres__foldedName",
+    "rating": "rating__foldedName",
+}
+# Text filters matching the name of the celebrities credited in a role.
+CREDIT_FILTERS = {"cast": Credit.CAST, "director": Credit.DIRECTOR}
+
+
+def filter_movies(queryset, query_params):
+    """
+    Applies the search and filters of the movie list. Returns the queryset
+    with its default ordering: by relevance when searching, by id otherwise.
+    """
+    try:
+        if "search" in query_params:
+            queryset = search_movies(queryset, query_params["search"])
+            # The queryset is already ordered by relevance.
+            ordering = None
+        else:
+            ordering = ["id"]
+
+        match = get_match(query_params)
+        for param, field in TEXT_FILTERS.items():
+            if param in query_params:
+                queryset = queryset.filter(
+                    text_filter(field, query_params[param], match)
+                )
+        for param, role in CREDIT_FILTERS.items():
+            if param in query_params:
+                # One filter() call, so the role and name match the same credit.
+                queryset = queryset.filter(
+                    text_filter(
+                        "credits__celebrity__foldedName", query_params[param], match
+                    ),
+                    credits__role=role,
+                )
+
+        if "year" in query_params:
+            queryset = queryset.filter(year=query_params["year"])
+        else:
+            if "start" in query_params:
+                queryset = queryset.filter(year__gte=query_params["start"])
+            if "end" in query_params:
+                queryset = queryset.filter(year__lte=query_params["end"])
+    except (ValueError, TypeError):
+        raise ValidationError("The query parameters must be of the correct type.")
+    return queryset, ordering
+
+
+def search_movies(queryset, search_term):
+    """
+    Keeps the movies whose title, cast or directors match a term, ordered by
+    relevance in that order, in one lazy query
+    """
+    # Best role a matching celebrity is credited in: cast first, then director.
+    credits = (
+        Credit.objects.filter(
+            text_filter("celebrity__foldedName", search_term), movie_id=OuterRef("pk")
+        )
+        .annotate(relevance=Case(When(role=Credit.CAST, then=1), default=2))
+        .order_by("relevance")
+        .values("relevance")[:1]
+    )
+    relevance = Case(
+        When(text_filter("foldedTitle", search_term), then=0),
+        default=Subquery(credits),
+    )
+    return (
+        queryset.alias(relevance=relevance)
+        .filter(relevance__isnull=False)
+        .order_by("relevance", "id")
+    )
+
+
 def get_movie_info(movie):
+    return get_movie_fields(movie, INFO_FIELDS, ())
+
+
+def get_movie_data(movie):
+    return get_movie_fields(movie, INFO_FIELDS, RELATIONS)
+
+
+def get_movie_fields(movie, fields, expand):
+    return build_movie_fields(movie, fields, expand, current_rating)
+
+
+def list_key(request):
+    # The pagination links are built from the absolute URI.
+    return f"movie-list:{request.build_absolute_uri()}"
+
+
+def get_stored_movies(movie_ids, fields, expand):
+    """
+    Reads the stored documents of the given movies with their current rating
+    and the requested fields and relations. Returns them with the compression
+    key of a response made of them.
+    """
+    return present_documents(get_movie_documents(movie_ids), fields, expand)
+
+
+def present_documents(documents, fields, expand):
+    """
+    Presents documents with their current rating. The compression key names
+    the documents by their version and rating, so responses presenting the
+    same ones share their compressed bodies; it is None when a document has no
+    version.
+    """
+    data, versions = [], []
+    for document in documents:
+        data.append(present_document(document, fields, expand))
+        versions.append(
+            f"{document['id']}@{document.get('_version')}:"
+            f"{data[-1].get('userRating')}:{data[-1].get('votes')}"
+        )
+    if any(document.get("_version") is None for document in documents):
+        return data, None
+    key = f"movies:{','.join(fields)}:{','.join(expand)}:{';'.join(versions)}"
+    return data, key
+
+
+def stored_movies_response(request, data, key):
+    response = Response(data)
+    if key is not None:
+        # Renderer options such as ?format= or indent change the body too.
+        response.compression_key = f"{request.accepted_media_type}:{key}"
+    return response
+
+
+def present_document(document, fields, expand):
+    user_rating, votes = pending_rating(
+        int(document["id"]), Decimal(document["userRating"]), document["votes"]
+    )
+    document = dict(document, userRating=user_rating, votes=votes)
     return {
-        "id": str(movie.id),
-        "title": movie.title,
-        "year": movie.year,
-        "runtime": movie.runtime if movie.runtime is not None else "--",
-        "userRating": movie.userRating,
-        "votes": movie.votes,
-        "poster": movie.poster,
+        key: value for key, value in document.items() if key in fields or key in expand
     }
 
 
-def get_movie_data(movie):
+def get_celebrity_info(celebrity):
     return {
-        "id": str(movie.id),
-        "title": movie.title,
-        "year": movie.year,
-        "runtime": movie.runtime if movie.runtime is not None else "--",
-        "rating": {"id": movie.rating.id, "rating": movie.rating.name}
-        if movie.rating.name is not None
-        else {"id": -1, "rating": "--"},
-        "directors": [
-            {"id": director.id, "name": director.name}
-            for director in movie.directors.all()
-        ],
-        "userRating": movie.userRating,
-        "votes": movie.votes,
-        "genres": [
-            {"id": genre.id, "genre": genre.name} for genre in movie.genres.all()
-        ],
-        "cast": [{"id": actor.id, "name": actor.name} for actor in movie.cast.all()],
-        "poster": movie.poster,
+        "id": celebrity.id,
+        "name": celebrity.name,
+        "directedCount": celebrity.directedCount,
+        "actedCount": celebrity.actedCount,
     }
 
 
+def get_celebrity_data(celebrity):
+    data = get_celebrity_info(celebrity)
+    data["directed"], data["acted"] = [], []
+    # One read of the celebrity's credits, through their index on celebrity.
+    credits = (
+        Credit.objects.filter(celebrity=celebrity, movie__deletedAt__isnull=True)
+        .select_related("movie")
+        .only("role", "movie", *[f"movie__{field}" for field in INFO_FIELDS])
+        .order_by("-movie__year", "movie_id")
+    )
+    for credit in credits:
+        key = "directed" if credit.role == Credit.DIRECTOR else "acted"
+        data[key].append(get_movie_info(credit.movie))
+    return data
+
+
+def get_movie_ids(ids):
+    """
+    Parses a comma separated list of movie ids, dropping repeated ones
+    """
+    try:
+        movie_ids = list(dict.fromkeys(int(pk) for pk in ids.split(",") if pk))
+    except ValueError:
+        raise ValidationError("ids must be a comma separated list of integers.")
+    if len(movie_ids) > settings.MOVIE_CACHE["MAX_IDS"]:
+        raise ValidationError(
+            f"At most {settings.MOVIE_CACHE['MAX_IDS']} ids can be requested."
+        )
+    return movie_ids
+
+
+def get_requested_fields(query_params, expand=()):
+    """
+    Reads the ?fields= and ?expand= parameters, defaulting to the fields of
+    get_movie_info and to the given relations
+    """
+    fields = INFO_FIELDS
+    if "fields" in query_params:
+        fields = [field for field in query_params["fields"].split(",") if field]
+    if "expand" in query_params:
+        expand = [
+            relation for relation in query_params["expand"].split(",") if relation
+        ]
+    unknown = [field for field in fields if field not in INFO_FIELDS] + [
+        relation for relation in expand if relation not in RELATIONS
+    ]
+    if unknown:
+        raise ValidationError(f"Unknown fields: {', '.join(unknown)}.")
+    return fields, expand
+
+
+def get_leaderboard_entry(entry):
+    data = get_movie_info(entry.movie)
+    data["rank"] = entry.rank
+    data["score"] = round(entry.score, 2)
+    return data
+
+
+def get_histogram_data(movie_id):
+    histogram = RatingHistogram.objects.filter(movie_id=movie_id).first()
+    return histogram_stats(histogram)
+
+
 def revert_movie(data):
     if "directors" in data and not isinstance(data["directors"][0], int):
         data["directors"] = [director["id"] for director in data["directors"]]
@@ -0,0 +1,23 @@
+from rest_framework import filters
+
+from freshTomatoes.async_views import AsyncReadView
+from freshTomatoes.pagination import HTTPSPageNumberPagination
+from .views import ReviewListView, filter_reviews, get_review_data
+
+
+class AsyncReviewListView(AsyncReadView):
+    """
+    Async ReviewListView.list
+    """
+
+    ordering_fields = ReviewListView.ordering_fields
+    ordering = ReviewListView.ordering
+    count_models = ReviewListView.count_models
+
+    async def get_data(self, request):
+        queryset = filter_reviews(ReviewListView.queryset.all(), request.query_params)
+        queryset = filters.OrderingFilter().filter_queryset(request, queryset, self)
+        paginator = HTTPSPageNumberPagination()
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        data = [get_review_data(review) for review in page]
+        return paginator.get_paginated_response(data).data
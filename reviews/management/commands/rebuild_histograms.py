@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies.ratings import rebuild_histograms
+
+
+class Command(BaseCommand):
+    help = "Recomputes the rating histogram of every reviewed movie"
+
+    def handle(self, *args, **options):
+        count = rebuild_histograms()
+        self.stdout.write(f"Rebuilt {count} histograms")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reviews import recommender
+
+
+class Command(BaseCommand):
+    help = "Factorizes the user x movie rating matrix used for recommendations"
+
+    def add_arguments(self, parser):
+        config = settings.RECOMMENDER
+        parser.add_argument("--factors", type=int, default=config["FACTORS"])
+        parser.add_argument("--iterations", type=int, default=config["ITERATIONS"])
+        parser.add_argument(
+            "--regularization", type=float, default=config["REGULARIZATION"]
+        )
+
+    def handle(self, *args, **options):
+        users, movies = recommender.train(
+            factors=options["factors"],
+            iterations=options["iterations"],
+            regularization=options["regularization"],
+        )
+        self.stdout.write(f"Trained factors for {users} users and {movies} movies")
@@ -4,6 +4,19 @@ from movies.models import Movie
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+class ReviewManager(models.Manager):
+    """
+    Default manager of reviews, hiding the reviews of deleted movies and users
+    """
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(movie__deletedAt__isnull=True, user__deletedAt__isnull=True)
+        )
+
+
 class Review(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(TomatoeUser, on_delete=models.CASCADE)
@@ -16,5 +29,8 @@ class Review(models.Model):
     )
     comment = models.TextField(blank=True)
 
+    objects = ReviewManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"Review by {self.user.username} for {self.movie.title}"
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .models import Review
+
+FILES = ("user_ids", "user_factors", "movie_ids", "movie_factors")
+
+
+def load_ratings():
+    """
+    Returns the (user, movie, rating) triples of every review as arrays
+    """
+    triples = np.array(
+        list(Review.objects.values_list("user_id", "movie_id", "userRating")),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    return (
+        triples[:, 0].astype(np.int64),
+        triples[:, 1].astype(np.int64),
+        triples[:, 2],
+    )
+
+
+def solve_factors(
+    rows, cols, values, fixed, n_rows, regularization, block=2048, chunk=65536
+):
+    """
+    One ALS half step: for every row r, solves
+    (F_r^T F_r + reg * n_r * I) x_r = F_r^T v_r
+    where F_r are the fixed factors of the columns rated in row r. Each row's
+    normal equations are built with matrix products over its segment of the
+    sorted ratings, chunk ratings at a time so memory stays bounded however
+    many ratings a row has, and the rows of a block are solved as a stack of
+    small systems.
+    """
+    factors = fixed.shape[1]
+    order = np.argsort(rows, kind="stable")
+    rows, cols, values = rows[order], cols[order], values[order]
+    counts = np.bincount(rows, minlength=n_rows)
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+
+    solved = np.zeros((n_rows, factors))
+    for first in range(0, n_rows, block):
+        last = min(first + block, n_rows)
+        gram = np.zeros((last - first, factors, factors))
+        rhs = np.zeros((last - first, factors))
+        for row in range(first, last):
+            for start in range(bounds[row], bounds[row + 1], chunk):
+                entries = slice(start, min(start + chunk, bounds[row + 1]))
+                f = fixed[cols[entries]]
+                gram[row - first] += f.T @ f
+                rhs[row - first] += values[entries] @ f
+        gram += (regularization * np.maximum(counts[first:last], 1))[
+            :, None, None
+        ] * np.eye(factors)
+        solved[first:last] = np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+    return solved
+
+
+def train(factors=32, iterations=10, regularization=0.1, seed=0):
+    """
+    Factorizes the user x movie rating matrix with alternating least squares
+    and stores the factors in settings.RECOMMENDER["PATH"]
+    """
+    users, movies, ratings = load_ratings()
+    user_ids, user_rows = np.unique(users, return_inverse=True)
+    movie_ids, movie_rows = np.unique(movies, return_inverse=True)
+    mean = float(ratings.mean()) if len(ratings) else 0.0
+    centered = ratings - mean
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.1, size=(len(user_ids), factors))
+    movie_factors = rng.normal(scale=0.1, size=(len(movie_ids), factors))
+    for _ in range(iterations):
+        user_factors = solve_factors(
+            user_rows,
+            movie_rows,
+            centered,
+            movie_factors,
+            len(user_ids),
+            regularization,
+        )
+        movie_factors = solve_factors(
+            movie_rows,
+            user_rows,
+            centered,
+            user_factors,
+            len(movie_ids),
+            regularization,
+        )
+
+    save(
+        {
+            "user_ids": user_ids,
+            "user_factors": user_factors.astype(np.float32),
+            "movie_ids": movie_ids,
+            "movie_factors": movie_factors.astype(np.float32),
+        },
+        {"mean": mean, "factors": factors, "reviews": len(ratings)},
+    )
+    return len(user_ids), len(movie_ids)
+
+
+def save(arrays, meta):
+    path = settings.RECOMMENDER["PATH"]
+    os.makedirs(path, exist_ok=True)
+    for name in FILES:
+        np.save(os.path.join(path, f"{name}.tmp.npy"), arrays[name])
+        os.replace(
+            os.path.join(path, f"{name}.tmp.npy"), os.path.join(path, f"{name}.npy")
+        )
+    # meta.json is written last, readers reload the model when it changes.
+    with open(os.path.join(path, "meta.tmp.json"), "w") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(path, "meta.tmp.json"), os.path.join(path, "meta.json"))
+
+
+class Model:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in FILES:
+            setattr(
+                self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            )
+
+    def recommend(self, user_id, exclude_movie_ids, limit):
+        """
+        Scores every movie for a user with one matrix-vector product and
+        returns the best (movie_id, predicted rating) pairs not excluded
+        """
+        row = np.searchsorted(self.user_ids, user_id)
+        if row >= len(self.user_ids) or self.user_ids[row] != user_id:
+            return None
+        scores = self.movie_factors @ self.user_factors[row] + self.meta["mean"]
+
+        exclude = np.asarray(list(exclude_movie_ids), dtype=np.int64)
+        scores[np.isin(self.movie_ids, exclude)] = -np.inf
+
+        limit = min(limit, int(np.isfinite(scores).sum()))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in top]
+
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Returns the trained model, reloading it after a new training run, or None
+    if the recommender has never been trained
+    """
+    global _model, _model_mtime
+    meta = os.path.join(settings.RECOMMENDER["PATH"], "meta.json")
+    try:
+        mtime = os.stat(meta).st_mtime_ns, meta
+    except FileNotFoundError:
+        return None
+    with _model_lock:
+        if _model is None or _model_mtime != mtime:
+            _model = Model(settings.RECOMMENDER["PATH"])
+            _model_mtime = mtime
+        return _model
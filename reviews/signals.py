@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from freshTomatoes.pagination import invalidate_counts
+from movies.signals import on_commit_batch, soft_deleted
+from users.models import TomatoeUser
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, **kwargs):
+    on_commit_batch(invalidate_counts, [Review])
+
+
+@receiver(post_save, sender=TomatoeUser)
+@receiver(post_delete, sender=TomatoeUser)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Logins only update last_login, and the password when it is rehashed,
+    # which no review filter reads.
+    if update_fields is not None and set(update_fields) <= {"last_login", "password"}:
+        return
+    on_commit_batch(invalidate_counts, [TomatoeUser])
+
+
+@receiver(soft_deleted)
+def owner_soft_deleted(sender, **kwargs):
+    # The reviews of deleted movies and users are hidden along with them.
+    on_commit_batch(invalidate_counts, [Review, sender])
@@ -1,10 +1,24 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from freshTomatoes.testing import NO_RATE_LIMITS
 from movies.models import Movie, Genre, Celebrity, Rating
 from users.models import TomatoeUser
 from reviews.models import Review
+from movies.ratings import rebuild_histograms
+from reviews.recommender import solve_factors
+from reviews.writer import ReviewWriter, WriterBusy, get_writer
 
 
 class TestReviewModel(TestCase):
@@ -38,6 +52,7 @@ class TestReviewModel(TestCase):
         self.assertEqual(Review.objects.count(), 1)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestReviewListView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -49,6 +64,7 @@ class TestReviewListView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestReviewCreateView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -99,6 +115,7 @@ class TestReviewCreateView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestReviewFiltering(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -171,6 +188,19 @@ class TestReviewFiltering(TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]["movie"]["id"], self.movie1.id)
 
+    def test_review_filtering_by_username(self):
+        response = self.client.get(
+            self.review_list_url, {"username": "TESTUSER1", "match": "prefix"}
+        )
+        data = response.data["results"]
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["user"]["id"], self.user1.id)
+
+        response = self.client.get(
+            self.review_list_url, {"username": "user1", "match": "prefix"}
+        )
+        self.assertEqual(response.data["results"], [])
+
     def test_review_ordering_by_userRating(self):
         response = self.client.get(
             self.review_list_url, {"ordering": "userRating"}, format="json"
@@ -192,6 +222,7 @@ class TestReviewFiltering(TestCase):
         self.assertEqual(data[1]["userRating"], self.review1.userRating)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestReviewDetailView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -329,3 +360,234 @@ class TestReviewDetailView(TestCase):
             format="json",
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestReviewWriter(TestCase):
+    def setUp(self):
+        self.writer = ReviewWriter(max_size=1, batch_size=8, put_timeout=0.01)
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def test_writer_resolves_futures(self):
+        future = self.writer.submit(lambda a, b: a + b, 1, 2)
+        self.assertEqual(future.result(timeout=5), 3)
+
+    def test_writer_isolates_failures(self):
+        def fail():
+            raise ValueError("invalid")
+
+        failed = self.writer.submit(fail)
+        succeeded = self.writer.submit(lambda: "ok")
+        self.assertRaises(ValueError, failed.result, timeout=5)
+        self.assertEqual(succeeded.result(timeout=5), "ok")
+
+    def test_writer_backpressure(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        blocked = self.writer.submit(block)
+        started.wait(5)
+        queued = self.writer.submit(lambda: "queued")
+        self.assertRaises(WriterBusy, self.writer.submit, lambda: "rejected")
+        release.set()
+        blocked.result(timeout=5)
+        self.assertEqual(queued.result(timeout=5), "queued")
+
+    def test_stop_with_full_queue(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        self.writer.submit(block)
+        started.wait(5)
+        queued = self.writer.submit(lambda: "queued")
+        stopper = threading.Thread(target=self.writer.stop)
+        stopper.start()
+        release.set()
+        stopper.join(5)
+        self.assertFalse(stopper.is_alive())
+        self.assertEqual(queued.result(timeout=0), "queued")
+
+
+@override_settings(
+    REVIEW_WRITE_QUEUE={
+        "ENABLED": True,
+        "MAX_SIZE": 10,
+        "BATCH_SIZE": 4,
+        "PUT_TIMEOUT": 1,
+        "TIMEOUT": 10,
+    },
+    RATE_LIMITS=NO_RATE_LIMITS,
+)
+class TestReviewWriteQueue(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = reverse("login")
+        self.review_list_url = reverse("review_list")
+        self.user = TomatoeUser.objects.create_user(
+            username="testuser@test.com",
+            name="Test User",
+            tel="123456789",
+            email="testuser@test.com",
+            password="Testpassword1",
+        )
+        self.rating = Rating.objects.create(name="PG-13")
+        self.movie = Movie.objects.create(
+            title="Test Movie",
+            year=2020,
+            rating=self.rating,
+            runtime=120,
+            userRating=7.5,
+            votes=1000,
+        )
+
+    def tearDown(self):
+        get_writer().stop()
+
+    def test_review_create_through_queue(self):
+        self.client.post(
+            self.login_url,
+            {"username": "testuser@test.com", "password": "Testpassword1"},
+            format="json",
+        )
+        response = self.client.post(
+            self.review_list_url,
+            {"movie": self.movie.id, "userRating": 8.0, "comment": "Great movie!"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["movie"]["id"], self.movie.id)
+        self.assertEqual(Review.objects.count(), 1)
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 1001)
+
+        response = self.client.post(
+            self.review_list_url,
+            {"movie": self.movie.id, "userRating": 9.0},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_slow_write_is_accepted(self):
+        self.client.post(
+            self.login_url,
+            {"username": "testuser@test.com", "password": "Testpassword1"},
+            format="json",
+        )
+        with mock.patch.object(Future, "result", side_effect=TimeoutError):
+            response = self.client.post(
+                self.review_list_url,
+                {"movie": self.movie.id, "userRating": 8.0},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        get_writer().stop()
+        self.assertEqual(Review.objects.count(), 1)
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestRatingHistogram(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = reverse("login")
+        self.review_list_url = reverse("review_list")
+        self.user = TomatoeUser.objects.create_user(
+            username="testuser@test.com",
+            name="Test User",
+            tel="123456789",
+            email="testuser@test.com",
+            password="Testpassword1",
+        )
+        self.rating = Rating.objects.create(name="PG-13")
+        self.movie = Movie.objects.create(
+            title="Test Movie",
+            year=2020,
+            rating=self.rating,
+            runtime=120,
+            userRating=0,
+            votes=0,
+        )
+        self.histogram_url = reverse("movie_histogram", kwargs={"pk": self.movie.id})
+        self.client.post(
+            self.login_url,
+            {"username": "testuser@test.com", "password": "Testpassword1"},
+            format="json",
+        )
+
+    def get_histogram(self):
+        response = self.client.get(self.histogram_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_histogram_follows_review_changes(self):
+        response = self.client.post(
+            self.review_list_url,
+            {"movie": self.movie.id, "userRating": 7.6},
+            format="json",
+        )
+        review_id = response.data["id"]
+        histogram = self.get_histogram()
+        self.assertEqual(histogram["count"], 1)
+        self.assertEqual(histogram["buckets"]["8"], 1)
+
+        self.client.post(
+            self.review_list_url,
+            {"movie": self.movie.id, "userRating": 4, "overwrite": True},
+            format="json",
+        )
+        histogram = self.get_histogram()
+        self.assertEqual(histogram["count"], 1)
+        self.assertEqual(histogram["buckets"]["8"], 0)
+        self.assertEqual(histogram["buckets"]["4"], 1)
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 1)
+        self.assertEqual(self.movie.userRating, 4)
+
+        review_detail_url = reverse("review_detail", kwargs={"pk": review_id})
+        self.client.patch(review_detail_url, {"userRating": 10}, format="json")
+        histogram = self.get_histogram()
+        self.assertEqual(histogram["buckets"]["4"], 0)
+        self.assertEqual(histogram["buckets"]["10"], 1)
+        self.assertEqual(histogram["mean"], 10)
+
+        self.client.delete(review_detail_url)
+        histogram = self.get_histogram()
+        self.assertEqual(histogram["count"], 0)
+        self.assertIsNone(histogram["median"])
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.votes, 0)
+
+    def test_histogram_in_movie_detail(self):
+        Review.objects.create(user=self.user, movie=self.movie, userRating=6)
+        rebuild_histograms()
+        response = self.client.get(
+            reverse("movie_detail", kwargs={"pk": self.movie.id}),
+            {"histogram": "true"},
+        )
+        self.assertEqual(response.data["histogram"]["buckets"]["6"], 1)
+        self.assertEqual(response.data["histogram"]["median"], 6)
+
+
+class TestSolveFactors(SimpleTestCase):
+    def test_chunked_rows_match_the_normal_equations(self):
+        rng = np.random.default_rng(0)
+        rows = np.array([0, 1, 0, 2, 0, 1, 0])
+        cols = rng.integers(0, 4, len(rows))
+        values = rng.normal(size=len(rows))
+        fixed = rng.normal(size=(4, 3))
+
+        solved = solve_factors(rows, cols, values, fixed, 4, 0.1, block=2, chunk=2)
+        for row in range(4):
+            f = fixed[cols[rows == row]]
+            gram = f.T @ f + 0.1 * max(len(f), 1) * np.eye(3)
+            expected = np.linalg.solve(gram, f.T @ values[rows == row])
+            np.testing.assert_allclose(solved[row], expected)
+
@@ -1,14 +1,18 @@
 from rest_framework import generics, status, filters
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from .models import Review
+from freshTomatoes.text import get_match, text_filter
+from users.auth import session_user
 from users.models import TomatoeUser
 from movies.models import Movie
+from movies.ratings import update_rating, remove_rating
 from .serializers import ReviewSerializer
+from .writer import get_writer, WriterBusy
 
 
 @extend_schema(
@@ -23,16 +27,21 @@ from .serializers import ReviewSerializer
     description="Create a new review",
     responses={
         201: OpenApiResponse(description="New review created successfully"),
+        202: OpenApiResponse(description="Review queued, it will be saved shortly"),
         400: OpenApiResponse(description="Invalid data"),
         401: OpenApiResponse(description="User must be logged in to manage reviews"),
+        429: OpenApiResponse(description="Too many reviews posted, retry later"),
     },
 )
 class ReviewListView(generics.ListCreateAPIView):
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related("movie", "user")
     serializer_class = ReviewSerializer
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["userRating"]
     ordering = ["id"]
+    # Models whose writes change the counts of the list and its filters.
+    count_models = [Review, Movie, TomatoeUser]
+    rate_limit_scope = "reviews"
 
     def post(self, request):
         user = get_user(self.request)
@@ -40,50 +49,46 @@ class ReviewListView(generics.ListCreateAPIView):
             return user
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            movie = serializer.validated_data.get("movie")
-            review = Review.objects.filter(user=user, movie=movie).first()
             overwrite = request.data.get("overwrite", False)
-
-            if review is not None:
-                if overwrite:
-                    for attr, value in serializer.validated_data.items():
-                        setattr(review, attr, value)
-                    review.save()
-                    self.update_rating(movie, review)
+            config = settings.REVIEW_WRITE_QUEUE
+            if config["ENABLED"]:
+                try:
+                    future = get_writer().submit(
+                        save_review, user, serializer.validated_data, overwrite
+                    )
+                except WriterBusy:
                     return Response(
-                        get_review_data(review).data,
-                        status=status.HTTP_201_CREATED,
+                        {"detail": "Too many reviews being written, retry later."},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={"Retry-After": "1"},
                     )
-                else:
+                try:
+                    review, conflict = future.result(timeout=config["TIMEOUT"])
+                except TimeoutError:
+                    # The write stays queued and will still be committed.
                     return Response(
-                        ReviewSerializer(review).data,
-                        status=status.HTTP_409_CONFLICT,
+                        {"detail": "Review queued, it will be saved shortly."},
+                        status=status.HTTP_202_ACCEPTED,
                     )
             else:
-                review = serializer.save(user=user)
-                self.update_rating(movie, review)
+                review, conflict = save_review(
+                    user, serializer.validated_data, overwrite
+                )
+
+            if conflict:
                 return Response(
-                    get_review_data(review),
-                    status=status.HTTP_201_CREATED,
+                    ReviewSerializer(review).data,
+                    status=status.HTTP_409_CONFLICT,
                 )
+            return Response(
+                get_review_data(review),
+                status=status.HTTP_201_CREATED,
+            )
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def filter_queryset(self, queryset):
-        query_params = self.request.query_params
-
-        if "movie_id" in query_params:
-            queryset = queryset.filter(movie__id=query_params["movie_id"])
-        elif "title" in query_params:
-            queryset = queryset.filter(movie__title__icontains=query_params["title"])
-
-        if "user_id" in query_params:
-            queryset = queryset.filter(user__id=query_params["user_id"])
-        elif "username" in query_params:
-            queryset = queryset.filter(
-                user__username__icontains=query_params["username"]
-            )
-
+        queryset = filter_reviews(queryset, self.request.query_params)
         return super().filter_queryset(queryset)
 
     def list(self, request, *args, **kwargs):
@@ -95,18 +100,6 @@ class ReviewListView(generics.ListCreateAPIView):
         data = [get_review_data(review) for review in queryset]
         return Response(data)
 
-    def update_rating(self, movie, review):
-        """
-        Updates movie rating according to new review rating
-        """
-
-        movie.userRating = (movie.userRating * movie.votes + review.userRating) / (
-            movie.votes + 1
-        )
-        movie.votes = movie.votes + 1
-        movie.save()
-        return
-
 
 @extend_schema(
     methods=['GET'],
@@ -162,7 +155,9 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
             return data
         serializer = self.get_serializer(instance, data=data)
         serializer.is_valid(raise_exception=True)
+        previous = instance.userRating
         review = serializer.save()
+        update_rating(review.movie, review.userRating, previous)
         return Response(get_review_data(review))
 
     def update(self, request, *args, **kwargs):
@@ -181,7 +176,9 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
             return data
         serializer = self.get_serializer(instance, data=data)
         serializer.is_valid(raise_exception=True)
+        previous = instance.userRating
         review = serializer.save()
+        update_rating(review.movie, review.userRating, previous)
         return Response(get_review_data(review))
 
     def delete(self, request, *args, **kwargs):
@@ -196,6 +193,32 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
         return super().delete(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        remove_rating(instance.movie, instance.userRating)
+
+
+def save_review(user, validated_data, overwrite):
+    """
+    Creates the user's review for a movie, or overwrites the existing one if
+    asked to. Returns the review and whether it conflicted with an existing one
+    """
+    movie = validated_data.get("movie")
+    review = Review.objects.filter(user=user, movie=movie).first()
+
+    previous = None
+    if review is not None:
+        if not overwrite:
+            return review, True
+        previous = review.userRating
+        for attr, value in validated_data.items():
+            setattr(review, attr, value)
+        review.save()
+    else:
+        review = Review.objects.create(user=user, **validated_data)
+    update_rating(movie, review.userRating, previous)
+    return review, False
+
 
 def check_update(data, instance):
     if "user" in data:
@@ -221,7 +244,7 @@ def check_update(data, instance):
 
 def get_user(request):
     try:
-        user = Token.objects.get(key=request.COOKIES.get("session")).user
+        user = session_user(request)
 
         if user is None:
             return Response(
@@ -237,6 +260,24 @@ def get_user(request):
         )
 
 
+def filter_reviews(queryset, query_params):
+    match = get_match(query_params)
+    if "movie_id" in query_params:
+        queryset = queryset.filter(movie__id=query_params["movie_id"])
+    elif "title" in query_params:
+        queryset = queryset.filter(
+            text_filter("movie__foldedTitle", query_params["title"], match)
+        )
+
+    if "user_id" in query_params:
+        queryset = queryset.filter(user__id=query_params["user_id"])
+    elif "username" in query_params:
+        queryset = queryset.filter(
+            text_filter("user__foldedUsername", query_params["username"], match)
+        )
+    return queryset
+
+
 def get_review_data(review):
     if isinstance(review.movie, Movie):
         movie = review.movie
@@ -0,0 +1,132 @@
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from freshTomatoes.replication import record_writes, recorded_writes
+
+# Seconds the writer waits for work before checking whether it was stopped.
+STOP_POLL_INTERVAL = 0.1
+
+
+class WriterBusy(Exception):
+    """
+    Raised when the write queue stays full for longer than the put timeout
+    """
+
+
+class ReviewWriter:
+    """
+    Runs database writes on a single thread so request threads never compete
+    for the sqlite write lock. Queued operations are committed in batches
+    (group commit) and each caller gets a future with its own result.
+    """
+
+    def __init__(self, max_size=1000, batch_size=64, put_timeout=1):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(
+                    target=self.run, name="review-writer", daemon=True
+                )
+                self.thread.start()
+
+    def stop(self):
+        """
+        Stops the writer thread once the operations already queued have been
+        committed. Never blocks on a full queue.
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+            self.stopping.set()
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+    def submit(self, func, *args):
+        """
+        Queues func(*args) to run on the writer thread. Blocks for at most
+        put_timeout seconds when the queue is full, then raises WriterBusy.
+        """
+        self.start()
+        future = Future()
+        try:
+            # The caller's request records the writes made on its behalf.
+            item = (func, args, future, recorded_writes())
+            self.queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            raise WriterBusy()
+        return future
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=STOP_POLL_INTERVAL)
+                except queue.Empty:
+                    if self.stopping.is_set():
+                        return
+                    continue
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.commit(batch)
+        finally:
+            connections.close_all()
+
+    def commit(self, batch):
+        """
+        Runs a batch in one transaction. Every operation gets its own
+        savepoint so a failing one does not roll back the rest, and futures
+        are only resolved once the transaction has been committed.
+        """
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for func, args, future, written in batch:
+                    try:
+                        with transaction.atomic(), record_writes(written):
+                            outcomes.append((future, func(*args), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            for _, _, future, _ in batch:
+                future.set_exception(exc)
+            return
+
+        for future, result, exc in outcomes:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            config = settings.REVIEW_WRITE_QUEUE
+            _writer = ReviewWriter(
+                max_size=config["MAX_SIZE"],
+                batch_size=config["BATCH_SIZE"],
+                put_timeout=config["PUT_TIMEOUT"],
+            )
+            atexit.register(_writer.stop)
+        return _writer
@@ -0,0 +1,19 @@
+from rest_framework.authtoken.models import Token
+
+
+def session_user(request):
+    """
+    Returns the user of the session token cookie, looked up once per request.
+    Raises Token.DoesNotExist when no user is logged in.
+    """
+    request = getattr(request, "_request", request)
+    if not hasattr(request, "session_user"):
+        token = (
+            Token.objects.select_related("user")
+            .filter(key=request.COOKIES.get("session"))
+            .first()
+        )
+        request.session_user = token.user if token is not None else None
+    if request.session_user is None:
+        raise Token.DoesNotExist("User must be logged in.")
+    return request.session_user
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+from freshTomatoes.text import refold
+
+
+def fold_usernames(apps, schema_editor):
+    TomatoeUser = apps.get_model("users", "TomatoeUser")
+    refold(TomatoeUser, folded_fields={"username": "foldedUsername"})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tomatoeuser',
+            name='foldedUsername',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fold_usernames, migrations.RunPython.noop),
+    ]
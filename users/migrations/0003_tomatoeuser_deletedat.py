@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-19 08:49
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_tomatoeuser_foldedusername'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='tomatoeuser',
+            managers=[
+                ('objects', users.models.ActiveUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tomatoeuser',
+            name='deletedAt',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tomatoeuser',
+            index=models.Index(condition=models.Q(('deletedAt__isnull', False)), fields=['deletedAt'], name='user_deleted_at'),
+        ),
+    ]
@@ -1,13 +1,44 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 
+from freshTomatoes.text import FoldedFieldsMixin
 
-class TomatoeUser(AbstractUser):
+
+class ActiveUserManager(UserManager):
+    """
+    Default manager of users, hiding deleted users until purge_deleted
+    removes them
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deletedAt__isnull=True)
+
+
+class TomatoeUser(FoldedFieldsMixin, AbstractUser):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=256)
     tel = models.CharField(max_length=32)
     email = models.EmailField(max_length=128)
     password = models.CharField(max_length=128)
+    # Case-folded username without accents, the column review filters search.
+    foldedUsername = models.CharField(max_length=150, db_index=True, editable=False)
+    # Set when the user is deleted, until purge_deleted removes their rows.
+    deletedAt = models.DateTimeField(null=True, editable=False)
+
+    objects = ActiveUserManager()
+    all_objects = models.Manager()
+
+    folded_fields = {"username": "foldedUsername"}
+
+    class Meta(AbstractUser.Meta):
+        # Only deleted users are indexed, for the purge.
+        indexes = [
+            models.Index(
+                fields=["deletedAt"],
+                condition=models.Q(deletedAt__isnull=False),
+                name="user_deleted_at",
+            )
+        ]
 
     def save(self, *args, **kwargs):
         if not self.username:
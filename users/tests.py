@@ -1,8 +1,16 @@
+import tempfile
+
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
 from rest_framework.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from freshTomatoes.testing import NO_RATE_LIMITS
+from movies import leaderboards
+from movies.models import Movie
+from reviews import recommender
+from reviews.models import Review
 from users.models import TomatoeUser
 from users.serializers import UserSerializer
 
@@ -70,6 +78,7 @@ class TestUserSerializer(TestCase):
         self.assertEqual(serializer.errors["password"][0], "Invalid password format")
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestRegisterView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -99,6 +108,7 @@ class TestRegisterView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestLoginView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -122,7 +132,19 @@ class TestLoginView(TestCase):
         response = self.client.post(self.login_url, self.user_data, format="json")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_login_rehashes_password(self):
+        self.user.password = make_password("Testpassword1", hasher="pbkdf2_sha256")
+        self.user.save(update_fields=["password"])
+        response = self.client.post(self.login_url, self.user_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.user.refresh_from_db()
+        self.assertEqual(
+            identify_hasher(self.user.password).algorithm, get_hasher().algorithm
+        )
+        self.assertTrue(self.user.check_password("Testpassword1"))
+
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestLogoutView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -148,6 +170,7 @@ class TestLogoutView(TestCase):
         self.assertEqual(response.cookies["session"].value, "")
 
 
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
 class TestUserView(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -190,3 +213,77 @@ class TestUserView(TestCase):
         self.assertFalse(
             TomatoeUser.objects.filter(username=self.user.username).exists()
         )
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class TestRecommendationsView(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.recommendations_url = reverse("recommendations")
+        self.users = [
+            TomatoeUser.objects.create_user(
+                username=f"testuser{i}@test.com", password="Testpassword1"
+            )
+            for i in range(4)
+        ]
+        self.movies = [
+            Movie.objects.create(title=f"Test Movie {i}", year=2020, votes=10)
+            for i in range(4)
+        ]
+        for user in self.users[1:]:
+            for movie, rating in zip(self.movies, [9, 8, 2, 1]):
+                Review.objects.create(user=user, movie=movie, userRating=rating)
+        Review.objects.create(user=self.users[0], movie=self.movies[0], userRating=9)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            RECOMMENDER={
+                "PATH": self.tmp.name,
+                "FACTORS": 2,
+                "ITERATIONS": 10,
+                "REGULARIZATION": 0.1,
+            }
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def login(self, user):
+        self.client.post(
+            reverse("login"),
+            {"username": user.username, "password": "Testpassword1"},
+            format="json",
+        )
+
+    def test_recommendations_without_login(self):
+        response = self.client.get(self.recommendations_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_recommendations_exclude_reviewed_movies(self):
+        recommender.train(factors=2, iterations=10)
+        self.login(self.users[0])
+        response = self.client.get(self.recommendations_url, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [movie["title"] for movie in response.data],
+            [self.movies[1].title, self.movies[2].title],
+        )
+        self.assertGreater(response.data[0]["score"], response.data[1]["score"])
+
+    def test_recommendations_fall_back_to_leaderboard(self):
+        leaderboards.rebuild()
+        user = TomatoeUser.objects.create_user(
+            username="newuser@test.com", password="Testpassword1"
+        )
+        self.login(user)
+        response = self.client.get(self.recommendations_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+        self.assertIsNone(response.data[0]["score"])
+
+    def test_recommendations_reject_non_positive_limit(self):
+        self.login(self.users[0])
+        for limit in (0, -1):
+            response = self.client.get(self.recommendations_url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,5 +5,10 @@ urlpatterns = [
     path("", views.RegisterView.as_view(), name="register"),
     path("login", views.LoginView.as_view(), name="login"),
     path("me", views.UserView.as_view(), name="me"),
+    path(
+        "me/recommendations",
+        views.RecommendationsView.as_view(),
+        name="recommendations",
+    ),
     path("logout", views.LogoutView.as_view(), name="logout"),
 ]
@@ -3,8 +3,17 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.db.utils import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
+from rest_framework.exceptions import ValidationError
 from users import serializers
+from users.auth import session_user
 from drf_spectacular.utils import extend_schema, OpenApiResponse
+from movies.deletion import delete_user
+from movies.leaderboards import OVERALL
+from movies.models import LeaderboardEntry, Movie
+from movies.serializers import MovieSerializer
+from movies.views import get_movie_info
+from reviews import recommender
+from reviews.models import Review
 
 
 @extend_schema(
@@ -12,10 +21,12 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse
     responses={
         201: OpenApiResponse(description="User registered successfully"),
         409: OpenApiResponse(description="Email already registered for another user"),
+        429: OpenApiResponse(description="Too many registrations, retry later"),
     },
 )
 class RegisterView(generics.CreateAPIView):
     serializer_class = serializers.UserSerializer
+    rate_limit_scope = "register"
 
     def handle_exception(self, exc):
         if isinstance(exc, IntegrityError):
@@ -28,10 +39,12 @@ class RegisterView(generics.CreateAPIView):
     responses={
         201: OpenApiResponse(description="User logged in successfully"),
         401: OpenApiResponse(description="Invalid credentials"),
+        429: OpenApiResponse(description="Too many login attempts, retry later"),
     },
 )
 class LoginView(generics.CreateAPIView):
     serializer_class = serializers.LoginSerializer
+    rate_limit_scope = "login"
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -62,7 +75,65 @@ class UserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.UserSerializer
 
     def get_object(self):
-        return Token.objects.get(key=self.request.COOKIES.get("session")).user
+        return session_user(self.request)
+
+    def perform_destroy(self, instance):
+        delete_user(instance)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ObjectDoesNotExist):
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+        return super().handle_exception(exc)
+
+
+@extend_schema(
+    description="Movie recommendations for the logged user",
+    responses={
+        200: OpenApiResponse(description="Recommendations retrieved successfully"),
+        401: OpenApiResponse(description="No user logged"),
+    },
+)
+class RecommendationsView(generics.ListAPIView):
+    serializer_class = MovieSerializer
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        user = session_user(request)
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), 100)
+        except ValueError:
+            raise ValidationError("The query parameters must be of the correct type.")
+        if limit < 1:
+            raise ValidationError("limit must be a positive integer.")
+
+        reviewed = set(
+            Review.objects.filter(user=user).values_list("movie_id", flat=True)
+        )
+        model = recommender.get_model()
+        ranked = None
+        if model is not None:
+            ranked = model.recommend(user.id, reviewed, limit)
+        if ranked is None:
+            # Users the model has not seen yet get the best rated movies.
+            best = (
+                LeaderboardEntry.objects.filter(board=OVERALL)
+                .exclude(movie_id__in=reviewed)
+                .order_by("rank")
+                .values_list("movie_id", flat=True)
+            )
+            ranked = [(movie_id, None) for movie_id in best[:limit]]
+
+        movies = Movie.objects.in_bulk([movie_id for movie_id, _ in ranked])
+        data = [
+            dict(
+                get_movie_info(movies[movie_id]),
+                score=round(score, 2) if score is not None else None,
+            )
+            for movie_id, score in ranked
+            if movie_id in movies
+        ]
+        return Response(data)
 
     def handle_exception(self, exc):
         if isinstance(exc, ObjectDoesNotExist):